@@ -10,10 +10,11 @@ A股自选股智能分析系统 - AI分析层
 3. 结合技术面和消息面生成分析报告
 """
 
+import hashlib
 import json
 import logging
 import time
-from dataclasses import dataclass
+from dataclasses import dataclass, fields
 from typing import Optional, Dict, Any, List
 
 from tenacity import (
@@ -129,11 +130,19 @@ class AnalysisResult:
             'key_points': self.key_points,
             'risk_warning': self.risk_warning,
             'buy_reason': self.buy_reason,
+            'raw_response': self.raw_response,
             'search_performed': self.search_performed,
+            'data_sources': self.data_sources,
             'success': self.success,
             'error_message': self.error_message,
         }
     
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'AnalysisResult':
+        """由 to_dict() 的结果还原（忽略未知字段）"""
+        names = {f.name for f in fields(cls)}
+        return cls(**{k: v for k, v in data.items() if k in names})
+    
     def get_core_conclusion(self) -> str:
         """获取核心结论（一句话）"""
         if self.dashboard and 'core_conclusion' in self.dashboard:
@@ -208,6 +217,10 @@ class GeminiAnalyzer:
     # 核心模块：核心结论 + 数据透视 + 舆情情报 + 作战计划
     # ========================================
     
+    # 提示词版本：修改 SYSTEM_PROMPT 或 _format_prompt 的输出格式时递增，
+    # 已保存的分析结果（按输入指纹复用）随之失效
+    PROMPT_VERSION = "2.1"
+    
     SYSTEM_PROMPT = """你是一位专注于趋势交易的 A 股投资分析师，负责生成专业的【决策仪表盘】分析报告。
 
 ## 核心交易理念（必须严格遵守）
@@ -677,6 +690,41 @@ class GeminiAnalyzer:
         # 所有方式都失败
         raise last_error or Exception("所有 AI API 调用失败，已达最大重试次数")
     
+    @property
+    def model_name(self) -> str:
+        """当前使用的模型名称"""
+        model_name = getattr(self, '_current_model_name', None)
+        if not model_name:
+            model_name = getattr(self._model, '_model_name', 'unknown')
+            if hasattr(self._model, 'model_name'):
+                model_name = self._model.model_name
+        return model_name
+    
+    def fingerprint(self, context: Dict[str, Any]) -> str:
+        """
+        分析输入的指纹（稳定上下文 + 模型 + 提示词版本的 SHA-256）
+        
+        只包含情报搜索之前即可确定、且同一交易日内不变的输入：
+        - 实时行情（realtime）与依赖现价的筹码状态（chip.chip_status）盘中随时变化，不参与计算；
+          行情以上下文中最近一个已收盘交易日的K线为准
+        - 新闻不参与计算（搜索结果每次略有不同，计入会使指纹几乎无法命中），
+          因此复用的结果不包含之后的新公告，复用默认关闭且只复用当天生成的结果
+        """
+        stable = {key: value for key, value in context.items() if key != 'realtime'}
+        if isinstance(stable.get('chip'), dict):
+            stable['chip'] = {key: value for key, value in stable['chip'].items() if key != 'chip_status'}
+        payload = json.dumps(
+            {
+                'context': stable,
+                'model': self.model_name,
+                'prompt_version': self.PROMPT_VERSION,
+            },
+            ensure_ascii=False,
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    
     def analyze(
         self, 
         context: Dict[str, Any],
@@ -736,12 +784,7 @@ class GeminiAnalyzer:
             # 格式化输入（包含技术面数据和新闻）
             prompt = self._format_prompt(context, name, news_context)
             
-            # 获取模型名称
-            model_name = getattr(self, '_current_model_name', None)
-            if not model_name:
-                model_name = getattr(self._model, '_model_name', 'unknown')
-                if hasattr(self._model, 'model_name'):
-                    model_name = self._model.model_name
+            model_name = self.model_name
             
             logger.info(f"========== AI 分析 {name}({code}) ==========")
             logger.info(f"[LLM配置] 模型: {model_name}")
@@ -855,6 +898,18 @@ class GeminiAnalyzer:
 | MA10 | {today.get('ma10', 'N/A')} | 中短期趋势线 |
 | MA20 | {today.get('ma20', 'N/A')} | 中期趋势线 |
 | 均线形态 | {context.get('ma_status', '未知')} | 多头/空头/缠绕 |
+"""
+        
+        # 存储层物化的长期均线与 MACD（历史不足或尚未回填时缺失）
+        if today.get('macd_dif') is not None:
+            prompt += f"""
+### 长期均线与 MACD
+| 指标 | 数值 | 说明 |
+|------|------|------|
+| MA60 | {today.get('ma60') if today.get('ma60') is not None else 'N/A'} | 长期趋势线 |
+| DIF | {today['macd_dif']:.3f} | EMA12 - EMA26 |
+| DEA | {today['macd_dea']:.3f} | DIF 的 9 日 EMA |
+| MACD 柱 | {today['macd_hist']:.3f} | 2 × (DIF - DEA)，正值为多头动能 |
 """
         
         # 添加实时行情数据（量比、换手率等）
@@ -887,6 +942,20 @@ class GeminiAnalyzer:
 | 90%筹码集中度 | {chip.get('concentration_90', 0):.2%} | <15%为集中 |
 | 70%筹码集中度 | {chip.get('concentration_70', 0):.2%} | |
 | 筹码状态 | {chip.get('chip_status', '未知')} | |
+"""
+        
+        # 添加日内结构（分钟线）
+        if 'intraday' in context:
+            intraday = context['intraday']
+            avg_share = intraday.get('avg_opening_volume_share')
+            prompt += f"""
+### 日内结构（{intraday.get('date', '')} 分钟线）
+| 指标 | 数值 | 说明 |
+|------|------|------|
+| 开盘区间(前30分钟) | {intraday.get('opening_range_low', 'N/A')} - {intraday.get('opening_range_high', 'N/A')} 元 | 收盘突破/跌破区间反映日内方向 |
+| 成交均价(VWAP) | {intraday.get('vwap', 'N/A')} 元 | 收盘价相对均价的强弱 |
+| 早盘30分钟成交占比 | {intraday.get('opening_volume_share', 0):.1%} | 近期均值 {f"{avg_share:.1%}" if avg_share is not None else 'N/A'} |
+| 尾盘30分钟成交占比 | {intraday.get('closing_volume_share', 0):.1%} | 尾盘异动关注资金动向 |
 """
         
         # 添加趋势分析结果（基于交易理念的预判）
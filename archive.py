@@ -0,0 +1,337 @@
+# -*- coding: utf-8 -*-
+"""
+===================================
+A股自选股智能分析系统 - 日线归档（Arrow IPC）
+===================================
+
+问题：
+- 全部历史都在行存的 stock_daily 表中，回测/研究要扫描多年、数千只股票时，
+  经 ORM 逐行创建对象，既慢又占内存
+
+方案：
+1. 按 年份/代码前缀 分区镜像 stock_daily：
+   data/archive/year=2024/prefix=60.arrow
+2. 使用无压缩的 Arrow IPC（Feather v2）文件：可直接内存映射，
+   读取时列数组零拷贝引用映射内存（Parquet 需要解码，无法映射）
+3. 增量同步：manifest.json 记录已同步的 updated_at 水位，每次运行后只导出水位之后变化的行，
+   与所在分区的已有数据合并（同代码同日期以新值为准）后原子替换。
+   日线写入在 DatabaseManager 的写锁内生成 updated_at 并提交，提交顺序与时间戳顺序一致，
+   因此按水位增量导出不会遗漏（多个进程同时写同一数据库时可用 sync(full=True) 重建）
+4. 读取只打开年份、代码前缀覆盖的分区，按代码/日期过滤后返回 numpy 列数组，不经过 ORM
+
+依赖：
+- pyarrow（可选，ARCHIVE_ENABLED=true 或调用归档接口时需要）
+"""
+
+import json
+import logging
+import os
+import threading
+from datetime import date, datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:
+    pa = None
+
+from indicators import INDICATOR_COLUMNS
+from storage import DAILY_VALUE_COLUMNS, DatabaseManager
+
+logger = logging.getLogger(__name__)
+
+
+VALUE_COLUMNS = DAILY_VALUE_COLUMNS + INDICATOR_COLUMNS
+
+ARCHIVE_COLUMNS = ['code', 'date'] + VALUE_COLUMNS
+
+# 代码前缀长度（60/68 沪市主板/科创板，00/30 深市主板/创业板，51/15 ETF 等）
+PREFIX_LENGTH = 2
+
+MANIFEST_NAME = 'manifest.json'
+
+
+def _schema() -> 'pa.Schema':
+    return pa.schema(
+        [('code', pa.string()), ('date', pa.date32())]
+        + [(col, pa.float64()) for col in VALUE_COLUMNS]
+    )
+
+
+class DailyArchive:
+    """
+    日线归档（按年份/代码前缀分区的 Arrow IPC 文件，线程安全）
+
+    Args:
+        root: 归档根目录
+    """
+
+    def __init__(self, root: str = './data/archive'):
+        if pa is None:
+            logger.error("pyarrow 库未安装，请执行: pip install pyarrow")
+            raise ImportError("请安装 pyarrow 库: pip install pyarrow")
+
+        self.root = Path(root)
+        self._lock = threading.Lock()
+        self._schema = _schema()
+
+    def _path(self, year: int, prefix: str) -> Path:
+        return self.root / f"year={year}" / f"prefix={prefix}.arrow"
+
+    # === 同步 ===
+
+    def load_manifest(self) -> Dict[str, str]:
+        """读取同步状态（watermark: 已同步的 updated_at 水位，ISO 格式）"""
+        path = self.root / MANIFEST_NAME
+        if not path.exists():
+            return {}
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _save_manifest(self, manifest: Dict[str, str]) -> None:
+        path = self.root / MANIFEST_NAME
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix('.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, path)
+
+    def sync(self, db: DatabaseManager, full: bool = False) -> int:
+        """
+        将数据库中水位之后变化的日线同步到归档
+
+        Args:
+            db: 数据库管理器
+            full: 是否忽略水位全量导出
+
+        Returns:
+            本次导出的行数
+        """
+        manifest = {} if full else self.load_manifest()
+        watermark = manifest.get('watermark')
+        since = datetime.fromisoformat(watermark) if watermark else None
+
+        exported = 0
+        latest = None
+        for batch in db.iter_daily_changes(since):
+            if batch.empty:
+                continue
+            batch_latest = batch['updated_at'].max().to_pydatetime()
+            latest = batch_latest if latest is None else max(latest, batch_latest)
+            exported += self.write(batch)
+
+        if latest is not None:
+            if watermark:
+                latest = max(latest, datetime.fromisoformat(watermark))
+            manifest['watermark'] = latest.isoformat()
+            manifest['synced_at'] = datetime.now().isoformat(timespec='seconds')
+            self._save_manifest(manifest)
+
+        logger.info(f"[归档] 同步完成: 导出 {exported} 行（水位 {manifest.get('watermark')}）")
+        return exported
+
+    # === 写入 ===
+
+    def write(self, df: pd.DataFrame) -> int:
+        """
+        写入日线（可跨年份、跨代码），按分区与已有数据合并
+
+        Args:
+            df: 至少包含 code/date 列的 DataFrame，其余缺失的数值列记为 NaN
+
+        Returns:
+            写入的行数
+        """
+        if df is None or df.empty:
+            return 0
+
+        df = df.copy()
+        df['date'] = pd.to_datetime(df['date'])
+        for col in VALUE_COLUMNS:
+            df[col] = pd.to_numeric(df[col], errors='coerce') if col in df.columns else np.nan
+        df['code'] = df['code'].astype(str)
+
+        years = df['date'].dt.year
+        prefixes = df['code'].str[:PREFIX_LENGTH]
+        for (year, prefix), part in df[ARCHIVE_COLUMNS].groupby([years, prefixes], sort=False):
+            self._merge_partition(int(year), prefix, part)
+        return len(df)
+
+    def _merge_partition(self, year: int, prefix: str, new: pd.DataFrame) -> None:
+        """与分区已有数据合并（同代码同日期以新数据为准），按 code、date 排序后原子替换"""
+        path = self._path(year, prefix)
+        with self._lock:
+            if path.exists():
+                # 旧版本写入的分区可能缺少后来新增的列，补为 NaN
+                existing = self._open(path).to_pandas().reindex(columns=ARCHIVE_COLUMNS)
+                existing['date'] = pd.to_datetime(existing['date'])
+                new = pd.concat([existing, new], ignore_index=True)
+
+            merged = (
+                new.drop_duplicates(['code', 'date'], keep='last')
+                .sort_values(['code', 'date'], kind='stable')
+            )
+            merged['date'] = merged['date'].dt.date
+            table = pa.Table.from_pandas(merged, schema=self._schema, preserve_index=False)
+
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(f"{path.stem}.{threading.get_ident()}.tmp")
+            with pa.OSFile(str(tmp), 'wb') as sink:
+                with pa.ipc.new_file(sink, self._schema) as writer:
+                    writer.write_table(table)
+            os.replace(tmp, path)
+
+    # === 读取 ===
+
+    @staticmethod
+    def _open(path: Path) -> 'pa.Table':
+        """内存映射整个分区文件（列数据零拷贝引用映射内存）"""
+        return pa.ipc.open_file(pa.memory_map(str(path), 'r')).read_all()
+
+    def partitions(
+        self,
+        start_year: Optional[int] = None,
+        end_year: Optional[int] = None,
+        prefixes: Optional[Iterable[str]] = None
+    ) -> List[Path]:
+        """区间覆盖的分区文件（按年份、前缀升序）"""
+        if not self.root.is_dir():
+            return []
+
+        prefixes = set(prefixes) if prefixes is not None else None
+        result = []
+        for year_dir in sorted(self.root.glob('year=*')):
+            year = int(year_dir.name[len('year='):])
+            if (start_year and year < start_year) or (end_year and year > end_year):
+                continue
+            for path in sorted(year_dir.glob('prefix=*.arrow')):
+                if prefixes is None or path.stem[len('prefix='):] in prefixes:
+                    result.append(path)
+        return result
+
+    def read_table(
+        self,
+        codes: Optional[Iterable[str]] = None,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+        columns: Optional[List[str]] = None
+    ) -> 'pa.Table':
+        """
+        读取区间内的日线（Arrow Table）
+
+        行按分区（年份、代码前缀）排列，分区内按 code、date 升序；
+        不需要按代码/日期过滤的分区直接引用映射内存，不复制
+
+        Args:
+            codes: 股票代码（None 表示全部）
+            start: 开始日期（含）
+            end: 结束日期（含）
+            columns: 返回的列（默认全部）
+        """
+        codes = list(codes) if codes is not None else None
+        prefixes = {code[:PREFIX_LENGTH] for code in codes} if codes is not None else None
+        paths = self.partitions(start.year if start else None, end.year if end else None, prefixes)
+
+        code_set = pa.array(codes, pa.string()) if codes is not None else None
+        tables = []
+        for path in paths:
+            table = self._open(path)
+            mask = None
+            if code_set is not None:
+                mask = pc.is_in(table['code'], value_set=code_set)
+            if start is not None and int(path.parent.name[len('year='):]) == start.year:
+                mask = _and(mask, pc.greater_equal(table['date'], pa.scalar(start, pa.date32())))
+            if end is not None and int(path.parent.name[len('year='):]) == end.year:
+                mask = _and(mask, pc.less_equal(table['date'], pa.scalar(end, pa.date32())))
+            if mask is not None:
+                table = table.filter(mask)
+            if columns is not None:
+                table = table.select(columns)
+            tables.append(table)
+
+        if not tables:
+            schema = self._schema if columns is None else pa.schema([self._schema.field(c) for c in columns])
+            return schema.empty_table()
+        return pa.concat_tables(tables)
+
+    def read(
+        self,
+        codes: Optional[Iterable[str]] = None,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+        columns: Optional[List[str]] = None
+    ) -> Dict[str, np.ndarray]:
+        """
+        读取区间内的日线（numpy 列数组）
+
+        数值列为 float64（缺失值为 NaN），date 为 datetime64[D]，code 为字符串对象数组
+        """
+        table = self.read_table(codes, start, end, columns)
+        result = {}
+        for name in table.column_names:
+            column = table[name]
+            if name == 'date':
+                result[name] = column.to_numpy().astype('datetime64[D]')
+            elif name == 'code':
+                result[name] = column.to_numpy(zero_copy_only=False)
+            else:
+                result[name] = column.to_numpy(zero_copy_only=False).astype(np.float64, copy=False)
+        return result
+
+    def read_frame(
+        self,
+        codes: Optional[Iterable[str]] = None,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+        columns: Optional[List[str]] = None
+    ) -> pd.DataFrame:
+        """读取区间内的日线（DataFrame，date 列为 datetime64）"""
+        return pd.DataFrame(self.read(codes, start, end, columns))
+
+
+def _and(mask: Optional['pa.ChunkedArray'], other: 'pa.ChunkedArray') -> 'pa.ChunkedArray':
+    return other if mask is None else pc.and_(mask, other)
+
+
+_daily_archive: Optional[DailyArchive] = None
+_daily_archive_lock = threading.Lock()
+
+
+def get_daily_archive() -> DailyArchive:
+    """获取全局日线归档（按配置懒加载）"""
+    global _daily_archive
+    if _daily_archive is None:
+        with _daily_archive_lock:
+            if _daily_archive is None:
+                from config import get_config
+                _daily_archive = DailyArchive(get_config().archive_dir)
+    return _daily_archive
+
+
+def set_daily_archive(archive: Optional[DailyArchive]) -> None:
+    """替换全局日线归档（用于测试或基准测试时指定目录）"""
+    global _daily_archive
+    with _daily_archive_lock:
+        _daily_archive = archive
+
+
+if __name__ == "__main__":
+    import time
+
+    logging.basicConfig(level=logging.INFO)
+
+    db = DatabaseManager.get_instance()
+    archive = get_daily_archive()
+
+    start = time.perf_counter()
+    rows = archive.sync(db)
+    print(f"同步 {rows} 行，耗时 {time.perf_counter() - start:.2f} 秒")
+
+    start = time.perf_counter()
+    data = archive.read()
+    print(f"读取 {len(data.get('code', []))} 行，耗时 {(time.perf_counter() - start) * 1000:.1f} ms")
@@ -0,0 +1,661 @@
+# -*- coding: utf-8 -*-
+"""
+===================================
+A股自选股智能分析系统 - 性能基准测试
+===================================
+
+用法：
+    python benchmark.py normalize                 # 标准化/清洗/指标计算（单帧耗时与内存分配）
+    python benchmark.py normalize --bars 5000     # 指定每帧K线数（模拟长历史回填）
+    python benchmark.py pipeline                  # 流水线扩展性（合成数据源，10 → 5000 只股票）
+    python benchmark.py pipeline --stocks 100,1000 --latency 0.2 --failure-rate 0.05
+    python benchmark.py storage                   # SQLite 并发读写（默认模式 vs 性能模式）
+    python benchmark.py archive                   # 多年多股票扫描：逐只查询 vs Arrow 归档（需 pyarrow）
+    python benchmark.py read                      # 单只股票读取：ORM 对象 vs PriceSeries（耗时与内存分配）
+    python benchmark.py schema                    # stock_daily 结构 v1（自增 id + 索引）vs v2（聚簇主键）
+
+说明：
+- 所有基准均使用本地生成的数据，不访问网络
+- 内存分配使用 tracemalloc 统计峰值（numpy/pandas 的数组分配均会被计入）
+"""
+
+import argparse
+import gc
+import logging
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+def _make_akshare_frames(count: int, bars: int, seed: int = 42) -> List[pd.DataFrame]:
+    """生成 ak.stock_zh_a_hist 格式的原始数据（中文列名、字符串日期、附加列）"""
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=bars).strftime('%Y-%m-%d')
+    frames = []
+    for _ in range(count):
+        close = 10 + np.cumsum(rng.normal(0, 0.2, bars)).clip(-9, None)
+        volume = rng.integers(10_000, 1_000_000, bars)
+        frames.append(pd.DataFrame({
+            '日期': dates,
+            '股票代码': '600519',
+            '开盘': close * (1 + rng.normal(0, 0.005, bars)),
+            '收盘': close,
+            '最高': close * 1.01,
+            '最低': close * 0.99,
+            '成交量': volume,
+            '成交额': volume * close * 100,
+            '振幅': rng.uniform(0, 5, bars),
+            '涨跌幅': rng.normal(0, 2, bars),
+            '涨跌额': rng.normal(0, 0.2, bars),
+            '换手率': rng.uniform(0, 3, bars),
+        }))
+    return frames
+
+
+def _legacy_process(raw: pd.DataFrame, stock_code: str) -> pd.DataFrame:
+    """重构前的处理流程（逐步 copy、逐列 to_numeric、pandas rolling），作为对照组"""
+    df = raw.copy()
+    df = df.rename(columns={
+        '日期': 'date', '开盘': 'open', '收盘': 'close', '最高': 'high',
+        '最低': 'low', '成交量': 'volume', '成交额': 'amount', '涨跌幅': 'pct_chg',
+    })
+    df['code'] = stock_code
+    df = df[['code', 'date', 'open', 'high', 'low', 'close', 'volume', 'amount', 'pct_chg']]
+
+    df = df.copy()
+    df['date'] = pd.to_datetime(df['date'])
+    for col in ['open', 'high', 'low', 'close', 'volume', 'amount', 'pct_chg']:
+        df[col] = pd.to_numeric(df[col], errors='coerce')
+    df = df.dropna(subset=['close', 'volume'])
+    df = df.sort_values('date', ascending=True).reset_index(drop=True)
+
+    df = df.copy()
+    df['ma5'] = df['close'].rolling(window=5, min_periods=1).mean()
+    df['ma10'] = df['close'].rolling(window=10, min_periods=1).mean()
+    df['ma20'] = df['close'].rolling(window=20, min_periods=1).mean()
+    avg_volume_5 = df['volume'].rolling(window=5, min_periods=1).mean()
+    df['volume_ratio'] = df['volume'] / avg_volume_5.shift(1)
+    df['volume_ratio'] = df['volume_ratio'].fillna(1.0)
+    for col in ['ma5', 'ma10', 'ma20', 'volume_ratio']:
+        df[col] = df[col].round(2)
+    return df
+
+
+def _measure(func: Callable[[pd.DataFrame], pd.DataFrame], frames: List[pd.DataFrame]) -> Tuple[float, float]:
+    """
+    Returns:
+        (单帧平均耗时 ms, 单帧平均峰值内存分配 KB)
+    """
+    # 预热
+    func(frames[0])
+
+    gc.collect()
+    start = time.perf_counter()
+    for raw in frames:
+        func(raw)
+    elapsed = (time.perf_counter() - start) / len(frames) * 1000
+
+    # 内存统计单独跑（tracemalloc 本身会拖慢执行）
+    sample = frames[:min(len(frames), 20)]
+    peaks = []
+    for raw in sample:
+        gc.collect()
+        tracemalloc.start()
+        func(raw)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return elapsed, float(np.mean(peaks)) / 1024
+
+
+def bench_normalize(bars: int, frames: int) -> Dict[str, Tuple[float, float]]:
+    """标准化 + 清洗 + 技术指标：重构前 vs 当前实现"""
+    from data_provider.akshare_fetcher import AkshareFetcher
+
+    fetcher = AkshareFetcher()
+    data = _make_akshare_frames(frames, bars)
+
+    results = {
+        'legacy': _measure(lambda raw: _legacy_process(raw, '600519'), data),
+        'current': _measure(lambda raw: fetcher._process_raw_data(raw, '600519'), data),
+    }
+
+    # 结果一致性校验
+    expected = _legacy_process(data[0], '600519')
+    actual = fetcher._process_raw_data(data[0], '600519')
+    for col in ['close', 'volume', 'ma5', 'ma10', 'ma20', 'volume_ratio']:
+        if not np.allclose(expected[col].astype(float), actual[col].astype(float), equal_nan=True):
+            raise AssertionError(f"列 {col} 与重构前结果不一致")
+
+    print(f"\n=== normalize: {frames} 帧 × {bars} 根K线 ===")
+    print(f"{'实现':<10}{'单帧耗时(ms)':>14}{'峰值分配(KB)':>14}")
+    for name, (ms, kb) in results.items():
+        print(f"{name:<10}{ms:>14.3f}{kb:>14.1f}")
+    legacy_ms, legacy_kb = results['legacy']
+    cur_ms, cur_kb = results['current']
+    print(f"加速 {legacy_ms / cur_ms:.2f}x，峰值分配减少 {(1 - cur_kb / legacy_kb) * 100:.0f}%")
+    return results
+
+
+def _offline_calendar() -> None:
+    """使用工作日日历（基准测试不访问交易所日历接口）"""
+    from data_provider.trade_calendar import set_trade_calendar, _weekday_calendar
+
+    today = date.today()
+    set_trade_calendar(_weekday_calendar(date(today.year - 10, 1, 1), date(today.year, 12, 31)))
+
+
+def _synthetic_codes(count: int) -> List[str]:
+    """生成 count 个沪市股票代码（避开 ETF 前缀）"""
+    return [str(600000 + i) for i in range(count)]
+
+
+def _prepare_analysis(pipeline, code: str) -> bool:
+    """
+    分析前的全部本地工作（实时行情、筹码、趋势、上下文组装），不含搜索与 LLM 调用
+
+    Returns:
+        是否成功组装出分析上下文
+    """
+    quote = pipeline.akshare_fetcher.get_realtime_quote(code)
+    chip = pipeline.get_chip_distribution(code)
+    window = pipeline.db.get_analysis_window(code)
+    trend = pipeline.trend_analyzer.analyze(window, code)
+    context = pipeline.db.get_analysis_context(code, window=window)
+    if context is None:
+        return False
+    pipeline._enhance_context(context, quote, chip, trend, quote.name if quote else code)
+    return True
+
+
+def bench_pipeline(
+    stock_counts: List[int],
+    workers: int,
+    latency: float,
+    failure_rate: float,
+    async_fetch: bool
+) -> List[Dict[str, float]]:
+    """
+    流水线扩展性：合成数据源 + 临时数据库，按股票数量逐级测量
+
+    每个规模依次测量：
+    - cold:    空数据库，dry-run 全量获取并入库
+    - warm:    再跑一次 dry-run，全部命中断点续传
+    - prepare: 分析前的本地工作（实时行情、筹码、趋势、上下文），不含 LLM
+    """
+    from config import Config
+    from storage import DatabaseManager
+    from data_provider.cache import FrameCache, set_frame_cache
+
+    logging.getLogger().setLevel(logging.ERROR)
+    _offline_calendar()
+    set_frame_cache(FrameCache(mode='off'))
+
+    rows = []
+    for count in stock_counts:
+        workdir = tempfile.mkdtemp(prefix='bench_pipeline_')
+        os.environ.update({
+            'DATABASE_PATH': os.path.join(workdir, 'bench.db'),
+            'DATA_SYNTHETIC': 'true',
+            'SYNTHETIC_LATENCY': str(latency),
+            'SYNTHETIC_FAILURE_RATE': str(failure_rate),
+            'DATA_ASYNC_FETCH': 'true' if async_fetch else 'false',
+            'TUSHARE_BULK_EOD': 'false',
+        })
+        Config.reset_instance()
+        DatabaseManager.reset_instance()
+
+        try:
+            from main import StockAnalysisPipeline
+
+            pipeline = StockAnalysisPipeline(max_workers=workers)
+            codes = _synthetic_codes(count)
+
+            start = time.perf_counter()
+            pipeline.run(codes, dry_run=True, send_notification=False)
+            cold = time.perf_counter() - start
+
+            start = time.perf_counter()
+            pipeline.run(codes, dry_run=True, send_notification=False)
+            warm = time.perf_counter() - start
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                prepared = sum(executor.map(lambda c: _prepare_analysis(pipeline, c), codes))
+            prepare = time.perf_counter() - start
+
+            rows.append({
+                'stocks': count, 'cold': cold, 'warm': warm,
+                'prepare': prepare, 'prepared': prepared,
+            })
+        finally:
+            DatabaseManager.reset_instance()
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"\n=== pipeline: 合成数据源，并发 {workers}，注入延迟 {latency}s，失败率 {failure_rate:.0%}"
+          f"{'，异步获取' if async_fetch else ''} ===")
+    print(f"{'股票数':>8}{'cold(s)':>10}{'只/秒':>10}{'warm(s)':>10}{'prepare(s)':>12}{'上下文':>8}")
+    for row in rows:
+        print(f"{row['stocks']:>8}{row['cold']:>10.2f}{row['stocks'] / row['cold']:>10.1f}"
+              f"{row['warm']:>10.2f}{row['prepare']:>12.2f}{row['prepared']:>8}")
+    return rows
+
+
+def _run_storage_round(
+    db,
+    frames: Dict[str, pd.DataFrame],
+    writers: int,
+    readers: int
+) -> Dict[str, float]:
+    """并发写入全部 frames，同时 readers 个线程持续随机读取，直到写入完成"""
+    codes = list(frames)
+    done = threading.Event()
+    read_latencies: List[float] = []
+    errors: List[str] = []
+    lock = threading.Lock()
+
+    def write(code: str) -> int:
+        try:
+            return db.save_daily_data(frames[code], code, 'bench').written
+        except Exception as e:
+            with lock:
+                errors.append(str(e))
+            return 0
+
+    def read_loop(seed: int) -> None:
+        rng = random.Random(seed)
+        local = []
+        while not done.is_set():
+            code = rng.choice(codes)
+            start = time.perf_counter()
+            try:
+                db.get_recent_frame(code, 60)
+                db.get_latest_date(code)
+            except Exception as e:
+                with lock:
+                    errors.append(str(e))
+                continue
+            local.append(time.perf_counter() - start)
+        with lock:
+            read_latencies.extend(local)
+
+    reader_threads = [threading.Thread(target=read_loop, args=(i,)) for i in range(readers)]
+    for t in reader_threads:
+        t.start()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=writers) as executor:
+        rows = sum(executor.map(write, codes))
+    elapsed = time.perf_counter() - start
+
+    done.set()
+    for t in reader_threads:
+        t.join()
+
+    return {
+        'rows_per_s': rows / elapsed,
+        'reads_per_s': len(read_latencies) / elapsed,
+        'read_p95_ms': float(np.percentile(read_latencies, 95)) * 1000 if read_latencies else 0.0,
+        'locked': sum('locked' in e for e in errors),
+        'errors': len(errors),
+        'elapsed': elapsed,
+    }
+
+
+def bench_storage(codes: int, bars: int, writers: int, readers: int) -> Dict[str, Dict[str, float]]:
+    """
+    SQLite 并发读写：默认模式 vs 性能模式（WAL + PRAGMA + 线程 Session + 写串行化）
+
+    writers 个线程并发写入 codes 只股票各 bars 根K线，
+    同时 readers 个线程随机读取最近 60 根K线与最新日期
+    """
+    from storage import DatabaseManager
+    from data_provider.synthetic_fetcher import SyntheticFetcher
+
+    logging.getLogger().setLevel(logging.ERROR)
+    _offline_calendar()
+
+    fetcher = SyntheticFetcher()
+    frames = {code: fetcher.get_daily_data(code, days=bars) for code in _synthetic_codes(codes)}
+
+    results = {}
+    for perf_mode in (False, True):
+        workdir = tempfile.mkdtemp(prefix='bench_storage_')
+        DatabaseManager.reset_instance()
+        try:
+            db = DatabaseManager(db_url=f"sqlite:///{os.path.join(workdir, 'bench.db')}", perf_mode=perf_mode)
+            # 预先写入一半股票，读线程从一开始就有数据可读
+            half = dict(list(frames.items())[:max(1, codes // 2)])
+            for code, df in half.items():
+                db.save_daily_data(df, code, 'bench')
+            rest = {code: df for code, df in frames.items() if code not in half} or half
+            results['perf' if perf_mode else 'default'] = _run_storage_round(db, rest, writers, readers)
+        finally:
+            DatabaseManager.reset_instance()
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"\n=== storage: {codes} 只股票 × {bars} 根K线，写线程 {writers}，读线程 {readers} ===")
+    print(f"{'模式':<10}{'写入(行/s)':>12}{'读取(次/s)':>12}{'读P95(ms)':>12}{'locked':>8}{'错误':>6}")
+    for name, row in results.items():
+        print(f"{name:<10}{row['rows_per_s']:>12.0f}{row['reads_per_s']:>12.0f}"
+              f"{row['read_p95_ms']:>12.2f}{row['locked']:>8}{row['errors']:>6}")
+    return results
+
+
+def bench_archive(codes: int, years: int) -> Dict[str, float]:
+    """
+    多年、多股票历史扫描：逐只 get_data_range（SQLite）vs 日线归档（内存映射 Arrow）
+
+    同时测量首次全量同步与无变化时的增量同步耗时
+    """
+    from storage import DatabaseManager
+    from archive import DailyArchive
+    from data_provider.synthetic_fetcher import SyntheticFetcher
+
+    logging.getLogger().setLevel(logging.ERROR)
+    _offline_calendar()
+
+    code_list = _synthetic_codes(codes)
+    fetcher = SyntheticFetcher()
+    bars = years * 250
+
+    workdir = tempfile.mkdtemp(prefix='bench_archive_')
+    DatabaseManager.reset_instance()
+    try:
+        db = DatabaseManager(db_url=f"sqlite:///{os.path.join(workdir, 'bench.db')}")
+        db.save_daily_data_many({code: fetcher.get_daily_data(code, days=bars) for code in code_list}, 'bench')
+        archive = DailyArchive(os.path.join(workdir, 'archive'))
+
+        start = time.perf_counter()
+        rows = archive.sync(db)
+        full_sync = time.perf_counter() - start
+
+        start = time.perf_counter()
+        archive.sync(db)
+        incremental_sync = time.perf_counter() - start
+
+        first, last = date(1900, 1, 1), date(2100, 1, 1)
+        start = time.perf_counter()
+        db_rows = sum(len(db.get_data_range(code, first, last)) for code in code_list)
+        per_code = time.perf_counter() - start
+
+        start = time.perf_counter()
+        archive_rows = len(archive.read(code_list)['code'])
+        arrow = time.perf_counter() - start
+    finally:
+        DatabaseManager.reset_instance()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    result = {
+        'rows': rows, 'full_sync_s': full_sync, 'incremental_sync_s': incremental_sync,
+        'per_code_s': per_code, 'archive_s': arrow,
+    }
+    print(f"\n=== archive: {codes} 只股票 × {bars} 根K线 ===")
+    print(f"全量同步 {rows} 行: {full_sync:.2f}s，增量同步（无变化）: {incremental_sync:.2f}s")
+    print(f"全量扫描 逐只查询: {per_code:.2f}s（{db_rows} 行），归档: {arrow * 1000:.1f}ms（{archive_rows} 行）")
+    return result
+
+
+def bench_read(bars: int, reads: int) -> Dict[str, Tuple[float, float]]:
+    """
+    单只股票最近 N 根K线的读取：ORM StockDaily 对象 + to_dict（重构前）vs PriceSeries
+
+    Returns:
+        实现 -> (单次耗时 ms, 单次峰值内存分配 KB)
+    """
+    from sqlalchemy import desc, select
+    from storage import DatabaseManager, StockDaily
+    from data_provider.synthetic_fetcher import SyntheticFetcher
+
+    logging.getLogger().setLevel(logging.ERROR)
+    _offline_calendar()
+
+    code = '600519'
+    workdir = tempfile.mkdtemp(prefix='bench_read_')
+    DatabaseManager.reset_instance()
+    try:
+        db = DatabaseManager(db_url=f"sqlite:///{os.path.join(workdir, 'bench.db')}")
+        db.save_daily_data(SyntheticFetcher().get_daily_data(code, days=max(bars, 250)), code, 'bench')
+
+        def orm_read(_):
+            with db.get_session() as session:
+                records = session.execute(
+                    select(StockDaily).where(StockDaily.code == code)
+                    .order_by(desc(StockDaily.date)).limit(bars)
+                ).scalars().all()
+                return [record.to_dict() for record in records]
+
+        def series_read(_):
+            series = db.get_analysis_window(code, bars)
+            return series.row(-1)
+
+        if orm_read(None)[0] != series_read(None):
+            raise AssertionError("PriceSeries 与 ORM 读取结果不一致")
+
+        samples = [None] * reads
+        results = {'orm': _measure(orm_read, samples), 'series': _measure(series_read, samples)}
+    finally:
+        DatabaseManager.reset_instance()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"\n=== read: 单只股票最近 {bars} 根K线，{reads} 次 ===")
+    print(f"{'实现':<10}{'单次耗时(ms)':>14}{'峰值分配(KB)':>14}")
+    for name, (ms, kb) in results.items():
+        print(f"{name:<10}{ms:>14.3f}{kb:>14.1f}")
+    orm_ms, orm_kb = results['orm']
+    cur_ms, cur_kb = results['series']
+    print(f"加速 {orm_ms / cur_ms:.2f}x，峰值分配减少 {orm_kb / cur_kb:.1f}x")
+    return results
+
+
+def _legacy_stock_daily(metadata) -> 'Table':
+    """stock_daily v1 结构：自增 id 主键 + (code, date) 唯一约束 + ix_code_date + code/date 单列索引"""
+    from sqlalchemy import Column, Index, Integer, Table, UniqueConstraint
+    from storage import StockDaily
+
+    columns = [Column('id', Integer, primary_key=True, autoincrement=True)]
+    for column in StockDaily.__table__.columns:
+        if column.name in ('code', 'date'):
+            columns.append(Column(column.name, column.type, nullable=False, index=True))
+        else:
+            columns.append(Column(column.name, column.type))
+    return Table(
+        'stock_daily', metadata, *columns,
+        UniqueConstraint('code', 'date', name='uix_code_date'),
+        Index('ix_code_date', 'code', 'date'),
+        Index('ix_stock_daily_updated_at', 'updated_at'),
+    )
+
+
+def bench_schema(codes: int, bars: int, days: int, reads: int, rounds: int = 3) -> Dict[str, Dict[str, float]]:
+    """
+    stock_daily 结构 v1 vs v2 的写入与区间读取吞吐
+
+    - 回填：每只股票一个事务写入全部历史（INSERT ... ON CONFLICT DO UPDATE，与存储层相同）
+    - 日常追加：每个交易日一个事务，每只股票追加一根K线（写入散布在各代码的主键区间）
+    - 区间读取：随机股票最近 120 根K线（ORDER BY date DESC LIMIT）与一年区间，两种结构交替读取 rounds 轮取最好；
+      一年区间另测只在 SQLite 内扫描（COUNT）的吞吐——取回约 250 行 × 30 列时，
+      大部分时间花在 fetchall 构造 Python 元组上，两种结构的差别在整体读取中接近噪声
+    - 迁移：v1 数据库执行 migrations.migrate 升级到 v2 的耗时
+    """
+    from sqlalchemy import MetaData, create_engine
+    from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+    from storage import Base, DAILY_VALUE_COLUMNS, StockDaily
+    from migrations import migrate
+    from data_provider.synthetic_fetcher import SyntheticFetcher
+
+    logging.getLogger().setLevel(logging.ERROR)
+    _offline_calendar()
+
+    fetcher = SyntheticFetcher()
+    code_list = _synthetic_codes(codes)
+    now = pd.Timestamp.now().to_pydatetime()
+    history: Dict[str, List[dict]] = {}
+    for code in code_list:
+        df = fetcher.get_daily_data(code, days=bars + days)
+        records = []
+        for row in df.to_dict('records'):
+            params = {col: (None if pd.isna(row.get(col)) else float(row[col])) for col in DAILY_VALUE_COLUMNS}
+            params.update(code=code, date=pd.Timestamp(row['date']).date(), data_source='bench',
+                          created_at=now, updated_at=now)
+            records.append(params)
+        history[code] = records
+
+    def upsert(conn, table, params):
+        stmt = sqlite_insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['code', 'date'],
+            set_={col: stmt.excluded[col] for col in DAILY_VALUE_COLUMNS + ['updated_at']},
+        )
+        conn.execute(stmt, params)
+
+    rng = random.Random(0)
+    read_codes = [rng.choice(code_list) for _ in range(reads)]
+    results: Dict[str, Dict[str, float]] = {}
+    engines = {}
+    workdir = tempfile.mkdtemp(prefix='bench_schema_')
+    try:
+        for layout in ('v1', 'v2'):
+            path = os.path.join(workdir, f'{layout}.db')
+            engine = create_engine(f"sqlite:///{path}")
+            table = _legacy_stock_daily(MetaData()) if layout == 'v1' else StockDaily.__table__
+            table.create(engine)
+
+            start = time.perf_counter()
+            for code in code_list:
+                with engine.begin() as conn:
+                    upsert(conn, table, history[code][:bars])
+            backfill = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for day in range(bars, bars + days):
+                with engine.begin() as conn:
+                    upsert(conn, table, [history[code][day] for code in code_list if day < len(history[code])])
+            append = time.perf_counter() - start
+
+            results[layout] = {
+                'backfill_rows_per_s': codes * bars / backfill,
+                'append_rows_per_s': codes * days / append,
+                'size_mb': os.path.getsize(path) / 1024 / 1024,
+            }
+            engines[layout] = engine
+
+        # 区间读取直接使用 sqlite3 游标，只比较存储结构；两种结构交替读取多轮取最好成绩，
+        # 避免先后顺序与缓存预热的影响
+        columns = ', '.join(['date'] + DAILY_VALUE_COLUMNS)
+        last = history[code_list[0]][-1]['date']
+        first = last.replace(year=last.year - 1)
+        queries = {
+            'window_reads_per_s': (f"SELECT {columns} FROM stock_daily WHERE code = ? ORDER BY date DESC LIMIT 120", ()),
+            'range_reads_per_s': (f"SELECT {columns} FROM stock_daily WHERE code = ? AND date BETWEEN ? AND ? "
+                                  f"ORDER BY date", (first.isoformat(), last.isoformat())),
+            # 只在 SQLite 内部扫描一年区间，不把行转为 Python 元组
+            'range_scans_per_s': ("SELECT COUNT(close) FROM stock_daily WHERE code = ? AND date BETWEEN ? AND ?",
+                                  (first.isoformat(), last.isoformat())),
+        }
+        for round_no in range(rounds):
+            for layout in (('v1', 'v2') if round_no % 2 == 0 else ('v2', 'v1')):
+                raw = engines[layout].raw_connection()
+                try:
+                    cursor = raw.cursor()
+                    for key, (sql, params) in queries.items():
+                        start = time.perf_counter()
+                        for code in read_codes:
+                            cursor.execute(sql, (code,) + params).fetchall()
+                        rate = reads / (time.perf_counter() - start)
+                        results[layout][key] = max(results[layout].get(key, 0.0), rate)
+                    cursor.close()
+                finally:
+                    raw.close()
+
+        engine = engines['v1']
+        Base.metadata.create_all(engine)
+        start = time.perf_counter()
+        migrate(engine, Base.metadata)
+        results['v1']['migrate_s'] = time.perf_counter() - start
+        with engine.connect() as conn:
+            migrated = conn.exec_driver_sql('SELECT COUNT(*) FROM stock_daily').scalar()
+        if migrated != codes * (bars + days):
+            raise AssertionError(f"迁移后行数不一致: {migrated}")
+    finally:
+        for engine in engines.values():
+            engine.dispose()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"\n=== schema: {codes} 只股票 × {bars} 根K线回填 + {days} 个交易日追加，"
+          f"{reads} 次读取 × {rounds} 轮取最好 ===")
+    print(f"{'结构':<6}{'回填(行/s)':>12}{'追加(行/s)':>12}{'120根(次/s)':>13}{'一年(次/s)':>12}"
+          f"{'一年扫描(次/s)':>15}{'大小(MB)':>10}")
+    for name, row in results.items():
+        print(f"{name:<6}{row['backfill_rows_per_s']:>12.0f}{row['append_rows_per_s']:>12.0f}"
+              f"{row['window_reads_per_s']:>13.0f}{row['range_reads_per_s']:>12.0f}"
+              f"{row['range_scans_per_s']:>15.0f}{row['size_mb']:>10.1f}")
+    print(f"v1 → v2 迁移 {codes * (bars + days)} 行: {results['v1']['migrate_s']:.2f}s")
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='性能基准测试（离线）')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p_norm = sub.add_parser('normalize', help='标准化/清洗/指标计算')
+    p_norm.add_argument('--bars', type=int, default=1250, help='每帧K线数（默认约 5 年）')
+    p_norm.add_argument('--frames', type=int, default=200, help='帧数')
+
+    p_pipe = sub.add_parser('pipeline', help='流水线扩展性（合成数据源，不访问网络）')
+    p_pipe.add_argument('--stocks', default='10,100,1000,5000', help='逗号分隔的股票数量')
+    p_pipe.add_argument('--workers', type=int, default=3, help='线程池并发数')
+    p_pipe.add_argument('--latency', type=float, default=0.0, help='每次请求的注入延迟（秒）')
+    p_pipe.add_argument('--failure-rate', type=float, default=0.0, help='请求失败概率')
+    p_pipe.add_argument('--async-fetch', action='store_true', help='使用异步接口预先获取日线')
+
+    p_store = sub.add_parser('storage', help='SQLite 并发读写（默认模式 vs 性能模式）')
+    p_store.add_argument('--codes', type=int, default=200, help='股票数')
+    p_store.add_argument('--bars', type=int, default=250, help='每只股票的K线数')
+    p_store.add_argument('--writers', type=int, default=8, help='写线程数')
+    p_store.add_argument('--readers', type=int, default=8, help='读线程数')
+
+    p_arch = sub.add_parser('archive', help='多年多股票扫描：逐只查询 vs Arrow 归档（需 pyarrow）')
+    p_arch.add_argument('--codes', type=int, default=300, help='股票数')
+    p_arch.add_argument('--years', type=int, default=3, help='每只股票的年数（每年 250 根K线）')
+
+    p_read = sub.add_parser('read', help='单只股票读取：ORM 对象 vs PriceSeries')
+    p_read.add_argument('--bars', type=int, default=120, help='每次读取的K线数（默认与分析窗口相同）')
+    p_read.add_argument('--reads', type=int, default=200, help='读取次数')
+
+    p_schema = sub.add_parser('schema', help='stock_daily 结构 v1 vs v2（写入与区间读取吞吐）')
+    p_schema.add_argument('--codes', type=int, default=300, help='股票数')
+    p_schema.add_argument('--bars', type=int, default=750, help='每只股票回填的K线数')
+    p_schema.add_argument('--days', type=int, default=20, help='日常追加的交易日数')
+    p_schema.add_argument('--reads', type=int, default=2000, help='区间读取次数')
+    p_schema.add_argument('--rounds', type=int, default=3, help='读取轮数（两种结构交替，取最好）')
+
+    args = parser.parse_args()
+
+    if args.command == 'normalize':
+        bench_normalize(args.bars, args.frames)
+    elif args.command == 'pipeline':
+        counts = [int(x) for x in args.stocks.split(',') if x.strip()]
+        bench_pipeline(counts, args.workers, args.latency, args.failure_rate, args.async_fetch)
+    elif args.command == 'storage':
+        bench_storage(args.codes, args.bars, args.writers, args.readers)
+    elif args.command == 'archive':
+        bench_archive(args.codes, args.years)
+    elif args.command == 'read':
+        bench_read(args.bars, args.reads)
+    elif args.command == 'schema':
+        bench_schema(args.codes, args.bars, args.days, args.reads, args.rounds)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
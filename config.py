@@ -49,6 +49,10 @@ class Config:
     openai_base_url: Optional[str] = None  # 如: https://api.openai.com/v1
     openai_model: str = "gpt-4o-mini"  # OpenAI 兼容模型名称
     
+    # 分析结果复用：输入（不含实时行情的上下文、模型、提示词版本）与当天已保存结果一致时
+    # 不再搜索、不再调用 LLM；新闻不参与比较，默认关闭
+    analysis_reuse_enabled: bool = False
+    
     # === 搜索引擎配置（支持多 Key 负载均衡）===
     tavily_api_keys: List[str] = field(default_factory=list)  # Tavily API Keys
     serpapi_keys: List[str] = field(default_factory=list)  # SerpAPI Keys
@@ -59,6 +63,12 @@ class Config:
     # === 数据库配置 ===
     database_path: str = "./data/stock_analysis.db"
     
+    # SQLite 性能模式：WAL + 调优 PRAGMA、线程独立 Session、写操作串行化
+    db_perf_mode: bool = False
+    db_mmap_mb: float = 256.0          # mmap_size（MB）
+    db_cache_mb: float = 64.0          # 每个连接的页缓存（MB）
+    db_busy_timeout: float = 30.0      # 等待写锁的超时（秒）
+    
     # === 日志配置 ===
     log_dir: str = "./logs"  # 日志文件目录
     log_level: str = "INFO"  # 日志级别
@@ -71,15 +81,56 @@ class Config:
     schedule_enabled: bool = False            # 是否启用定时任务
     schedule_time: str = "18:00"              # 每日推送时间（HH:MM 格式）
     market_review_enabled: bool = True        # 是否启用大盘复盘
+    schedule_trading_days_only: bool = True   # 只在 A 股交易日执行定时任务
     
     # === 流控配置（防封禁关键参数）===
     # Akshare 请求间隔范围（秒）
     akshare_sleep_min: float = 2.0
     akshare_sleep_max: float = 5.0
     
+    # 全市场实时行情快照缓存有效期（秒），个股分析与大盘复盘共享
+    realtime_cache_ttl: float = 60.0
+    
+    # 日线数据就绪时间（北京时间 HH:MM，收盘 15:00 + 数据源发布延迟）：
+    # 交易日此时间之前运行时，最近一个完整交易日按前一个交易日计算
+    market_data_ready_time: str = "15:30"
+    
     # Tushare 每分钟最大请求数（免费配额）
     tushare_rate_limit_per_minute: int = 80
     
+    # Tushare 批量模式：按交易日一次拉取全市场日线，再按自选股过滤
+    tushare_bulk_eod: bool = False
+    tushare_bulk_keep_all: bool = False  # 保留全市场数据（不按自选股过滤）
+    
+    # 对冲请求：主数据源超过等待预算未返回时，并行请求下一个数据源
+    data_hedge_enabled: bool = False
+    data_hedge_percentile: float = 95.0      # 等待预算取该数据源历史耗时的分位数
+    data_hedge_default_delay: float = 10.0   # 历史样本不足时的等待预算（秒）
+    
+    # 异步获取：分析前用异步接口并发获取所有股票的日线数据
+    data_async_fetch: bool = False
+    
+    # 标准化日线磁盘缓存：off（关闭）/ readwrite（读写）/ replay（只读回放，不访问网络）
+    data_cache_mode: str = "off"
+    data_cache_dir: str = "./data/frame_cache"
+    data_cache_ttl: float = 6 * 3600.0       # 含今天的区间的有效期（秒），历史区间不过期
+    data_cache_max_mb: float = 512.0         # 缓存总大小上限（MB），超出后按 LRU 淘汰
+    
+    # 合成数据源：替换所有真实数据源（离线基准测试/演示，不访问网络）
+    data_synthetic: bool = False
+    synthetic_seed: int = 0
+    synthetic_latency: float = 0.0           # 每次请求的注入延迟（秒）
+    synthetic_failure_rate: float = 0.0      # 请求失败的概率
+    
+    # 分钟线：分析时获取最近交易日的1分钟K线，提供开盘区间、日内成交量分布
+    minute_bars_enabled: bool = False
+    minute_data_dir: str = "./data/minute"
+    minute_history_days: int = 20            # 日内结构对比的历史交易日数
+    
+    # 日线归档：每次运行后将 stock_daily 的变化增量同步为按年份/代码前缀分区的 Arrow 文件（需 pyarrow）
+    archive_enabled: bool = False
+    archive_dir: str = "./data/archive"
+    
     # 重试配置
     max_retries: int = 3
     retry_base_delay: float = 1.0
@@ -147,10 +198,15 @@ class Config:
             openai_api_key=os.getenv('OPENAI_API_KEY'),
             openai_base_url=os.getenv('OPENAI_BASE_URL'),
             openai_model=os.getenv('OPENAI_MODEL', 'gpt-4o-mini'),
+            analysis_reuse_enabled=os.getenv('ANALYSIS_REUSE_ENABLED', 'false').lower() == 'true',
             tavily_api_keys=tavily_api_keys,
             serpapi_keys=serpapi_keys,
             wechat_webhook_url=os.getenv('WECHAT_WEBHOOK_URL'),
             database_path=os.getenv('DATABASE_PATH', './data/stock_analysis.db'),
+            db_perf_mode=os.getenv('DB_PERF_MODE', 'false').lower() == 'true',
+            db_mmap_mb=float(os.getenv('DB_MMAP_MB', '256')),
+            db_cache_mb=float(os.getenv('DB_CACHE_MB', '64')),
+            db_busy_timeout=float(os.getenv('DB_BUSY_TIMEOUT', '30')),
             log_dir=os.getenv('LOG_DIR', './logs'),
             log_level=os.getenv('LOG_LEVEL', 'INFO'),
             max_workers=int(os.getenv('MAX_WORKERS', '3')),
@@ -158,6 +214,28 @@ class Config:
             schedule_enabled=os.getenv('SCHEDULE_ENABLED', 'false').lower() == 'true',
             schedule_time=os.getenv('SCHEDULE_TIME', '18:00'),
             market_review_enabled=os.getenv('MARKET_REVIEW_ENABLED', 'true').lower() == 'true',
+            schedule_trading_days_only=os.getenv('SCHEDULE_TRADING_DAYS_ONLY', 'true').lower() == 'true',
+            realtime_cache_ttl=float(os.getenv('REALTIME_CACHE_TTL', '60')),
+            market_data_ready_time=os.getenv('MARKET_DATA_READY_TIME', '15:30'),
+            tushare_bulk_eod=os.getenv('TUSHARE_BULK_EOD', 'false').lower() == 'true',
+            tushare_bulk_keep_all=os.getenv('TUSHARE_BULK_KEEP_ALL', 'false').lower() == 'true',
+            data_hedge_enabled=os.getenv('DATA_HEDGE_ENABLED', 'false').lower() == 'true',
+            data_hedge_percentile=float(os.getenv('DATA_HEDGE_PERCENTILE', '95')),
+            data_hedge_default_delay=float(os.getenv('DATA_HEDGE_DEFAULT_DELAY', '10')),
+            data_async_fetch=os.getenv('DATA_ASYNC_FETCH', 'false').lower() == 'true',
+            data_cache_mode=os.getenv('DATA_CACHE_MODE', 'off').lower(),
+            data_cache_dir=os.getenv('DATA_CACHE_DIR', './data/frame_cache'),
+            data_cache_ttl=float(os.getenv('DATA_CACHE_TTL', '21600')),
+            data_cache_max_mb=float(os.getenv('DATA_CACHE_MAX_MB', '512')),
+            data_synthetic=os.getenv('DATA_SYNTHETIC', 'false').lower() == 'true',
+            synthetic_seed=int(os.getenv('SYNTHETIC_SEED', '0')),
+            synthetic_latency=float(os.getenv('SYNTHETIC_LATENCY', '0')),
+            synthetic_failure_rate=float(os.getenv('SYNTHETIC_FAILURE_RATE', '0')),
+            minute_bars_enabled=os.getenv('MINUTE_BARS_ENABLED', 'false').lower() == 'true',
+            minute_data_dir=os.getenv('MINUTE_DATA_DIR', './data/minute'),
+            minute_history_days=int(os.getenv('MINUTE_HISTORY_DAYS', '20')),
+            archive_enabled=os.getenv('ARCHIVE_ENABLED', 'false').lower() == 'true',
+            archive_dir=os.getenv('ARCHIVE_DIR', './data/archive'),
         )
     
     @classmethod
@@ -15,6 +15,7 @@ from .akshare_fetcher import AkshareFetcher
 from .tushare_fetcher import TushareFetcher
 from .baostock_fetcher import BaostockFetcher
 from .yfinance_fetcher import YfinanceFetcher
+from .synthetic_fetcher import SyntheticFetcher
 
 __all__ = [
     'BaseFetcher',
@@ -23,4 +24,5 @@ __all__ = [
     'TushareFetcher',
     'BaostockFetcher',
     'YfinanceFetcher',
+    'SyntheticFetcher',
 ]
@@ -9,7 +9,7 @@ AkshareFetcher - 主数据源 (Priority 1)
 风险：爬虫机制易被反爬封禁
 
 防封禁策略：
-1. 每次请求前随机休眠 2-5 秒
+1. 全局令牌桶流控：所有实例、所有线程合计每 2-5 秒一次请求
 2. 随机轮换 User-Agent
 3. 使用 tenacity 实现指数退避重试
 
@@ -20,11 +20,13 @@ AkshareFetcher - 主数据源 (Priority 1)
 
 import logging
 import random
+import threading
 import time
 from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Callable, Tuple
 
+import numpy as np
 import pandas as pd
 from tenacity import (
     retry,
@@ -34,7 +36,10 @@ from tenacity import (
     before_sleep_log,
 )
 
-from .base import BaseFetcher, DataFetchError, RateLimitError, STANDARD_COLUMNS
+from .base import BaseFetcher, DataFetchError, RateLimitError, STANDARD_COLUMNS, MINUTE_COLUMNS
+from .trade_calendar import get_trade_calendar
+from .rate_limiter import TokenBucket, get_rate_limiter
+from .singleflight import SingleFlight
 
 
 @dataclass
@@ -181,14 +186,229 @@ USER_AGENTS = [
 ]
 
 
-# 缓存实时行情数据（避免重复请求）
-_realtime_cache: Dict[str, Any] = {
-    'data': None,
-    'timestamp': 0,
-    'ttl': 60  # 60秒缓存有效期
+# ak.stock_zh_a_hist_min_em / ak.fund_etf_hist_min_em 列名 -> 分钟线标准列名
+MINUTE_COLUMN_MAPPING = {
+    '时间': 'time',
+    '开盘': 'open',
+    '收盘': 'close',
+    '最高': 'high',
+    '最低': 'low',
+    '成交量': 'volume',
+    '成交额': 'amount',
 }
 
 
+# ak.stock_cyq_em 列名 -> ChipDistribution 字段名
+CHIP_COLUMNS = {
+    '日期': 'date',
+    '获利比例': 'profit_ratio',
+    '平均成本': 'avg_cost',
+    '90成本-低': 'cost_90_low',
+    '90成本-高': 'cost_90_high',
+    '90集中度': 'concentration_90',
+    '70成本-低': 'cost_70_low',
+    '70成本-高': 'cost_70_high',
+    '70集中度': 'concentration_70',
+}
+
+
+# 实时行情快照需要解析的列：原始列名 -> 字段名
+# 只解析 RealtimeQuote 和大盘统计用到的列，其余列直接丢弃
+SPOT_COLUMNS = {
+    '最新价': 'price',
+    '涨跌幅': 'change_pct',
+    '涨跌额': 'change_amount',
+    '量比': 'volume_ratio',
+    '换手率': 'turnover_rate',
+    '振幅': 'amplitude',
+    '市盈率-动态': 'pe_ratio',
+    '市净率': 'pb_ratio',
+    '总市值': 'total_mv',
+    '流通市值': 'circ_mv',
+    '60日涨跌幅': 'change_60d',
+    '52周最高': 'high_52w',
+    '52周最低': 'low_52w',
+    '成交额': 'amount',  # 仅用于大盘统计
+}
+
+# 数值较大、需要保留完整精度的列（市值、成交额，单位为元）；其余价格/比率列存为 float32
+_SPOT_FLOAT64_FIELDS = frozenset({'total_mv', 'circ_mv', 'amount'})
+
+# float32 还原为 Python float 时保留的小数位（行情价格、比率最多 3 位小数，ETF 价格为 3 位）
+_SPOT_FLOAT32_DECIMALS = 3
+
+# RealtimeQuote 中的数值字段
+_QUOTE_FIELDS = (
+    'price', 'change_pct', 'change_amount', 'volume_ratio', 'turnover_rate',
+    'amplitude', 'pe_ratio', 'pb_ratio', 'total_mv', 'circ_mv',
+    'change_60d', 'high_52w', 'low_52w',
+)
+
+
+class SpotSnapshot:
+    """
+    全市场实时行情快照（只读）
+    
+    - 按列存储为数值数组，不保留原始 DataFrame：
+      价格/比率列为 float32（全市场约 5000 行，每列 20KB），市值/成交额保留 float64
+    - 建立 代码 -> 行号 索引，单只股票查询为 O(1)
+    """
+    
+    __slots__ = ('kind', 'fetched_at', 'names', 'columns', '_index')
+    
+    def __init__(self, kind: str, df: pd.DataFrame, fetched_at: float):
+        self.kind = kind
+        self.fetched_at = fetched_at
+        
+        codes = df['代码'].astype(str).to_numpy()
+        self._index: Dict[str, int] = {code: i for i, code in enumerate(codes)}
+        
+        if '名称' in df.columns:
+            self.names = df['名称'].astype(str).to_numpy()
+        else:
+            self.names = np.full(len(codes), '', dtype=object)
+        
+        # '-' 等非数值统一转为 NaN，读取时再按 0 处理
+        self.columns: Dict[str, np.ndarray] = {}
+        for src_col, field_name in SPOT_COLUMNS.items():
+            if src_col in df.columns:
+                dtype = np.float64 if field_name in _SPOT_FLOAT64_FIELDS else np.float32
+                self.columns[field_name] = pd.to_numeric(
+                    df[src_col], errors='coerce'
+                ).to_numpy(dtype=dtype)
+    
+    def __len__(self) -> int:
+        return len(self._index)
+    
+    def __contains__(self, code: str) -> bool:
+        return code in self._index
+    
+    def column(self, field_name: str) -> np.ndarray:
+        """获取整列数据（不存在时返回全 NaN 数组）"""
+        arr = self.columns.get(field_name)
+        if arr is None:
+            return np.full(len(self), np.nan)
+        return arr
+    
+    def get_quote(self, code: str) -> Optional[RealtimeQuote]:
+        """按代码查询实时行情，不存在时返回 None"""
+        i = self._index.get(code)
+        if i is None:
+            return None
+        
+        values = {}
+        for field_name in _QUOTE_FIELDS:
+            arr = self.columns.get(field_name)
+            if arr is None or np.isnan(arr[i]):
+                continue
+            if arr.dtype == np.float32:
+                # 去掉 float32 的表示误差（如 1800.04 -> 1800.0400390625）
+                values[field_name] = round(float(arr[i]), _SPOT_FLOAT32_DECIMALS)
+            else:
+                values[field_name] = float(arr[i])
+        
+        return RealtimeQuote(code=code, name=str(self.names[i]), **values)
+
+
+# 快照数据源：kind -> (API 名称, 获取函数)
+_SPOT_LOADERS: Dict[str, Tuple[str, Callable[[Any], pd.DataFrame]]] = {
+    'stock': ('ak.stock_zh_a_spot_em', lambda ak: ak.stock_zh_a_spot_em()),
+    'etf': ('ak.fund_etf_spot_em', lambda ak: ak.fund_etf_spot_em()),
+}
+
+
+class SpotSnapshotCache:
+    """
+    进程级实时行情快照缓存
+    
+    - 股票（stock_zh_a_spot_em）与 ETF（fund_etf_spot_em）分别缓存
+    - TTL 内所有调用方（个股分析、大盘复盘）共享同一份快照
+    - 并发请求经 SingleFlight 合并：只有一个线程下载，其余线程共享结果，
+      下载失败时所有等待者收到同一个异常，不会逐个重试
+    """
+    
+    def __init__(self, ttl: float = 60):
+        self.ttl = ttl
+        self._snapshots: Dict[str, SpotSnapshot] = {}
+        self._flight = SingleFlight("spot")
+    
+    def _get_fresh(self, kind: str) -> Optional[SpotSnapshot]:
+        snapshot = self._snapshots.get(kind)
+        if snapshot is not None and time.time() - snapshot.fetched_at < self.ttl:
+            return snapshot
+        return None
+    
+    def get(self, kind: str, before_fetch: Optional[Callable[[], None]] = None) -> SpotSnapshot:
+        """
+        获取快照（过期或不存在时重新下载）
+        
+        Args:
+            kind: 'stock' 或 'etf'
+            before_fetch: 真正发起网络请求前的回调（用于流控）
+        """
+        if kind not in _SPOT_LOADERS:
+            raise ValueError(f"未知的快照类型: {kind}")
+        
+        snapshot = self._get_fresh(kind)
+        if snapshot is not None:
+            return snapshot
+        
+        return self._flight.do(kind, self._load, kind, before_fetch)
+    
+    def _load(self, kind: str, before_fetch: Optional[Callable[[], None]]) -> SpotSnapshot:
+        """下载快照（同一 kind 同一时刻只有一个线程执行）"""
+        # 二次检查：上一轮合并请求可能刚刚完成刷新
+        snapshot = self._get_fresh(kind)
+        if snapshot is not None:
+            return snapshot
+        
+        import akshare as ak
+        
+        if before_fetch is not None:
+            before_fetch()
+        
+        api_name, loader = _SPOT_LOADERS[kind]
+        logger.info(f"[API调用] {api_name}() 获取全市场实时行情快照...")
+        api_start = time.time()
+        df = loader(ak)
+        api_elapsed = time.time() - api_start
+        
+        if df is None or df.empty:
+            raise DataFetchError(f"{api_name} 返回空数据")
+        
+        snapshot = SpotSnapshot(kind, df, time.time())
+        self._snapshots[kind] = snapshot
+        logger.info(f"[API返回] {api_name} 成功: 返回 {len(snapshot)} 条数据, 耗时 {api_elapsed:.2f}s")
+        return snapshot
+    
+    def invalidate(self, kind: Optional[str] = None) -> None:
+        """清除缓存（kind 为空时清除全部）"""
+        if kind is None:
+            self._snapshots.clear()
+        else:
+            self._snapshots.pop(kind, None)
+
+
+_spot_cache: Optional[SpotSnapshotCache] = None
+_spot_cache_lock = threading.Lock()
+
+
+def get_spot_cache() -> SpotSnapshotCache:
+    """获取进程级快照缓存（TTL 从配置读取）"""
+    global _spot_cache
+    if _spot_cache is None:
+        with _spot_cache_lock:
+            if _spot_cache is None:
+                from config import get_config
+                _spot_cache = SpotSnapshotCache(ttl=get_config().realtime_cache_ttl)
+    return _spot_cache
+
+
+def get_spot_snapshot(kind: str = 'stock', before_fetch: Optional[Callable[[], None]] = None) -> SpotSnapshot:
+    """获取全市场实时行情快照的快捷方式"""
+    return get_spot_cache().get(kind, before_fetch=before_fetch)
+
+
 class AkshareFetcher(BaseFetcher):
     """
     Akshare 数据源实现
@@ -197,13 +417,14 @@ class AkshareFetcher(BaseFetcher):
     数据来源：东方财富网爬虫
     
     关键策略：
-    - 每次请求前随机休眠 2.0-5.0 秒
+    - 全局令牌桶流控：相邻请求间隔 2.0-5.0 秒（所有实例、线程共享）
     - 随机 User-Agent 轮换
     - 失败后指数退避重试（最多3次）
     """
     
     name = "AkshareFetcher"
     priority = 1
+    adjust = "qfq"  # 前复权
     
     def __init__(self, sleep_min: float = 2.0, sleep_max: float = 5.0):
         """
@@ -215,7 +436,6 @@ class AkshareFetcher(BaseFetcher):
         """
         self.sleep_min = sleep_min
         self.sleep_max = sleep_max
-        self._last_request_time: Optional[float] = None
     
     def _set_random_user_agent(self) -> None:
         """
@@ -237,22 +457,20 @@ class AkshareFetcher(BaseFetcher):
         """
         强制执行速率限制
         
-        策略：
-        1. 检查距离上次请求的时间间隔
-        2. 如果间隔不足，补充休眠时间
-        3. 然后再执行随机 jitter 休眠
+        所有 AkshareFetcher 实例、所有线程共享同一个令牌桶（见 rate_limiter）：
+        1. 相邻两次请求至少间隔 sleep_min 秒
+        2. 额外叠加 0 ~ (sleep_max - sleep_min) 秒的随机 jitter
+        3. 等待中的线程按到达顺序依次放行
         """
-        if self._last_request_time is not None:
-            elapsed = time.time() - self._last_request_time
-            min_interval = self.sleep_min
-            if elapsed < min_interval:
-                additional_sleep = min_interval - elapsed
-                logger.debug(f"补充休眠 {additional_sleep:.2f} 秒")
-                time.sleep(additional_sleep)
-        
-        # 执行随机 jitter 休眠
-        self.random_sleep(self.sleep_min, self.sleep_max)
-        self._last_request_time = time.time()
+        self.rate_limiter().acquire()
+    
+    def rate_limiter(self) -> TokenBucket:
+        """Akshare 全局令牌桶（相邻请求间隔 sleep_min 秒 + 随机 jitter）"""
+        return get_rate_limiter(
+            'akshare',
+            rate=1.0 / max(self.sleep_min, 0.01),
+            jitter=self.sleep_max - self.sleep_min,
+        )
     
     @staticmethod
     def is_etf(code: str) -> bool:
@@ -346,8 +564,6 @@ class AkshareFetcher(BaseFetcher):
         
         兼容股票和 ETF 的列名
         """
-        df = df.copy()
-        
         # 列名映射
         column_mapping = {
             '日期': 'date',
@@ -360,26 +576,68 @@ class AkshareFetcher(BaseFetcher):
             '涨跌幅': 'pct_chg',
         }
         
-        # 重命名列
-        df = df.rename(columns=column_mapping)
+        df = self._standardize(df, stock_code, column_mapping)
         
-        # 添加股票代码列
-        df['code'] = stock_code
+        # 缺少涨跌幅时由收盘价计算（ETF数据列名通常一致，但以防万一）
+        if 'pct_chg' not in df.columns and 'close' in df.columns:
+            df['pct_chg'] = df['close'].pct_change().fillna(0) * 100
         
-        # 只保留需要的列
-        keep_cols = ['code'] + STANDARD_COLUMNS
-        # 确保所有标准列都存在（ETF数据列名通常一致，但以防万一）
-        for col in keep_cols:
-            if col not in df.columns and col != 'code':
-                # 如果缺少 pct_chg, 可以计算
-                if col == 'pct_chg' and 'close' in df.columns:
-                    df['pct_chg'] = df['close'].pct_change() * 100
-                    df['pct_chg'] = df['pct_chg'].fillna(0)
+        return df
+    
+    @retry(
+        stop=stop_after_attempt(3),
+        wait=wait_exponential(multiplier=1, min=2, max=30),
+        retry=retry_if_exception_type((ConnectionError, TimeoutError)),
+        before_sleep=before_sleep_log(logger, logging.WARNING),
+    )
+    def get_minute_data(
+        self,
+        stock_code: str,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None
+    ) -> pd.DataFrame:
+        """
+        获取1分钟K线（不复权）
         
-        existing_cols = [col for col in keep_cols if col in df.columns]
-        df = df[existing_cols]
+        - 股票: ak.stock_zh_a_hist_min_em
+        - ETF: ak.fund_etf_hist_min_em
         
-        return df
+        注意：东方财富1分钟线只提供最近约 5 个交易日
+        """
+        import akshare as ak
+        
+        start_date = start_date or get_trade_calendar().last_trading_day().strftime('%Y-%m-%d')
+        end_date = end_date or start_date
+        
+        self._set_random_user_agent()
+        self._enforce_rate_limit()
+        
+        api_name = "ak.fund_etf_hist_min_em" if self.is_etf(stock_code) else "ak.stock_zh_a_hist_min_em"
+        loader = ak.fund_etf_hist_min_em if self.is_etf(stock_code) else ak.stock_zh_a_hist_min_em
+        logger.info(f"[API调用] {api_name}(symbol={stock_code}, {start_date} ~ {end_date}, period=1)")
+        
+        try:
+            df = loader(
+                symbol=stock_code,
+                start_date=f"{start_date} 09:30:00",
+                end_date=f"{end_date} 15:00:00",
+                period="1",
+                adjust="",
+            )
+        except Exception as e:
+            error_msg = str(e).lower()
+            if any(keyword in error_msg for keyword in ['banned', 'blocked', '频率', 'rate', '限制']):
+                raise RateLimitError(f"Akshare 可能被限流: {e}") from e
+            raise DataFetchError(f"{api_name} 获取数据失败: {e}") from e
+        
+        if df is None or df.empty:
+            raise DataFetchError(f"{api_name} 未查询到 {stock_code} 的分钟线")
+        
+        df = df.rename(columns=MINUTE_COLUMN_MAPPING)
+        df = df[[col for col in MINUTE_COLUMNS if col in df.columns]]
+        df['time'] = pd.to_datetime(df['time'])
+        logger.info(f"[API返回] {api_name} 成功: 返回 {len(df)} 根分钟线")
+        return df.sort_values('time').reset_index(drop=True)
     
     def get_realtime_quote(self, stock_code: str) -> Optional[RealtimeQuote]:
         """
@@ -388,79 +646,25 @@ class AkshareFetcher(BaseFetcher):
         自动区分股票和 ETF：
         - 股票: ak.stock_zh_a_spot_em
         - ETF: ak.fund_etf_spot_em
-        """
-        import akshare as ak
         
+        全市场快照在进程内缓存（见 SpotSnapshotCache），
+        TTL 内多只股票只下载一次，按代码 O(1) 查询
+        """
         try:
-            is_etf_code = self.is_etf(stock_code)
-            
-            # 使用不同的缓存 key
-            cache_key = 'etf' if is_etf_code else 'stock'
-            
-            # 初始化多类型缓存结构 (如果需要)
-            # 这里简单起见，如果类型切换了，就清除缓存重新获取
-            # 或者我们假设一次运行只查一种 或 接受混用时的即时刷新
-            # 更好的做法是 _realtime_cache 存储 { 'stock': ..., 'etf': ... }
-            # 但为了最小化改动，简单处理：
-            
-            # 这里我们分别获取，不依赖全局单一缓存，
-            # 而是检查 _realtime_cache 内容是否包含当前代码类型
-            # 实际上 stock_zh_a_spot_em 和 fund_etf_spot_em 返回结构类似
+            kind = 'etf' if self.is_etf(stock_code) else 'stock'
             
-            # 防封禁策略
-            self._set_random_user_agent()
-            self._enforce_rate_limit()
+            # 防封禁策略：只在真正发起网络请求时执行
+            def _before_fetch():
+                self._set_random_user_agent()
+                self._enforce_rate_limit()
             
-            import time as _time
-            api_start = _time.time()
+            snapshot = get_spot_snapshot(kind, before_fetch=_before_fetch)
             
-            if is_etf_code:
-                logger.info(f"[API调用] ak.fund_etf_spot_em() 获取ETF实时行情...")
-                df = ak.fund_etf_spot_em()
-            else:
-                logger.info(f"[API调用] ak.stock_zh_a_spot_em() 获取A股实时行情...")
-                df = ak.stock_zh_a_spot_em()
-                
-            api_elapsed = _time.time() - api_start
-            logger.info(f"[API返回] 成功: 返回 {len(df)} 条数据, 耗时 {api_elapsed:.2f}s")
-             
-            # 查找指定代码
-            # 注意：ETF 接口返回的列名可能略有不同，需适配
-            row = df[df['代码'] == stock_code]
-            if row.empty:
-                logger.warning(f"[API返回] 未找到 {stock_code} 的实时行情")
+            quote = snapshot.get_quote(stock_code)
+            if quote is None:
+                logger.warning(f"[实时行情] 未找到 {stock_code} 的实时行情")
                 return None
             
-            row = row.iloc[0]
-            
-            # 安全获取字段值
-            def safe_float(val, default=0.0):
-                try:
-                    if pd.isna(val) or val == '-':
-                        return default
-                    return float(val)
-                except:
-                    return default
-            
-            quote = RealtimeQuote(
-                code=stock_code,
-                name=str(row.get('名称', '')),
-                price=safe_float(row.get('最新价')),
-                change_pct=safe_float(row.get('涨跌幅')),
-                change_amount=safe_float(row.get('涨跌额')),
-                volume_ratio=safe_float(row.get('量比')),
-                turnover_rate=safe_float(row.get('换手率')),
-                amplitude=safe_float(row.get('振幅')),
-                # ETF 可能没有 PE/PB/市值
-                pe_ratio=safe_float(row.get('市盈率-动态') if '市盈率-动态' in row else 0),
-                pb_ratio=safe_float(row.get('市净率') if '市净率' in row else 0),
-                total_mv=safe_float(row.get('总市值') if '总市值' in row else 0),
-                circ_mv=safe_float(row.get('流通市值') if '流通市值' in row else 0),
-                change_60d=safe_float(row.get('60日涨跌幅') if '60日涨跌幅' in row else 0),
-                high_52w=safe_float(row.get('52周最高') if '52周最高' in row else 0),
-                low_52w=safe_float(row.get('52周最低') if '52周最低' in row else 0),
-            )
-            
             logger.info(f"[实时行情] {stock_code} {quote.name}: 价格={quote.price}, 涨跌={quote.change_pct}%")
             return quote
             
@@ -468,11 +672,14 @@ class AkshareFetcher(BaseFetcher):
             logger.error(f"[API错误] 获取 {stock_code} 实时行情失败: {e}")
             return None
     
-    def get_chip_distribution(self, stock_code: str) -> Optional[ChipDistribution]:
+    def get_chip_history(self, stock_code: str) -> Optional[pd.DataFrame]:
         """
-        获取筹码分布数据
+        获取筹码分布历史（ak.stock_cyq_em 返回的全部交易日）
         
         注意：ETF 通常没有筹码分布数据，直接返回 None
+        
+        Returns:
+            列为 date + CHIP_COLUMNS 字段的 DataFrame（按日期升序），失败返回 None
         """
         if self.is_etf(stock_code):
             logger.info(f"[{stock_code}] ETF 不支持筹码分布分析，跳过")
@@ -493,42 +700,51 @@ class AkshareFetcher(BaseFetcher):
             
             api_elapsed = _time.time() - api_start
             
-            if df.empty:
+            if df is None or df.empty:
                 logger.warning(f"[API返回] ak.stock_cyq_em 返回空数据, 耗时 {api_elapsed:.2f}s")
                 return None
             
             logger.info(f"[API返回] ak.stock_cyq_em 成功: 返回 {len(df)} 天数据, 耗时 {api_elapsed:.2f}s")
             
-            # 取最新一天的数据
-            latest = df.iloc[-1]
+            df = df.rename(columns=CHIP_COLUMNS)
+            df = df[[col for col in ['date'] + list(CHIP_COLUMNS.values()) if col in df.columns]]
+            df['date'] = pd.to_datetime(df['date'])
+            for col in df.columns.drop('date'):
+                df[col] = pd.to_numeric(df[col], errors='coerce')
             
-            def safe_float(val, default=0.0):
-                try:
-                    if pd.isna(val):
-                        return default
-                    return float(val)
-                except:
-                    return default
-            
-            chip = ChipDistribution(
-                code=stock_code,
-                date=str(latest.get('日期', '')),
-                profit_ratio=safe_float(latest.get('获利比例')),
-                avg_cost=safe_float(latest.get('平均成本')),
-                cost_90_low=safe_float(latest.get('90成本-低')),
-                cost_90_high=safe_float(latest.get('90成本-高')),
-                concentration_90=safe_float(latest.get('90集中度')),
-                cost_70_low=safe_float(latest.get('70成本-低')),
-                cost_70_high=safe_float(latest.get('70成本-高')),
-                concentration_70=safe_float(latest.get('70集中度')),
-            )
-            
-            return chip
+            return df.sort_values('date').reset_index(drop=True)
             
         except Exception as e:
             logger.error(f"[API错误] 获取 {stock_code} 筹码分布失败: {e}")
             return None
     
+    def get_chip_distribution(self, stock_code: str) -> Optional[ChipDistribution]:
+        """
+        获取最新一天的筹码分布数据
+        
+        注意：ETF 通常没有筹码分布数据，直接返回 None
+        需要持久化时使用 get_chip_history 获取完整历史
+        """
+        df = self.get_chip_history(stock_code)
+        if df is None or df.empty:
+            return None
+        
+        latest = df.iloc[-1]
+        
+        def safe_float(val, default=0.0):
+            try:
+                if pd.isna(val):
+                    return default
+                return float(val)
+            except:
+                return default
+        
+        return ChipDistribution(
+            code=stock_code,
+            date=latest['date'].strftime('%Y-%m-%d'),
+            **{field: safe_float(latest.get(field)) for field in CHIP_COLUMNS.values() if field != 'date'}
+        )
+    
     def get_enhanced_data(self, stock_code: str, days: int = 60) -> Dict[str, Any]:
         """
         获取增强数据（历史K线 + 实时行情 + 筹码分布）
@@ -9,15 +9,17 @@ BaostockFetcher - 备用数据源 2 (Priority 3)
 优点：稳定、无配额限制
 
 关键策略：
-1. 管理 bs.login() 和 bs.logout() 生命周期
-2. 使用上下文管理器防止连接泄露
-3. 失败后指数退避重试
+1. 进程级会话（引用计数）：一个批次只登录一次，最后一个使用者退出时登出
+2. baostock 客户端是模块全局单连接，所有查询经同一把锁串行执行
+3. 会话掉线时自动重新登录并重试一次
+4. 失败后指数退避重试
 """
 
 import logging
+import threading
 from contextlib import contextmanager
 from datetime import datetime
-from typing import Optional, Generator
+from typing import Optional, Generator, List
 
 import pandas as pd
 from tenacity import (
@@ -28,11 +30,126 @@ from tenacity import (
     before_sleep_log,
 )
 
-from .base import BaseFetcher, DataFetchError, STANDARD_COLUMNS
+from .base import BaseFetcher, DataFetchError, DataSourceUnavailableError, STANDARD_COLUMNS
 
 logger = logging.getLogger(__name__)
 
 
+class BaostockSession:
+    """
+    进程级 Baostock 会话管理器
+    
+    baostock 的登录状态是模块全局的：任何线程调用 bs.logout()
+    都会让其他线程的查询失败。因此：
+    - 使用引用计数管理生命周期：hold() 时计数 +1，退出时 -1，
+      计数归零且已登录时才登出
+    - 登录延迟到第一次查询时进行，没有用到 Baostock 的批次不会登录
+    - 登录、查询、读取结果集都在同一把锁内完成，避免并发线程交错
+    - 查询返回"未登录"/网络错误时自动重新登录并重试一次
+    """
+    
+    # 需要重新登录的错误关键字（会话过期、网络断开等）
+    _RELOGIN_KEYWORDS = ('未登录', '登录', 'login', '网络', 'network', 'socket')
+    
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._refcount = 0
+        self._logged_in = False
+        self._bs = None
+    
+    def _get_baostock(self):
+        """延迟加载 baostock 模块，避免未安装时报错"""
+        if self._bs is None:
+            import baostock as bs
+            self._bs = bs
+        return self._bs
+    
+    @contextmanager
+    def hold(self) -> Generator['BaostockSession', None, None]:
+        """
+        持有会话（可嵌套、可跨线程）
+        
+        使用示例：
+            with session.hold():
+                # 在这里执行任意次数的查询，只登录一次
+        """
+        with self._lock:
+            self._refcount += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._refcount -= 1
+                if self._refcount == 0 and self._logged_in:
+                    self._logout()
+    
+    def _login(self) -> None:
+        bs = self._get_baostock()
+        login_result = bs.login()
+        if login_result.error_code != '0':
+            raise DataSourceUnavailableError(f"Baostock 登录失败: {login_result.error_msg}")
+        self._logged_in = True
+        logger.debug("Baostock 登录成功")
+    
+    def _logout(self) -> None:
+        try:
+            logout_result = self._get_baostock().logout()
+            if logout_result.error_code == '0':
+                logger.debug("Baostock 登出成功")
+            else:
+                logger.warning(f"Baostock 登出异常: {logout_result.error_msg}")
+        except Exception as e:
+            logger.warning(f"Baostock 登出时发生错误: {e}")
+        finally:
+            self._logged_in = False
+    
+    def _is_session_error(self, error_msg: str) -> bool:
+        msg = (error_msg or '').lower()
+        return any(keyword in msg for keyword in self._RELOGIN_KEYWORDS)
+    
+    def query_history_k_data_plus(self, **kwargs) -> pd.DataFrame:
+        """
+        查询历史K线（串行执行，自动登录/重新登录）
+        
+        Returns:
+            查询结果 DataFrame（列为 baostock 返回的 fields）
+        """
+        with self._lock:
+            bs = self._get_baostock()
+            
+            for attempt in range(2):
+                if not self._logged_in:
+                    self._login()
+                
+                try:
+                    rs = bs.query_history_k_data_plus(**kwargs)
+                except Exception as e:
+                    if attempt == 0:
+                        logger.warning(f"Baostock 查询异常，重新登录后重试: {e}")
+                        self._logged_in = False
+                        continue
+                    raise
+                
+                if rs.error_code != '0':
+                    if attempt == 0 and self._is_session_error(rs.error_msg):
+                        logger.warning(f"Baostock 会话失效（{rs.error_msg}），重新登录后重试")
+                        self._logged_in = False
+                        continue
+                    raise DataFetchError(f"Baostock 查询失败: {rs.error_msg}")
+                
+                data_list: List[list] = []
+                while rs.next():
+                    data_list.append(rs.get_row_data())
+                
+                return pd.DataFrame(data_list, columns=rs.fields)
+        
+        raise DataFetchError("Baostock 查询失败: 重新登录后仍不可用")
+
+
+# 全进程共享一个会话（baostock 客户端本身是模块全局的）
+_session = BaostockSession()
+
+
 class BaostockFetcher(BaseFetcher):
     """
     Baostock 数据源实现
@@ -41,8 +158,8 @@ class BaostockFetcher(BaseFetcher):
     数据来源：证券宝 Baostock API
     
     关键策略：
-    - 使用上下文管理器管理连接生命周期
-    - 每次请求都重新登录/登出，防止连接泄露
+    - 进程级引用计数会话，批次内只登录一次
+    - 查询串行化，会话掉线自动重新登录
     - 失败后指数退避重试
     
     Baostock 特点：
@@ -53,60 +170,23 @@ class BaostockFetcher(BaseFetcher):
     
     name = "BaostockFetcher"
     priority = 3
+    adjust = "qfq"  # adjustflag=2 前复权
+    max_concurrency = 1  # 会话内查询串行执行，多开线程只会在锁上排队
     
     def __init__(self):
         """初始化 BaostockFetcher"""
-        self._bs_module = None
+        self._session = _session
     
-    def _get_baostock(self):
+    def session(self):
         """
-        延迟加载 baostock 模块
+        持有 Baostock 会话（批量获取时使用）
         
-        只在首次使用时导入，避免未安装时报错
+        在 with 块内的所有查询共享一次登录：
+            with fetcher.session():
+                for code in codes:
+                    fetcher.get_daily_data(code)
         """
-        if self._bs_module is None:
-            import baostock as bs
-            self._bs_module = bs
-        return self._bs_module
-    
-    @contextmanager
-    def _baostock_session(self) -> Generator:
-        """
-        Baostock 连接上下文管理器
-        
-        确保：
-        1. 进入上下文时自动登录
-        2. 退出上下文时自动登出
-        3. 异常时也能正确登出
-        
-        使用示例：
-            with self._baostock_session():
-                # 在这里执行数据查询
-        """
-        bs = self._get_baostock()
-        login_result = None
-        
-        try:
-            # 登录 Baostock
-            login_result = bs.login()
-            
-            if login_result.error_code != '0':
-                raise DataFetchError(f"Baostock 登录失败: {login_result.error_msg}")
-            
-            logger.debug("Baostock 登录成功")
-            
-            yield bs
-            
-        finally:
-            # 确保登出，防止连接泄露
-            try:
-                logout_result = bs.logout()
-                if logout_result.error_code == '0':
-                    logger.debug("Baostock 登出成功")
-                else:
-                    logger.warning(f"Baostock 登出异常: {logout_result.error_msg}")
-            except Exception as e:
-                logger.warning(f"Baostock 登出时发生错误: {e}")
+        return self._session.hold()
     
     def _convert_stock_code(self, stock_code: str) -> str:
         """
@@ -153,7 +233,7 @@ class BaostockFetcher(BaseFetcher):
         使用 query_history_k_data_plus() 获取日线数据
         
         流程：
-        1. 使用上下文管理器管理连接
+        1. 持有进程级会话（批次内已登录时直接复用）
         2. 转换股票代码格式
         3. 调用 API 查询数据
         4. 将结果转换为 DataFrame
@@ -163,11 +243,11 @@ class BaostockFetcher(BaseFetcher):
         
         logger.debug(f"调用 Baostock query_history_k_data_plus({bs_code}, {start_date}, {end_date})")
         
-        with self._baostock_session() as bs:
+        with self._session.hold():
             try:
                 # 查询日线数据
                 # adjustflag: 1-后复权，2-前复权，3-不复权
-                rs = bs.query_history_k_data_plus(
+                df = self._session.query_history_k_data_plus(
                     code=bs_code,
                     fields="date,open,high,low,close,volume,amount,pctChg",
                     start_date=start_date,
@@ -176,19 +256,7 @@ class BaostockFetcher(BaseFetcher):
                     adjustflag="2"  # 前复权
                 )
                 
-                if rs.error_code != '0':
-                    raise DataFetchError(f"Baostock 查询失败: {rs.error_msg}")
-                
-                # 转换为 DataFrame
-                data_list = []
-                while rs.next():
-                    data_list.append(rs.get_row_data())
-                
-                if not data_list:
-                    raise DataFetchError(f"Baostock 未查询到 {stock_code} 的数据")
-                
-                df = pd.DataFrame(data_list, columns=rs.fields)
-                
+                # 空结果由 _prepare_frame 处理（区间请求视为已是最新，否则抛出 DataFetchError）
                 return df
                 
             except Exception as e:
@@ -205,31 +273,10 @@ class BaostockFetcher(BaseFetcher):
         
         需要映射到标准列名：
         date, open, high, low, close, volume, amount, pct_chg
-        """
-        df = df.copy()
-        
-        # 列名映射（只需要处理 pctChg）
-        column_mapping = {
-            'pctChg': 'pct_chg',
-        }
-        
-        df = df.rename(columns=column_mapping)
         
-        # 数值类型转换（Baostock 返回的都是字符串）
-        numeric_cols = ['open', 'high', 'low', 'close', 'volume', 'amount', 'pct_chg']
-        for col in numeric_cols:
-            if col in df.columns:
-                df[col] = pd.to_numeric(df[col], errors='coerce')
-        
-        # 添加股票代码列
-        df['code'] = stock_code
-        
-        # 只保留需要的列
-        keep_cols = ['code'] + STANDARD_COLUMNS
-        existing_cols = [col for col in keep_cols if col in df.columns]
-        df = df[existing_cols]
-        
-        return df
+        Baostock 返回的都是字符串，数值转换在 _standardize 中一次完成
+        """
+        return self._standardize(df, stock_code, column_mapping={'pctChg': 'pct_chg'})
 
 
 if __name__ == "__main__":
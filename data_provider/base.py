@@ -9,17 +9,24 @@
 - DataFetcherManager: 策略管理器，实现自动切换
 
 防封禁策略：
-1. 每个 Fetcher 内置流控逻辑
+1. 每个数据源一个全局令牌桶流控（见 rate_limiter）
 2. 失败自动切换到下一个数据源
 3. 指数退避重试机制
+4. 数据源健康度跟踪与熔断（见 source_health）
 """
 
+import asyncio
 import logging
 import random
+import threading
 import time
+import weakref
 from abc import ABC, abstractmethod
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+from contextlib import ExitStack, contextmanager, nullcontext
 from datetime import datetime
-from typing import Optional, List, Tuple
+from typing import Any, Optional, List, Tuple, Dict
 
 import pandas as pd
 import numpy as np
@@ -30,6 +37,12 @@ from tenacity import (
     retry_if_exception_type,
 )
 
+from .cache import get_frame_cache
+from .rate_limiter import TokenBucket, prepaid_tokens
+from .singleflight import SingleFlight
+from .source_health import SourceHealthTracker
+from .trade_calendar import get_trade_calendar
+
 # 配置日志
 logger = logging.getLogger(__name__)
 
@@ -37,6 +50,52 @@ logger = logging.getLogger(__name__)
 # === 标准化列名定义 ===
 STANDARD_COLUMNS = ['date', 'open', 'high', 'low', 'close', 'volume', 'amount', 'pct_chg']
 
+# 分钟线标准列名（time 为K线结束时间，成交量单位为手）
+MINUTE_COLUMNS = ['time', 'open', 'high', 'low', 'close', 'volume', 'amount']
+
+# 增量计算技术指标时需要的历史K线数（MA20 需要前 19 根，量比需要前 5 根）
+INDICATOR_WARMUP_BARS = 20
+
+# 清洗后各数值列的类型（成交量为整数股数，其余为 float64，避免 float32 写库时引入精度尾差）
+FRAME_DTYPES = {
+    'open': np.float64,
+    'high': np.float64,
+    'low': np.float64,
+    'close': np.float64,
+    'volume': np.int64,
+    'amount': np.float64,
+    'pct_chg': np.float64,
+}
+
+
+def _to_datetime64(values, date_format: Optional[str] = None) -> np.ndarray:
+    """任意日期数组 -> 无时区的 datetime64 数组（已是 datetime64 时不转换）"""
+    if isinstance(values, np.ndarray) and values.dtype.kind == 'M':
+        return values
+    index = pd.DatetimeIndex(pd.to_datetime(values, format=date_format))
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    return index.to_numpy()
+
+
+def _to_float_array(values) -> np.ndarray:
+    """任意数值/字符串数组 -> 数值数组（已是数值时不转换，非法值为 NaN）"""
+    values = np.asarray(values)
+    if values.dtype.kind in 'fiu':
+        return values
+    return np.asarray(pd.to_numeric(values, errors='coerce'), dtype=np.float64)
+
+
+def _rolling_mean(values: np.ndarray, window: int) -> np.ndarray:
+    """滚动均值（等价于 rolling(window, min_periods=1).mean()），基于前缀和一次计算"""
+    csum = np.cumsum(values, dtype=np.float64)
+    out = np.empty(len(values), dtype=np.float64)
+    head = min(window, len(values))
+    out[:head] = csum[:head] / np.arange(1, head + 1)
+    if len(values) > window:
+        out[window:] = (csum[window:] - csum[:-window]) / window
+    return out
+
 
 class DataFetchError(Exception):
     """数据获取异常基类"""
@@ -53,6 +112,60 @@ class DataSourceUnavailableError(DataFetchError):
     pass
 
 
+def is_rate_limit_error(error: BaseException) -> bool:
+    """沿异常链判断是否由限流引起（BaseFetcher 会把原始异常包装为 DataFetchError）"""
+    while error is not None:
+        if isinstance(error, RateLimitError):
+            return True
+        error = error.__cause__
+    return False
+
+
+def is_source_error(error: BaseException) -> bool:
+    """
+    沿异常链判断是否为数据源本身的故障（计入健康度与熔断）
+    
+    限流、数据源不可用（未配置、登录失败）、网络传输与超时错误说明数据源出了问题；
+    单只股票无数据、停牌、代码不受支持等只与该股票有关，换数据源重试即可，不计入
+    """
+    while error is not None:
+        if isinstance(error, (RateLimitError, DataSourceUnavailableError, OSError,
+                              asyncio.TimeoutError, FuturesTimeoutError)):
+            return True
+        error = error.__cause__
+    return False
+
+
+# 异步接口：每个数据源一个有界线程池（所有实例共享），阻塞的 SDK 调用在其中执行
+_source_executors: Dict[str, ThreadPoolExecutor] = {}
+_source_executors_lock = threading.Lock()
+
+# 异步接口：每个事件循环、每个数据源一个信号量，限制同时在途的请求数
+_source_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Semaphore]]" = \
+    weakref.WeakKeyDictionary()
+
+
+def _get_source_executor(name: str, max_workers: int) -> ThreadPoolExecutor:
+    executor = _source_executors.get(name)
+    if executor is None:
+        with _source_executors_lock:
+            executor = _source_executors.get(name)
+            if executor is None:
+                executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"aio-{name}")
+                _source_executors[name] = executor
+    return executor
+
+
+def _get_source_semaphore(name: str, limit: int) -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    semaphores = _source_semaphores.setdefault(loop, {})
+    semaphore = semaphores.get(name)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(limit)
+        semaphores[name] = semaphore
+    return semaphore
+
+
 class BaseFetcher(ABC):
     """
     数据源抽象基类
@@ -69,6 +182,8 @@ class BaseFetcher(ABC):
     
     name: str = "BaseFetcher"
     priority: int = 99  # 优先级数字越小越优先
+    adjust: str = ""    # 复权方式（参与磁盘缓存键，不同复权的数据互不混用）
+    max_concurrency: int = 4  # 异步接口下同时在途的请求数（即该数据源线程池大小）
     
     @abstractmethod
     def _fetch_raw_data(self, stock_code: str, start_date: str, end_date: str) -> pd.DataFrame:
@@ -100,117 +215,452 @@ class BaseFetcher(ABC):
         stock_code: str, 
         start_date: Optional[str] = None,
         end_date: Optional[str] = None,
-        days: int = 30
+        days: int = 30,
+        history: Optional[pd.DataFrame] = None
     ) -> pd.DataFrame:
         """
         获取日线数据（统一入口）
         
         流程：
         1. 计算日期范围
-        2. 调用子类获取原始数据
-        3. 标准化列名
+        2. 查询磁盘缓存（见 cache.FrameCache），未命中时调用子类获取原始数据
+        3. 标准化列名、清洗（写入磁盘缓存）
         4. 计算技术指标
         
+        增量模式（传入 history）：
+        - history 为数据库中已有的最近 K 线（至少 INDICATOR_WARMUP_BARS 根）
+        - 技术指标基于 history + 新K线 计算，保证均线连续
+        - 只返回日期晚于 history 的新K线
+        
+        区间请求（显式传入 start_date）只有在区间内没有交易日时才把空结果视为已是最新、
+        返回空 DataFrame；区间内有交易日却返回空表（限流、临时故障、停牌）时抛出 DataFetchError，
+        由 DataFetcherManager 切换到下一个数据源
+        
         Args:
             stock_code: 股票代码
             start_date: 开始日期（可选）
             end_date: 结束日期（可选，默认今天）
             days: 获取天数（当 start_date 未指定时使用）
+            history: 已存储的历史K线（可选，增量模式）
             
         Returns:
-            标准化的 DataFrame，包含技术指标
+            标准化的 DataFrame，包含技术指标（区间内没有交易日时为空）
         """
-        # 计算日期范围
-        if end_date is None:
-            end_date = datetime.now().strftime('%Y-%m-%d')
-        
-        if start_date is None:
-            # 默认获取最近 30 个交易日（按日历日估算，多取一些）
-            from datetime import timedelta
-            start_dt = datetime.strptime(end_date, '%Y-%m-%d') - timedelta(days=days * 2)
-            start_date = start_dt.strftime('%Y-%m-%d')
+        is_range = start_date is not None
+        start_date, end_date = self._resolve_date_range(start_date, end_date, days)
+        allow_empty = is_range and self._range_has_no_sessions(start_date, end_date)
         
         logger.info(f"[{self.name}] 获取 {stock_code} 数据: {start_date} ~ {end_date}")
         
+        cache = get_frame_cache()
+        return self._load_daily(
+            stock_code, start_date, end_date, history, allow_empty,
+            cache.get(self.name, stock_code, start_date, end_date, self.adjust)
+        )
+    
+    def _load_daily(
+        self,
+        stock_code: str,
+        start_date: str,
+        end_date: str,
+        history: Optional[pd.DataFrame],
+        allow_empty: bool,
+        cached: Optional[pd.DataFrame]
+    ) -> pd.DataFrame:
+        """
+        get_daily_data 的获取与计算部分（日期范围已确定、磁盘缓存已查询）
+        
+        Args:
+            allow_empty: 数据源返回空表时是否视为已是最新（区间内没有交易日），否则抛出 DataFetchError
+            cached: 磁盘缓存的查询结果（未命中为 None，此时远程获取）
+        """
+        cache = get_frame_cache()
         try:
-            # Step 1: 获取原始数据
-            raw_df = self._fetch_raw_data(stock_code, start_date, end_date)
-            
-            if raw_df is None or raw_df.empty:
-                raise DataFetchError(f"[{self.name}] 未获取到 {stock_code} 的数据")
-            
-            # Step 2: 标准化列名
-            df = self._normalize_data(raw_df, stock_code)
-            
-            # Step 3: 数据清洗
-            df = self._clean_data(df)
+            # Step 1-3: 缓存或远程获取标准化数据
+            df = cached
+            if df is None:
+                if cache.replay:
+                    raise DataFetchError(f"回放模式下缓存未命中: {stock_code} {start_date}~{end_date}")
+                raw_df = self._fetch_raw_data(stock_code, start_date, end_date)
+                df = self._prepare_frame(raw_df, stock_code, allow_empty=allow_empty)
+                # 空结果不写缓存：当日数据稍后发布时不应命中空表
+                if not df.empty:
+                    cache.put(self.name, stock_code, start_date, end_date, df, self.adjust)
             
             # Step 4: 计算技术指标
-            df = self._calculate_indicators(df)
+            df = self._apply_indicators(df, history)
             
-            logger.info(f"[{self.name}] {stock_code} 获取成功，共 {len(df)} 条数据")
+            if df.empty:
+                logger.info(f"[{self.name}] {stock_code} 在 {start_date} ~ {end_date} 内无新数据，视为已是最新")
+            else:
+                logger.info(f"[{self.name}] {stock_code} 获取成功，共 {len(df)} 条数据")
             return df
             
         except Exception as e:
             logger.error(f"[{self.name}] 获取 {stock_code} 失败: {str(e)}")
             raise DataFetchError(f"[{self.name}] {stock_code}: {str(e)}") from e
     
+    def get_minute_data(
+        self,
+        stock_code: str,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None
+    ) -> pd.DataFrame:
+        """
+        获取1分钟K线（默认不支持，支持的数据源覆盖此方法）
+        
+        Args:
+            start_date: 开始日期 'YYYY-MM-DD'（默认最近一个交易日）
+            end_date: 结束日期 'YYYY-MM-DD'（默认同 start_date）
+        
+        Returns:
+            列为 MINUTE_COLUMNS 的 DataFrame（按时间升序）
+        
+        Raises:
+            DataSourceUnavailableError: 数据源不支持分钟线
+        """
+        raise DataSourceUnavailableError(f"{self.name} 不支持分钟线")
+    
+    def rate_limiter(self) -> Optional[TokenBucket]:
+        """
+        该数据源的全局令牌桶（无流控的数据源返回 None）
+        
+        异步接口在事件循环中等待令牌，工作线程内的同步流控随之跳过
+        """
+        return None
+    
+    async def aget_daily_data(
+        self,
+        stock_code: str,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        days: int = 30,
+        history: Optional[pd.DataFrame] = None
+    ) -> pd.DataFrame:
+        """
+        获取日线数据（异步版本，参数同 get_daily_data）
+        
+        1. 先查磁盘缓存，命中时直接返回，不排队、不消耗流控令牌
+        2. 按数据源的信号量排队，同时在途请求不超过 max_concurrency
+        3. 用 asyncio.sleep 等待流控令牌，等待期间不占用线程
+        4. 阻塞的 SDK 调用放到该数据源的有界线程池中执行
+        """
+        is_range = start_date is not None
+        start_date, end_date = self._resolve_date_range(start_date, end_date, days)
+        allow_empty = is_range and self._range_has_no_sessions(start_date, end_date)
+        
+        # 缓存读取是一次小文件 np.load，直接在事件循环中执行
+        cache = get_frame_cache()
+        cached = cache.get(self.name, stock_code, start_date, end_date, self.adjust)
+        if cached is not None:
+            return self._load_daily(stock_code, start_date, end_date, history, allow_empty, cached)
+        
+        async with _get_source_semaphore(self.name, self.max_concurrency):
+            limiter = self.rate_limiter()
+            if limiter is not None:
+                await limiter.acquire_async()
+            
+            def run() -> pd.DataFrame:
+                logger.info(f"[{self.name}] 获取 {stock_code} 数据: {start_date} ~ {end_date}")
+                with prepaid_tokens(1 if limiter is not None else 0):
+                    return self._load_daily(stock_code, start_date, end_date, history, allow_empty, None)
+            
+            executor = _get_source_executor(self.name, self.max_concurrency)
+            return await asyncio.get_running_loop().run_in_executor(executor, run)
+    
+    async def aget_many(
+        self,
+        stock_codes: List[str],
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        days: int = 30,
+        histories: Optional[Dict[str, pd.DataFrame]] = None
+    ) -> Tuple[Dict[str, pd.DataFrame], Dict[str, str]]:
+        """
+        批量获取多只股票的日线数据（异步版本，返回值同 get_daily_data_many）
+        """
+        histories = histories or {}
+        codes = list(dict.fromkeys(stock_codes))
+        outcomes = await asyncio.gather(
+            *(self.aget_daily_data(code, start_date, end_date, days, histories.get(code)) for code in codes),
+            return_exceptions=True
+        )
+        
+        results: Dict[str, pd.DataFrame] = {}
+        errors: Dict[str, str] = {}
+        for code, outcome in zip(codes, outcomes):
+            if isinstance(outcome, BaseException):
+                errors[code] = str(outcome)
+            else:
+                results[code] = outcome
+        return results, errors
+    
+    def get_daily_data_many(
+        self,
+        stock_codes: List[str],
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        days: int = 30,
+        histories: Optional[Dict[str, pd.DataFrame]] = None
+    ) -> Tuple[Dict[str, pd.DataFrame], Dict[str, str]]:
+        """
+        批量获取多只股票的日线数据
+        
+        默认实现逐只调用 get_daily_data；支持多代码单次请求的数据源
+        （如 Yahoo Finance）覆盖此方法
+        
+        Args:
+            stock_codes: 股票代码列表
+            start_date: 开始日期（可选）
+            end_date: 结束日期（可选，默认今天）
+            days: 获取天数（当 start_date 未指定时使用）
+            histories: 各股票已存储的历史K线（可选，增量模式）
+            
+        Returns:
+            Tuple[成功结果 {代码: DataFrame（无新K线时为空）}, 失败原因 {代码: 错误信息}]
+        """
+        histories = histories or {}
+        results: Dict[str, pd.DataFrame] = {}
+        errors: Dict[str, str] = {}
+        
+        for code in stock_codes:
+            try:
+                results[code] = self.get_daily_data(
+                    code,
+                    start_date=start_date,
+                    end_date=end_date,
+                    days=days,
+                    history=histories.get(code),
+                )
+            except Exception as e:
+                errors[code] = str(e)
+        
+        return results, errors
+    
+    @staticmethod
+    def _resolve_date_range(
+        start_date: Optional[str],
+        end_date: Optional[str],
+        days: int
+    ) -> Tuple[str, str]:
+        """计算日期范围（end_date 默认今天，start_date 按交易日历向前数 days 个交易日）"""
+        if end_date is None:
+            end_date = datetime.now().strftime('%Y-%m-%d')
+        
+        if start_date is None:
+            end_dt = datetime.strptime(end_date, '%Y-%m-%d').date()
+            start_date = get_trade_calendar().shift(end_dt, max(days - 1, 0)).strftime('%Y-%m-%d')
+        
+        return start_date, end_date
+    
+    @staticmethod
+    def _range_has_no_sessions(start_date: str, end_date: str) -> bool:
+        """区间内是否没有交易日（此时数据源返回空表是正常的）"""
+        start = datetime.strptime(start_date, '%Y-%m-%d').date()
+        end = datetime.strptime(end_date, '%Y-%m-%d').date()
+        return get_trade_calendar().trading_days_between(start, end) == 0
+    
+    def _process_raw_data(
+        self,
+        raw_df: pd.DataFrame,
+        stock_code: str,
+        history: Optional[pd.DataFrame] = None
+    ) -> pd.DataFrame:
+        """
+        原始数据 -> 标准化、清洗、带技术指标的 DataFrame
+        """
+        return self._apply_indicators(self._prepare_frame(raw_df, stock_code), history)
+    
+    def _prepare_frame(
+        self,
+        raw_df: pd.DataFrame,
+        stock_code: str,
+        allow_empty: bool = False
+    ) -> pd.DataFrame:
+        """
+        原始数据 -> 标准化、清洗后的 DataFrame（不含技术指标，即磁盘缓存的内容）
+        
+        Args:
+            allow_empty: 原始数据为空时返回空表（区间内没有交易日），否则抛出 DataFetchError
+        """
+        if raw_df is None or raw_df.empty:
+            if allow_empty:
+                return self._clean_data(self._standardize(pd.DataFrame(columns=STANDARD_COLUMNS), stock_code))
+            raise DataFetchError(f"[{self.name}] 未获取到 {stock_code} 的数据")
+        
+        # 标准化列名
+        df = self._normalize_data(raw_df, stock_code)
+        
+        # 数据清洗
+        return self._clean_data(df)
+    
+    def _apply_indicators(
+        self,
+        df: pd.DataFrame,
+        history: Optional[pd.DataFrame] = None
+    ) -> pd.DataFrame:
+        """计算技术指标（传入 history 时为增量模式）"""
+        if history is not None and not history.empty:
+            return self._calculate_indicators_incremental(df, history)
+        return self._calculate_indicators(df)
+    
+    def _calculate_indicators_incremental(
+        self, 
+        df: pd.DataFrame, 
+        history: pd.DataFrame
+    ) -> pd.DataFrame:
+        """
+        基于已存储的历史K线计算新K线的技术指标
+        
+        将 history 的最后 INDICATOR_WARMUP_BARS 根与新K线拼接后计算，
+        再只保留日期晚于 history 的部分
+        """
+        tail = history.tail(INDICATOR_WARMUP_BARS)
+        tail = tail[[col for col in ['code'] + STANDARD_COLUMNS if col in tail.columns]]
+        tail = self._clean_data(tail)
+        last_date = tail['date'].max()
+        
+        merged = pd.concat([tail, df[df['date'] > last_date]], ignore_index=True)
+        merged = self._calculate_indicators(merged)
+        
+        return merged[merged['date'] > last_date].reset_index(drop=True)
+    
+    def _standardize(
+        self,
+        df: pd.DataFrame,
+        stock_code: str,
+        column_mapping: Optional[Dict[str, str]] = None,
+        index_as: Optional[str] = None,
+        date_format: Optional[str] = None
+    ) -> pd.DataFrame:
+        """
+        融合的标准化步骤：一次完成选列、改名、类型转换
+        
+        - 只取映射后属于 STANDARD_COLUMNS 的列，直接引用原始列的数组，不整表复制
+        - 字符串列一次 pd.to_numeric，已是数值的列原样引用
+        - stock_code 为空时保留原始数据的 code 列（全市场批量接口），否则填充 stock_code
+        
+        Args:
+            df: 原始数据
+            stock_code: 股票代码
+            column_mapping: 原始列名 -> 标准列名（同名列无需列出）
+            index_as: 把索引作为该标准列（如 yfinance 的日期索引）
+            date_format: 日期字符串格式（如 Tushare 的 '%Y%m%d'）
+        """
+        mapping = column_mapping or {}
+        
+        if not stock_code and 'code' in df.columns:
+            columns = {'code': df['code'].to_numpy()}
+        else:
+            columns = {'code': np.full(len(df), stock_code, dtype=object)}
+        if index_as:
+            columns[index_as] = df.index
+        
+        sources: Dict[str, str] = {}
+        for src in df.columns:
+            dst = mapping.get(src, src)
+            if dst in STANDARD_COLUMNS and dst not in sources and dst not in columns:
+                sources[dst] = src
+        
+        # 按标准列顺序组装
+        for dst in STANDARD_COLUMNS:
+            if dst == 'date' and 'date' in columns:
+                columns['date'] = _to_datetime64(columns['date'], date_format)
+            elif dst in sources:
+                values = df[sources[dst]].to_numpy()
+                columns[dst] = _to_datetime64(values, date_format) if dst == 'date' else _to_float_array(values)
+        
+        return pd.DataFrame(columns, copy=False)
+    
     def _clean_data(self, df: pd.DataFrame) -> pd.DataFrame:
         """
         数据清洗
         
         处理：
         1. 确保日期列格式正确
-        2. 数值类型转换
+        2. 数值类型转换为紧凑类型（FRAME_DTYPES）
         3. 去除空值行
         4. 按日期排序
-        """
-        df = df.copy()
         
-        # 确保日期列为 datetime 类型
-        if 'date' in df.columns:
-            df['date'] = pd.to_datetime(df['date'])
-        
-        # 数值列类型转换
-        numeric_cols = ['open', 'high', 'low', 'close', 'volume', 'amount', 'pct_chg']
-        for col in numeric_cols:
-            if col in df.columns:
-                df[col] = pd.to_numeric(df[col], errors='coerce')
+        所有列基于 numpy 数组一次构建结果 DataFrame；
+        无空值且已按日期排序的常见情况下，除必要的类型转换外不复制数据
+        """
+        arrays: Dict[str, np.ndarray] = {}
+        for col in df.columns:
+            values = df[col].to_numpy()
+            if col == 'date':
+                values = _to_datetime64(values)
+            elif col in FRAME_DTYPES:
+                values = _to_float_array(values)
+            arrays[col] = values
         
         # 去除关键列为空的行
-        df = df.dropna(subset=['close', 'volume'])
+        take = None
+        invalid = np.zeros(len(df), dtype=bool)
+        for col in ('close', 'volume'):
+            if col in arrays and arrays[col].dtype.kind == 'f':
+                invalid |= np.isnan(arrays[col])
+        if invalid.any():
+            take = np.flatnonzero(~invalid)
         
-        # 按日期升序排序
-        df = df.sort_values('date', ascending=True).reset_index(drop=True)
+        # 按日期升序排序（已有序时跳过）
+        if 'date' in arrays:
+            dates = arrays['date'] if take is None else arrays['date'][take]
+            if len(dates) > 1 and not (dates[1:] >= dates[:-1]).all():
+                order = np.argsort(dates, kind='stable')
+                take = order if take is None else take[order]
         
-        return df
+        for col, values in arrays.items():
+            if take is not None:
+                values = values[take]
+            dtype = FRAME_DTYPES.get(col)
+            if dtype is not None and values.dtype != dtype:
+                if dtype is np.int64:
+                    values = np.rint(values)
+                values = values.astype(dtype)
+            arrays[col] = values
+        
+        return pd.DataFrame(arrays, copy=False)
     
     def _calculate_indicators(self, df: pd.DataFrame) -> pd.DataFrame:
         """
-        计算技术指标
+        计算技术指标（返回添加了指标列的新 DataFrame，原有列不复制）
         
         计算指标：
         - MA5, MA10, MA20: 移动平均线
         - Volume_Ratio: 量比（今日成交量 / 5日平均成交量）
         """
-        df = df.copy()
+        close = df['close'].to_numpy(dtype=np.float64)
+        volume = df['volume'].to_numpy(dtype=np.float64)
         
-        # 移动平均线
-        df['ma5'] = df['close'].rolling(window=5, min_periods=1).mean()
-        df['ma10'] = df['close'].rolling(window=10, min_periods=1).mean()
-        df['ma20'] = df['close'].rolling(window=20, min_periods=1).mean()
+        # 移动平均线（保留2位小数）
+        indicators = {
+            'ma5': np.round(_rolling_mean(close, 5), 2),
+            'ma10': np.round(_rolling_mean(close, 10), 2),
+            'ma20': np.round(_rolling_mean(close, 20), 2),
+        }
         
-        # 量比：当日成交量 / 5日平均成交量
-        avg_volume_5 = df['volume'].rolling(window=5, min_periods=1).mean()
-        df['volume_ratio'] = df['volume'] / avg_volume_5.shift(1)
-        df['volume_ratio'] = df['volume_ratio'].fillna(1.0)
+        # 量比：当日成交量 / 前一日的5日平均成交量（第一根K线记为 1.0）
+        ratio = np.ones(len(volume), dtype=np.float64)
+        if len(volume) > 1:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                ratio[1:] = volume[1:] / _rolling_mean(volume, 5)[:-1]
+            ratio[np.isnan(ratio)] = 1.0
+        indicators['volume_ratio'] = np.round(ratio, 2)
         
-        # 保留2位小数
-        for col in ['ma5', 'ma10', 'ma20', 'volume_ratio']:
-            if col in df.columns:
-                df[col] = df[col].round(2)
+        # 原有列直接引用（不复制），与指标列一次组装，避免逐列插入的开销
+        columns = {col: df[col] for col in df.columns if col not in indicators}
+        columns.update(indicators)
+        return pd.DataFrame(columns, index=df.index, copy=False)
+    
+    def session(self):
+        """
+        批量获取时持有的会话上下文（默认无操作）
         
-        return df
+        需要登录/连接管理的数据源（如 Baostock）覆盖此方法，
+        使一个批次内的多次请求共享同一个会话
+        """
+        return nullcontext(self)
     
     @staticmethod
     def random_sleep(min_seconds: float = 1.0, max_seconds: float = 3.0) -> None:
@@ -238,16 +688,39 @@ class DataFetcherManager:
     - 优先使用高优先级数据源
     - 失败后自动切换到下一个
     - 所有数据源都失败时抛出异常
+    - 连续失败的数据源被熔断跳过，近期失败的数据源排到健康数据源之后
     """
     
-    def __init__(self, fetchers: Optional[List[BaseFetcher]] = None):
+    def __init__(
+        self,
+        fetchers: Optional[List[BaseFetcher]] = None,
+        health: Optional[SourceHealthTracker] = None,
+        hedge_enabled: bool = False,
+        hedge_percentile: float = 95.0,
+        hedge_default_delay: float = 10.0,
+        hedge_workers: int = 8
+    ):
         """
         初始化管理器
         
         Args:
             fetchers: 数据源列表（可选，默认按优先级自动创建）
+            health: 数据源健康度跟踪器（可选，默认新建）
+            hedge_enabled: 是否启用对冲请求（见 _get_daily_data_hedged）
+            hedge_percentile: 对冲等待预算取当前数据源历史耗时的分位数
+            hedge_default_delay: 历史样本不足时的对冲等待预算（秒）
+            hedge_workers: 对冲请求线程池大小
         """
         self._fetchers: List[BaseFetcher] = []
+        self._health = health or SourceHealthTracker()
+        
+        self.hedge_enabled = hedge_enabled
+        self.hedge_percentile = hedge_percentile
+        self.hedge_default_delay = hedge_default_delay
+        self._hedge_workers = max(2, hedge_workers)
+        self._hedge_executor: Optional[ThreadPoolExecutor] = None
+        self._hedge_lock = threading.Lock()
+        self._flight = SingleFlight("daily")
         
         if fetchers:
             # 按优先级排序
@@ -294,15 +767,16 @@ class DataFetcherManager:
         stock_code: str,
         start_date: Optional[str] = None,
         end_date: Optional[str] = None,
-        days: int = 30
+        days: int = 30,
+        history: Optional[pd.DataFrame] = None
     ) -> Tuple[pd.DataFrame, str]:
         """
         获取日线数据（自动切换数据源）
         
         故障切换策略：
-        1. 从最高优先级数据源开始尝试
+        1. 按健康度排序后的顺序尝试（熔断中的数据源跳过）
         2. 捕获异常后自动切换到下一个
-        3. 记录每个数据源的失败原因
+        3. 记录每个数据源的失败原因与耗时
         4. 所有数据源失败后抛出详细异常
         
         Args:
@@ -310,27 +784,52 @@ class DataFetcherManager:
             start_date: 开始日期
             end_date: 结束日期
             days: 获取天数
+            history: 已存储的历史K线（可选，增量模式，见 BaseFetcher.get_daily_data）
             
         Returns:
-            Tuple[DataFrame, str]: (数据, 成功的数据源名称)
+            Tuple[DataFrame, str]: (数据, 成功的数据源名称)，区间内没有交易日时数据为空
             
         Raises:
             DataFetchError: 所有数据源都失败时抛出
+        
+        同一参数的并发调用经 SingleFlight 合并为一次请求（结果共享，不应原地修改）
         """
+        key = self._flight_key(stock_code, start_date, end_date, days, history)
+        return self._flight.do(key, self._get_daily_data, stock_code, start_date, end_date, days, history)
+    
+    @staticmethod
+    def _flight_key(
+        stock_code: str,
+        start_date: Optional[str],
+        end_date: Optional[str],
+        days: int,
+        history: Optional[pd.DataFrame]
+    ) -> Tuple:
+        """请求合并的键：history 只影响指标预热，以其长度与最后日期区分"""
+        history_key = None
+        if history is not None and not history.empty:
+            history_key = (len(history), str(history['date'].iloc[-1]))
+        return (stock_code, start_date, end_date, days if start_date is None else None, history_key)
+    
+    def _get_daily_data(
+        self,
+        stock_code: str,
+        start_date: Optional[str],
+        end_date: Optional[str],
+        days: int,
+        history: Optional[pd.DataFrame]
+    ) -> Tuple[pd.DataFrame, str]:
+        """get_daily_data 的实际执行（未合并）"""
+        if self.hedge_enabled:
+            return self._get_daily_data_hedged(stock_code, start_date, end_date, days, history)
+        
         errors = []
         
-        for fetcher in self._fetchers:
+        for fetcher in self._health.order(self._fetchers):
             try:
-                logger.info(f"尝试使用 [{fetcher.name}] 获取 {stock_code}...")
-                df = fetcher.get_daily_data(
-                    stock_code=stock_code,
-                    start_date=start_date,
-                    end_date=end_date,
-                    days=days
-                )
-                
-                if df is not None and not df.empty:
-                    logger.info(f"[{fetcher.name}] 成功获取 {stock_code}")
+                df = self._fetch_one(fetcher, stock_code, start_date, end_date, days, history)
+                # 空表只在区间内没有交易日时返回（已是最新），同样采用，不再尝试其他数据源
+                if df is not None:
                     return df, fetcher.name
                     
             except Exception as e:
@@ -345,6 +844,392 @@ class DataFetcherManager:
         logger.error(error_summary)
         raise DataFetchError(error_summary)
     
+    async def aget_daily_data(
+        self,
+        stock_code: str,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        days: int = 30,
+        history: Optional[pd.DataFrame] = None
+    ) -> Tuple[pd.DataFrame, str]:
+        """
+        获取日线数据（异步版本，自动切换数据源，参数与返回值同 get_daily_data）
+        
+        各数据源的并发与流控由 BaseFetcher.aget_daily_data 负责，
+        大量股票同时在途时只占用各数据源线程池中的少量线程；
+        同一事件循环内相同参数的并发调用合并为一次请求
+        """
+        key = self._flight_key(stock_code, start_date, end_date, days, history)
+        return await self._flight.ado(
+            key, self._aget_daily_data, stock_code, start_date, end_date, days, history
+        )
+    
+    async def _aget_daily_data(
+        self,
+        stock_code: str,
+        start_date: Optional[str],
+        end_date: Optional[str],
+        days: int,
+        history: Optional[pd.DataFrame]
+    ) -> Tuple[pd.DataFrame, str]:
+        """aget_daily_data 的实际执行（未合并）"""
+        errors = []
+        
+        for fetcher in self._health.order(self._fetchers):
+            start = time.monotonic()
+            try:
+                df = await fetcher.aget_daily_data(stock_code, start_date, end_date, days, history)
+            except Exception as e:
+                self._record_outcome(fetcher, start, None, e)
+                error_msg = f"[{fetcher.name}] 失败: {str(e)}"
+                logger.warning(error_msg)
+                errors.append(error_msg)
+                continue
+            
+            self._record_outcome(fetcher, start, df)
+            if df is not None:
+                logger.info(f"[{fetcher.name}] 成功获取 {stock_code}")
+                return df, fetcher.name
+        
+        error_summary = f"所有数据源获取 {stock_code} 失败:\n" + "\n".join(errors)
+        logger.error(error_summary)
+        raise DataFetchError(error_summary)
+    
+    async def aget_many(
+        self,
+        stock_codes: List[str],
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        days: int = 30,
+        histories: Optional[Dict[str, pd.DataFrame]] = None,
+        plans: Optional[Dict[str, Dict[str, Any]]] = None
+    ) -> Tuple[Dict[str, Tuple[pd.DataFrame, str]], Dict[str, str]]:
+        """
+        并发获取多只股票的日线数据（异步版本）
+        
+        每只股票独立故障切换，不同股票可同时在不同数据源上在途
+        
+        Args:
+            stock_codes: 股票代码列表
+            start_date / end_date / days: 所有股票共用的获取范围
+            histories: 各股票已存储的历史K线（可选，增量模式）
+            plans: 各股票单独的 aget_daily_data 参数（可选，优先于上面的共用参数）
+            
+        Returns:
+            Tuple[成功结果 {代码: (DataFrame, 数据源名称)}, 失败原因 {代码: 错误信息}]
+        """
+        histories = histories or {}
+        plans = plans or {}
+        codes = list(dict.fromkeys(stock_codes))
+        
+        def kwargs_for(code: str) -> Dict[str, Any]:
+            if code in plans:
+                return plans[code]
+            return {'start_date': start_date, 'end_date': end_date, 'days': days,
+                    'history': histories.get(code)}
+        
+        outcomes = await asyncio.gather(
+            *(self.aget_daily_data(code, **kwargs_for(code)) for code in codes),
+            return_exceptions=True
+        )
+        
+        results: Dict[str, Tuple[pd.DataFrame, str]] = {}
+        errors: Dict[str, str] = {}
+        for code, outcome in zip(codes, outcomes):
+            if isinstance(outcome, BaseException):
+                errors[code] = str(outcome)
+            else:
+                results[code] = outcome
+        return results, errors
+    
+    def _fetch_one(
+        self,
+        fetcher: BaseFetcher,
+        stock_code: str,
+        start_date: Optional[str],
+        end_date: Optional[str],
+        days: int,
+        history: Optional[pd.DataFrame]
+    ) -> pd.DataFrame:
+        """使用单个数据源获取数据，并把耗时和结果计入健康度"""
+        start = time.monotonic()
+        try:
+            logger.info(f"尝试使用 [{fetcher.name}] 获取 {stock_code}...")
+            df = fetcher.get_daily_data(
+                stock_code=stock_code,
+                start_date=start_date,
+                end_date=end_date,
+                days=days,
+                history=history
+            )
+        except Exception as e:
+            self._record_outcome(fetcher, start, None, e)
+            raise
+        
+        self._record_outcome(fetcher, start, df)
+        if df is not None and not df.empty:
+            logger.info(f"[{fetcher.name}] 成功获取 {stock_code}")
+        return df
+    
+    def _record_outcome(
+        self,
+        fetcher: BaseFetcher,
+        start: float,
+        df: Optional[pd.DataFrame],
+        error: Optional[BaseException] = None
+    ) -> None:
+        """
+        把单次请求的结果计入健康度
+        
+        - 数据源故障（见 is_source_error）记为失败
+        - 返回了数据记为成功
+        - 只与该股票有关的错误、空结果（无新K线）不能说明数据源的好坏，不计入
+        """
+        latency = time.monotonic() - start
+        if error is not None:
+            if is_source_error(error):
+                self._health.record_failure(
+                    fetcher.name, latency, error,
+                    rate_limited=is_rate_limit_error(error), priority=fetcher.priority
+                )
+        elif df is not None and not df.empty:
+            self._health.record_success(fetcher.name, latency, fetcher.priority)
+    
+    def _get_hedge_executor(self) -> ThreadPoolExecutor:
+        """懒加载对冲请求线程池（所有股票共享）"""
+        if self._hedge_executor is None:
+            with self._hedge_lock:
+                if self._hedge_executor is None:
+                    self._hedge_executor = ThreadPoolExecutor(
+                        max_workers=self._hedge_workers,
+                        thread_name_prefix="fetch-hedge"
+                    )
+        return self._hedge_executor
+    
+    def _hedge_budget(self, fetcher: BaseFetcher) -> float:
+        """数据源的对冲等待预算：历史成功耗时的分位数，样本不足时用默认值"""
+        budget = self._health.latency_percentile(fetcher.name, self.hedge_percentile)
+        return budget if budget is not None else self.hedge_default_delay
+    
+    def _get_daily_data_hedged(
+        self,
+        stock_code: str,
+        start_date: Optional[str],
+        end_date: Optional[str],
+        days: int,
+        history: Optional[pd.DataFrame]
+    ) -> Tuple[pd.DataFrame, str]:
+        """
+        对冲模式获取日线数据
+        
+        流程：
+        1. 按健康度顺序启动第一个数据源
+        2. 超过该数据源的等待预算（历史耗时 P95 等）仍未返回时，
+           并行启动下一个数据源，而不是继续干等
+        3. 任一数据源返回有效数据即采用，其余请求取消或忽略其结果
+        4. 在途请求全部失败时立即启动下一个数据源（与顺序模式一致）
+        
+        正常情况下主数据源在预算内返回，不会产生额外请求
+        """
+        order = self._health.order(self._fetchers)
+        executor = self._get_hedge_executor()
+        running = {}
+        errors = []
+        next_index = 0
+        
+        def launch() -> BaseFetcher:
+            nonlocal next_index
+            fetcher = order[next_index]
+            next_index += 1
+            future = executor.submit(
+                self._fetch_one, fetcher, stock_code, start_date, end_date, days, history
+            )
+            running[future] = fetcher
+            return fetcher
+        
+        latest = launch()
+        while running:
+            timeout = self._hedge_budget(latest) if next_index < len(order) else None
+            done, _ = wait(list(running), timeout=timeout, return_when=FIRST_COMPLETED)
+            
+            if not done:
+                hedge = launch()
+                logger.info(
+                    f"[{latest.name}] 获取 {stock_code} 超过 {timeout:.1f}s 未返回，"
+                    f"并行启动对冲请求 [{hedge.name}]"
+                )
+                latest = hedge
+                continue
+            
+            for future in done:
+                fetcher = running.pop(future)
+                try:
+                    df = future.result()
+                except Exception as e:
+                    error_msg = f"[{fetcher.name}] 失败: {str(e)}"
+                    logger.warning(error_msg)
+                    errors.append(error_msg)
+                    continue
+                
+                if df is not None:
+                    # 已在执行的请求无法中断，其结果被忽略（仍计入健康度）
+                    for other in running:
+                        other.cancel()
+                    return df, fetcher.name
+            
+            if not running and next_index < len(order):
+                latest = launch()
+        
+        error_summary = f"所有数据源获取 {stock_code} 失败:\n" + "\n".join(errors)
+        logger.error(error_summary)
+        raise DataFetchError(error_summary)
+    
+    @contextmanager
+    def batch_session(self):
+        """
+        批量获取上下文：持有所有数据源的会话
+        
+        使用示例：
+            with manager.batch_session():
+                for code in codes:
+                    manager.get_daily_data(code)
+        """
+        with ExitStack() as stack:
+            for fetcher in self._fetchers:
+                stack.enter_context(fetcher.session())
+            yield self
+    
+    def get_daily_data_many(
+        self,
+        stock_codes: List[str],
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        days: int = 30,
+        histories: Optional[Dict[str, pd.DataFrame]] = None
+    ) -> Tuple[Dict[str, Tuple[pd.DataFrame, str]], Dict[str, str]]:
+        """
+        批量获取多只股票的日线数据（按数据源分组、逐级故障切换）
+        
+        策略：
+        1. 全部代码交给最高优先级数据源的批量接口
+        2. 失败的代码作为一组，交给下一个数据源
+        3. 直到全部成功或数据源耗尽
+        
+        Args:
+            stock_codes: 股票代码列表
+            start_date: 开始日期
+            end_date: 结束日期
+            days: 获取天数
+            histories: 各股票已存储的历史K线（可选，增量模式）
+            
+        Returns:
+            Tuple[成功结果 {代码: (DataFrame, 数据源名称)}, 失败原因 {代码: 各数据源错误汇总}]
+        """
+        histories = histories or {}
+        pending = list(dict.fromkeys(stock_codes))
+        results: Dict[str, Tuple[pd.DataFrame, str]] = {}
+        errors: Dict[str, List[str]] = {code: [] for code in pending}
+        
+        for fetcher in self._health.order(self._fetchers):
+            if not pending:
+                break
+            
+            logger.info(f"尝试使用 [{fetcher.name}] 批量获取 {len(pending)} 只股票...")
+            start = time.monotonic()
+            try:
+                frames, failures = fetcher.get_daily_data_many(
+                    pending,
+                    start_date=start_date,
+                    end_date=end_date,
+                    days=days,
+                    histories={code: histories[code] for code in pending if code in histories},
+                )
+            except Exception as e:
+                frames, failures = {}, {code: str(e) for code in pending}
+                error = e
+            else:
+                error = None
+            
+            # 批量请求按单只股票的平均耗时计入健康度（计入规则同 _record_outcome）
+            latency = (time.monotonic() - start) / max(len(pending), 1)
+            if any(df is not None and not df.empty for df in frames.values()):
+                self._health.record_success(fetcher.name, latency, fetcher.priority)
+            elif error is not None and is_source_error(error):
+                self._health.record_failure(
+                    fetcher.name, latency, error,
+                    rate_limited=is_rate_limit_error(error), priority=fetcher.priority
+                )
+            
+            for code, df in frames.items():
+                if df is not None:
+                    results[code] = (df, fetcher.name)
+            for code, error in failures.items():
+                if code in errors:
+                    errors[code].append(f"[{fetcher.name}] 失败: {error}")
+            
+            pending = [code for code in pending if code not in results]
+            logger.info(f"[{fetcher.name}] 批量获取成功 {len(frames)} 只，剩余 {len(pending)} 只")
+        
+        failed = {code: "\n".join(errors[code]) for code in pending}
+        if failed:
+            logger.warning(f"批量获取失败 {len(failed)} 只: {', '.join(failed)}")
+        
+        return results, failed
+    
+    def get_minute_data(
+        self,
+        stock_code: str,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None
+    ) -> Tuple[pd.DataFrame, str]:
+        """
+        获取1分钟K线（按健康度顺序尝试支持分钟线的数据源）
+        
+        Returns:
+            Tuple[DataFrame, str]: (列为 MINUTE_COLUMNS 的数据, 成功的数据源名称)
+            
+        Raises:
+            DataFetchError: 没有可用的数据源或全部失败
+        """
+        errors = []
+        for fetcher in self._health.order(self._fetchers):
+            try:
+                df = fetcher.get_minute_data(stock_code, start_date, end_date)
+            except DataSourceUnavailableError:
+                continue
+            except Exception as e:
+                error_msg = f"[{fetcher.name}] 失败: {str(e)}"
+                logger.warning(error_msg)
+                errors.append(error_msg)
+                continue
+            if df is not None and not df.empty:
+                return df, fetcher.name
+            errors.append(f"[{fetcher.name}] 返回空数据")
+        
+        raise DataFetchError(f"获取 {stock_code} 分钟线失败: " + ("; ".join(errors) or "没有支持分钟线的数据源"))
+    
+    def get_fetcher(self, name: str) -> Optional[BaseFetcher]:
+        """按名称获取数据源实例（不存在时返回 None）"""
+        for fetcher in self._fetchers:
+            if fetcher.name == name:
+                return fetcher
+        return None
+    
+    @property
+    def health(self) -> SourceHealthTracker:
+        """数据源健康度跟踪器"""
+        return self._health
+    
+    def get_health_snapshot(self) -> List[Dict]:
+        """导出各数据源健康状态（延迟 EWMA、错误率、近期限流次数、熔断状态）"""
+        return self._health.snapshot()
+    
+    def log_health(self) -> None:
+        """输出各数据源健康状态到日志"""
+        summary = self._health.format_summary()
+        if summary:
+            logger.info("数据源健康状态:\n" + summary)
+    
     @property
     def available_fetchers(self) -> List[str]:
         """返回可用数据源名称列表"""
@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+"""
+===================================
+标准化日线数据磁盘缓存
+===================================
+
+问题：
+- 同一天重跑、开发调试时，每次都经 BaseFetcher.get_daily_data 重新请求远程接口
+- 无法在离线环境下对完整流水线做基准测试
+
+方案：
+1. 以 (数据源, 代码, 开始日期, 结束日期, 复权方式) 的哈希作为文件名（内容寻址）
+2. 缓存标准化 + 清洗后的 DataFrame，按列存为未压缩 .npz（numpy 原生格式，读取即用）
+3. TTL 过期 + 按总大小的 LRU 淘汰（以文件修改时间作为最近访问时间）
+4. 三种模式：
+   - off:       不使用缓存
+   - readwrite: 命中直接返回，未命中请求远程后写入
+   - replay:    严格回放，只从缓存读取，未命中视为失败（不访问网络）
+"""
+
+import hashlib
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+CACHE_MODES = ('off', 'readwrite', 'replay')
+
+# 元数据字段名（与数据列区分）
+_META_CREATED = '__created__'
+_META_COLUMNS = '__columns__'
+
+
+class FrameCache:
+    """
+    标准化 DataFrame 的磁盘缓存（线程安全）
+
+    Args:
+        cache_dir: 缓存目录
+        mode: 'off' / 'readwrite' / 'replay'
+        ttl: 有效期（秒）；结束日期早于今天的区间数据不会再变化，不受 TTL 限制
+        max_bytes: 缓存总大小上限，超出后按 LRU 淘汰
+    """
+
+    def __init__(
+        self,
+        cache_dir: str = './data/frame_cache',
+        mode: str = 'off',
+        ttl: float = 6 * 3600,
+        max_bytes: int = 512 * 1024 * 1024
+    ):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"未知的缓存模式: {mode}，可选 {CACHE_MODES}")
+
+        self.cache_dir = Path(cache_dir)
+        self.mode = mode
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+
+        self._lock = threading.Lock()
+        self._total_bytes: Optional[int] = None  # 首次写入时扫描目录得到
+
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != 'off'
+
+    @property
+    def replay(self) -> bool:
+        return self.mode == 'replay'
+
+    @staticmethod
+    def make_key(source: str, code: str, start_date: str, end_date: str, adjust: str = '') -> str:
+        """内容寻址键：参数的 SHA1"""
+        raw = '|'.join([source, code, start_date, end_date, adjust or ''])
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        # 两级目录，避免单目录文件过多
+        return self.cache_dir / key[:2] / f"{key}.npz"
+
+    def get(
+        self,
+        source: str,
+        code: str,
+        start_date: str,
+        end_date: str,
+        adjust: str = ''
+    ) -> Optional[pd.DataFrame]:
+        """
+        读取缓存
+
+        Returns:
+            命中返回 DataFrame，未命中/过期/损坏返回 None
+        """
+        if not self.enabled:
+            return None
+
+        path = self._path(self.make_key(source, code, start_date, end_date, adjust))
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                created = float(data[_META_CREATED])
+                if not self.replay and self._expired(created, end_date):
+                    self.misses += 1
+                    return None
+                columns = [str(c) for c in data[_META_COLUMNS]]
+                df = pd.DataFrame({col: data[col] for col in columns})
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except Exception as e:
+            logger.warning(f"[缓存] 读取 {path.name} 失败，忽略: {e}")
+            self.misses += 1
+            return None
+
+        # 更新修改时间，作为 LRU 的最近访问时间
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        self.hits += 1
+        logger.debug(f"[缓存] 命中 {source} {code} {start_date}~{end_date}")
+        return df
+
+    def put(
+        self,
+        source: str,
+        code: str,
+        start_date: str,
+        end_date: str,
+        df: pd.DataFrame,
+        adjust: str = ''
+    ) -> None:
+        """写入缓存（replay 模式下不写）"""
+        if self.mode != 'readwrite' or df is None or df.empty:
+            return
+
+        path = self._path(self.make_key(source, code, start_date, end_date, adjust))
+        arrays = {}
+        for col in df.columns:
+            values = df[col].to_numpy()
+            if values.dtype == object:
+                values = values.astype(str)
+            arrays[str(col)] = values
+        arrays[_META_COLUMNS] = np.array([str(c) for c in df.columns])
+        arrays[_META_CREATED] = np.array(time.time())
+
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # 先写临时文件再原子替换，避免并发读到半个文件
+            tmp = path.with_name(f"{path.stem}.{threading.get_ident()}.tmp")
+            with open(tmp, 'wb') as f:
+                np.savez(f, **arrays)
+            os.replace(tmp, path)
+        except Exception as e:
+            logger.warning(f"[缓存] 写入 {path.name} 失败: {e}")
+            return
+
+        self._account(path.stat().st_size)
+
+    def _expired(self, created: float, end_date: str) -> bool:
+        # 结束日期早于今天的历史区间不会再变化
+        if end_date < datetime.now().strftime('%Y-%m-%d'):
+            return False
+        return time.time() - created > self.ttl
+
+    def _scan(self):
+        return [p for p in self.cache_dir.glob('*/*.npz') if p.is_file()]
+
+    def _account(self, added: int) -> None:
+        """累计缓存大小，超出上限时按 LRU 淘汰到上限的 90%"""
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = sum(p.stat().st_size for p in self._scan())
+            else:
+                self._total_bytes += added
+
+            if self._total_bytes <= self.max_bytes:
+                return
+
+            entries = []
+            for p in self._scan():
+                try:
+                    stat = p.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, p))
+            entries.sort()
+
+            total = sum(size for _, size, _ in entries)
+            target = int(self.max_bytes * 0.9)
+            removed = 0
+            for _, size, p in entries:
+                if total <= target:
+                    break
+                try:
+                    p.unlink()
+                except OSError:
+                    continue
+                total -= size
+                removed += 1
+
+            self._total_bytes = total
+            logger.info(f"[缓存] 淘汰 {removed} 个文件，当前 {total / 1024 / 1024:.1f} MB")
+
+    def clear(self) -> None:
+        """清空缓存目录"""
+        with self._lock:
+            for p in self._scan():
+                try:
+                    p.unlink()
+                except OSError:
+                    pass
+            self._total_bytes = 0
+
+
+_frame_cache: Optional[FrameCache] = None
+_frame_cache_lock = threading.Lock()
+
+
+def get_frame_cache() -> FrameCache:
+    """获取全局磁盘缓存（按配置懒加载）"""
+    global _frame_cache
+    if _frame_cache is None:
+        with _frame_cache_lock:
+            if _frame_cache is None:
+                from config import get_config
+                config = get_config()
+                _frame_cache = FrameCache(
+                    cache_dir=config.data_cache_dir,
+                    mode=config.data_cache_mode,
+                    ttl=config.data_cache_ttl,
+                    max_bytes=int(config.data_cache_max_mb * 1024 * 1024),
+                )
+                if _frame_cache.enabled:
+                    logger.info(f"[缓存] 模式 {_frame_cache.mode}，目录 {_frame_cache.cache_dir}")
+    return _frame_cache
+
+
+def set_frame_cache(cache: Optional[FrameCache]) -> None:
+    """替换全局磁盘缓存（用于测试或基准测试时指定目录/模式）"""
+    global _frame_cache
+    with _frame_cache_lock:
+        _frame_cache = cache
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""
+===================================
+数据源流控 - 全局令牌桶
+===================================
+
+问题：
+- 每个 Fetcher 实例各自计数，多个实例、多个线程之间互不知晓
+- 实际请求速率随实例数和线程数成倍放大
+
+方案：
+1. 按数据源名称注册全局令牌桶，所有实例、所有线程共享
+2. 预约制（Reservation）：在锁内为每个请求分配一个发起时刻，
+   锁外休眠到该时刻，先到先得，等待线程按预约顺序依次放行
+3. 在令牌间隔基础上叠加随机抖动（Jitter），避免请求节奏过于规律
+4. 异步接口用 asyncio.sleep 等待令牌（acquire_async），
+   随后在工作线程内以 prepaid_tokens 标记，跳过同步流控，避免重复等待
+"""
+
+import asyncio
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+# 当前线程已预付（在事件循环中等待过）的令牌数
+_prepaid = threading.local()
+
+
+@contextmanager
+def prepaid_tokens(count: int = 1):
+    """
+    标记当前线程已预付 count 个令牌
+
+    在此上下文内，前 count 次 TokenBucket.acquire() 直接放行
+    """
+    _prepaid.count = count
+    try:
+        yield
+    finally:
+        _prepaid.count = 0
+
+
+class TokenBucket:
+    """
+    线程安全的令牌桶
+
+    - rate: 每秒补充的令牌数（长期平均速率上限）
+    - capacity: 桶容量（允许的突发请求数）
+    - jitter: 每次请求额外附加的随机延迟上限（秒）
+
+    令牌允许为负数：负数部分即为已预约但尚未到期的请求，
+    后来者的等待时间自然排在前者之后，保证 FIFO
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0, jitter: float = 0.0):
+        if rate <= 0:
+            raise ValueError("rate 必须大于 0")
+
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self.jitter = max(0.0, jitter)
+
+        self._tokens = self.capacity
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """
+        预约一个令牌
+
+        Returns:
+            调用方需要等待的秒数（0 表示可立即发起请求）
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.capacity,
+                self._tokens + (now - self._last_refill) * self.rate
+            )
+            self._last_refill = now
+
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+            # 抖动同样占用时间窗口，后续请求会顺延
+            if self.jitter > 0:
+                extra = random.uniform(0, self.jitter)
+                self._tokens -= extra * self.rate
+                wait += extra
+
+            return wait
+
+    def acquire(self) -> float:
+        """
+        阻塞直到获得令牌
+
+        Returns:
+            实际等待的秒数
+        """
+        if getattr(_prepaid, 'count', 0) > 0:
+            _prepaid.count -= 1
+            return 0.0
+        
+        wait = self.reserve()
+        if wait > 0:
+            logger.debug(f"流控等待 {wait:.2f} 秒")
+            time.sleep(wait)
+        return wait
+
+    async def acquire_async(self) -> float:
+        """
+        异步获取令牌（用 asyncio.sleep 等待，不占用线程）
+
+        Returns:
+            实际等待的秒数
+        """
+        wait = self.reserve()
+        if wait > 0:
+            logger.debug(f"流控等待 {wait:.2f} 秒（异步）")
+            await asyncio.sleep(wait)
+        return wait
+
+
+_limiters: Dict[str, TokenBucket] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(
+    source: str,
+    rate: float,
+    capacity: float = 1.0,
+    jitter: float = 0.0
+) -> TokenBucket:
+    """
+    获取指定数据源的全局令牌桶
+
+    同一数据源只创建一次，后续调用忽略参数直接返回已有实例，
+    保证所有 Fetcher 实例和线程共享同一个流控状态
+
+    Args:
+        source: 数据源名称（如 'akshare', 'tushare'）
+        rate: 每秒请求数
+        capacity: 突发容量
+        jitter: 随机抖动上限（秒）
+    """
+    limiter = _limiters.get(source)
+    if limiter is not None:
+        return limiter
+
+    with _limiters_lock:
+        limiter = _limiters.get(source)
+        if limiter is None:
+            limiter = TokenBucket(rate=rate, capacity=capacity, jitter=jitter)
+            _limiters[source] = limiter
+            logger.debug(
+                f"[流控] 注册 {source}: {rate * 60:.1f} 次/分钟, 突发 {limiter.capacity:.0f}, "
+                f"抖动 {limiter.jitter:.2f}s"
+            )
+        return limiter
+
+
+def reset_rate_limiters(source: Optional[str] = None) -> None:
+    """重置令牌桶注册表（主要用于测试）"""
+    with _limiters_lock:
+        if source is None:
+            _limiters.clear()
+        else:
+            _limiters.pop(source, None)
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""
+===================================
+请求合并（Single-flight）
+===================================
+
+问题：
+- 多个工作线程同一时刻需要同一份数据（全市场快照、同一代码的日线），
+  各自发起一次网络请求，既浪费配额又增加被限流的概率
+- 原先的"加锁 + 双重检查"在请求失败时，等待的线程会依次重试，
+  失败被放大为 N 次串行请求
+
+方案：
+1. 按键登记在途请求：第一个调用方（leader）真正执行，
+   同一键的并发调用方阻塞等待 leader 的 Future，共享其结果
+2. leader 抛出的异常原样传递给所有等待者，不会逐个重试
+3. 请求结束即注销，之后的调用重新发起（结果缓存由调用方自行负责）
+4. 异步接口 ado：同一事件循环内按键共享同一个 Task，
+   某个等待者被取消不会取消其他等待者共享的请求
+
+注意：
+- 共享的是同一个对象，调用方不应原地修改返回值
+- 同一线程内对同一键的递归调用会死锁，fn 内不要再请求相同的键
+"""
+
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+
+class SingleFlight:
+    """
+    按键合并并发的相同请求（线程安全）
+
+    用法：
+        flight = SingleFlight()
+        df = flight.do(('600519', '2024-01-01'), fetch, '600519')
+    """
+
+    def __init__(self, name: str = ""):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, Future] = {}
+        self._tasks: Dict[Tuple[int, Hashable], asyncio.Task] = {}
+
+        self.executed = 0  # 真正执行的次数
+        self.shared = 0    # 搭便车（共享结果）的次数
+
+    def do(self, key: Hashable, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """
+        执行 fn(*args, **kwargs)；同一键已有在途请求时等待并共享其结果
+
+        Raises:
+            fn 抛出的异常（leader 与所有等待者都会收到）
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+                self.executed += 1
+            else:
+                self.shared += 1
+
+        if not leader:
+            logger.debug(f"[请求合并{self.name and ' ' + self.name}] {key} 已在请求中，等待结果")
+            return future.result()
+
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            self._finish(key)
+            future.set_exception(e)
+            raise
+        self._finish(key)
+        future.set_result(result)
+        return result
+
+    async def ado(self, key: Hashable, fn: Callable[..., Awaitable[T]], *args: Any, **kwargs: Any) -> T:
+        """
+        异步版本：await fn(*args, **kwargs)；同一事件循环内同一键的并发调用共享结果
+        """
+        loop_key = (id(asyncio.get_running_loop()), key)
+        with self._lock:
+            task = self._tasks.get(loop_key)
+            if task is None:
+                task = asyncio.ensure_future(fn(*args, **kwargs))
+                self._tasks[loop_key] = task
+                task.add_done_callback(lambda t: self._finish_task(loop_key, t))
+                self.executed += 1
+            else:
+                self.shared += 1
+        return await asyncio.shield(task)
+
+    def _finish_task(self, loop_key: Tuple[int, Hashable], task: asyncio.Task) -> None:
+        with self._lock:
+            if self._tasks.get(loop_key) is task:
+                del self._tasks[loop_key]
+        # 所有等待者都已取消时异常无人读取，这里取出以免告警
+        if not task.cancelled():
+            task.exception()
+
+    def _finish(self, key: Hashable) -> None:
+        # 先注销再设置结果：结果发布后到达的调用会重新发起请求，而不是拿到已结束的旧结果
+        with self._lock:
+            self._calls.pop(key, None)
+
+    def in_flight(self) -> int:
+        """当前在途的请求数"""
+        with self._lock:
+            return len(self._calls) + len(self._tasks)
@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+"""
+===================================
+数据源健康度跟踪与熔断
+===================================
+
+问题：
+- DataFetcherManager 始终按静态优先级尝试数据源
+- 主数据源被限流时，每只股票都要先经历休眠 + 重试才切换，失败代价反复支付
+
+方案：
+1. 每个数据源维护 EWMA 延迟、EWMA 错误率、近期限流次数
+2. 连续失败达到阈值后熔断：冷却期内直接跳过该数据源
+3. 未熔断的数据源按预期成功耗时（延迟 / 成功率 + 限流惩罚）排序：
+   持续偏慢的健康源同样排到更快的源之后；失败/限流会抬高错误率与限流惩罚，使其自然后移
+4. 预期耗时相同（如都还没有样本，均取默认延迟）时按静态优先级（优先使用数据质量更好的源）
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+# 每个数据源保留的最近成功请求耗时样本数（用于计算分位数）
+LATENCY_SAMPLE_SIZE = 200
+
+
+@dataclass
+class SourceHealth:
+    """单个数据源的健康状态"""
+    name: str
+    priority: int = 99
+
+    latency_ewma: Optional[float] = None   # 请求耗时 EWMA（秒）
+    error_rate: float = 0.0                # 失败率 EWMA（0-1）
+    calls: int = 0
+    failures: int = 0
+    consecutive_failures: int = 0
+
+    rate_limit_times: Deque[float] = field(default_factory=deque)  # 近期限流时间戳
+    latency_samples: Deque[float] = field(default_factory=lambda: deque(maxlen=LATENCY_SAMPLE_SIZE))
+    degraded_until: float = 0.0            # 降级截止时间（健康度日志中标记为降级）
+    open_until: float = 0.0                # 熔断截止时间（之前直接跳过）
+    last_error: str = ""
+
+    def to_dict(self, now: float) -> Dict[str, Any]:
+        return {
+            'name': self.name,
+            'priority': self.priority,
+            'latency_ewma': round(self.latency_ewma, 3) if self.latency_ewma is not None else None,
+            'error_rate': round(self.error_rate, 3),
+            'calls': self.calls,
+            'failures': self.failures,
+            'consecutive_failures': self.consecutive_failures,
+            'recent_rate_limits': len(self.rate_limit_times),
+            'degraded': now < self.degraded_until,
+            'circuit_open': now < self.open_until,
+            'last_error': self.last_error,
+        }
+
+
+class SourceHealthTracker:
+    """
+    数据源健康度跟踪器（线程安全）
+
+    Args:
+        alpha: EWMA 平滑系数（越大越看重最近的请求）
+        failure_threshold: 连续失败多少次后熔断
+        circuit_cooldown: 熔断冷却时间（秒）
+        degrade_cooldown: 单次失败后标记为降级的时间（秒，仅用于健康度日志）
+        rate_limit_window: 统计近期限流次数的时间窗口（秒）
+        default_latency: 尚无样本时假设的请求耗时（秒）
+    """
+
+    def __init__(
+        self,
+        alpha: float = 0.3,
+        failure_threshold: int = 3,
+        circuit_cooldown: float = 300.0,
+        degrade_cooldown: float = 60.0,
+        rate_limit_window: float = 300.0,
+        default_latency: float = 10.0,
+    ):
+        self.alpha = alpha
+        self.failure_threshold = failure_threshold
+        self.circuit_cooldown = circuit_cooldown
+        self.degrade_cooldown = degrade_cooldown
+        self.rate_limit_window = rate_limit_window
+        self.default_latency = default_latency
+
+        self._lock = threading.Lock()
+        self._health: Dict[str, SourceHealth] = {}
+
+    def _get(self, name: str, priority: int = 99) -> SourceHealth:
+        health = self._health.get(name)
+        if health is None:
+            health = SourceHealth(name=name, priority=priority)
+            self._health[name] = health
+        return health
+
+    def _expire_rate_limits(self, health: SourceHealth, now: float) -> None:
+        while health.rate_limit_times and now - health.rate_limit_times[0] > self.rate_limit_window:
+            health.rate_limit_times.popleft()
+
+    def _update_latency(self, health: SourceHealth, latency: float) -> None:
+        if health.latency_ewma is None:
+            health.latency_ewma = latency
+        else:
+            health.latency_ewma = self.alpha * latency + (1 - self.alpha) * health.latency_ewma
+
+    def record_success(self, name: str, latency: float, priority: int = 99) -> None:
+        """记录一次成功请求"""
+        with self._lock:
+            health = self._get(name, priority)
+            health.calls += 1
+            health.consecutive_failures = 0
+            health.error_rate = (1 - self.alpha) * health.error_rate
+            health.degraded_until = 0.0
+            if health.open_until:
+                logger.info(f"[数据源健康] {name} 恢复正常，关闭熔断")
+            health.open_until = 0.0
+            self._update_latency(health, latency)
+            health.latency_samples.append(latency)
+
+    def record_failure(
+        self,
+        name: str,
+        latency: float,
+        error: Optional[BaseException] = None,
+        rate_limited: bool = False,
+        priority: int = 99
+    ) -> None:
+        """记录一次失败请求（rate_limited 表示因限流失败）"""
+        now = time.time()
+        with self._lock:
+            health = self._get(name, priority)
+            health.calls += 1
+            health.failures += 1
+            health.consecutive_failures += 1
+            health.error_rate = self.alpha + (1 - self.alpha) * health.error_rate
+            health.degraded_until = now + self.degrade_cooldown
+            health.last_error = str(error)[:200] if error is not None else ""
+            self._update_latency(health, latency)
+
+            if rate_limited:
+                health.rate_limit_times.append(now)
+            self._expire_rate_limits(health, now)
+
+            if health.consecutive_failures >= self.failure_threshold and now >= health.open_until:
+                health.open_until = now + self.circuit_cooldown
+                logger.warning(
+                    f"[数据源健康] {name} 连续失败 {health.consecutive_failures} 次，"
+                    f"熔断 {self.circuit_cooldown:.0f} 秒"
+                )
+
+    def latency_percentile(self, name: str, percentile: float, min_samples: int = 5) -> Optional[float]:
+        """
+        最近成功请求耗时的分位数（秒）
+
+        Args:
+            name: 数据源名称
+            percentile: 分位数（0-100）
+            min_samples: 最少样本数，不足时返回 None
+        """
+        with self._lock:
+            health = self._health.get(name)
+            if health is None or len(health.latency_samples) < min_samples:
+                return None
+            samples = sorted(health.latency_samples)
+        index = min(len(samples) - 1, max(0, int(round(percentile / 100.0 * (len(samples) - 1)))))
+        return samples[index]
+
+    def is_open(self, name: str) -> bool:
+        """数据源是否处于熔断状态"""
+        with self._lock:
+            health = self._health.get(name)
+            return health is not None and time.time() < health.open_until
+
+    def expected_cost(self, name: str) -> float:
+        """
+        预期成功耗时（秒）
+
+        = EWMA 延迟 / 成功率 + 近期限流次数 × EWMA 延迟
+        """
+        with self._lock:
+            health = self._health.get(name)
+            if health is None or health.latency_ewma is None:
+                return self.default_latency
+            self._expire_rate_limits(health, time.time())
+            latency = health.latency_ewma
+            success_rate = max(1.0 - health.error_rate, 0.05)
+            return latency / success_rate + len(health.rate_limit_times) * latency
+
+    def order(self, fetchers: Sequence[Any]) -> List[Any]:
+        """
+        返回本次请求的数据源尝试顺序
+
+        1. 熔断中的数据源被跳过（全部熔断时按静态优先级兜底）
+        2. 其余数据源按 (预期成功耗时, 静态优先级) 排序
+        """
+        now = time.time()
+        with self._lock:
+            states = {f.name: self._health.get(f.name) for f in fetchers}
+
+        def is_open(f) -> bool:
+            h = states[f.name]
+            return h is not None and now < h.open_until
+
+        candidates = [f for f in fetchers if not is_open(f)]
+        if not candidates:
+            return sorted(fetchers, key=lambda f: f.priority)
+
+        return sorted(candidates, key=lambda f: (self.expected_cost(f.name), f.priority))
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """导出所有数据源的健康状态（按优先级排序）"""
+        now = time.time()
+        with self._lock:
+            for health in self._health.values():
+                self._expire_rate_limits(health, now)
+            return [h.to_dict(now) for h in sorted(self._health.values(), key=lambda h: h.priority)]
+
+    def format_summary(self) -> str:
+        """格式化为一行一个数据源的日志文本"""
+        lines = []
+        for item in self.snapshot():
+            latency = f"{item['latency_ewma']:.2f}s" if item['latency_ewma'] is not None else "-"
+            status = "熔断" if item['circuit_open'] else ("降级" if item['degraded'] else "正常")
+            lines.append(
+                f"{item['name']}: {status} | 延迟EWMA {latency} | 错误率 {item['error_rate']:.0%} | "
+                f"调用 {item['calls']} 失败 {item['failures']} | 近期限流 {item['recent_rate_limits']}"
+            )
+        return "\n".join(lines)
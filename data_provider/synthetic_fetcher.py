@@ -0,0 +1,384 @@
+# -*- coding: utf-8 -*-
+"""
+===================================
+SyntheticFetcher - 合成数据源（离线基准测试）
+===================================
+
+问题：
+- 流水线的扩展性（10 → 5000 只股票）只能连真实接口测量，
+  结果受网络、限流、交易时段影响，无法复现，也不能在 CI 中运行
+
+方案：
+1. 按 (种子, 代码) 派生独立随机数生成器，生成确定性的 OHLCV 序列：
+   同一代码在任意日期区间、任意调用顺序下得到完全相同的K线
+2. 同时提供分钟线、实时行情（RealtimeQuote）与筹码分布历史（CHIP_COLUMNS 格式），
+   可替换流水线中的 AkshareFetcher 走通实时行情/筹码路径
+3. 可配置注入延迟与失败率（普通失败 / 限流失败），用于测量并发、
+   故障切换、熔断在不同网络状况下的表现
+4. 不访问网络；日期按工作日生成，不依赖交易所日历
+"""
+
+import logging
+import random
+import threading
+import time
+import zlib
+from datetime import date
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .base import BaseFetcher, DataFetchError, RateLimitError
+from .akshare_fetcher import RealtimeQuote, ChipDistribution, CHIP_COLUMNS
+from .rate_limiter import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+
+# 序列起点：所有代码的K线都从这一天开始生成，保证区间截取结果一致
+SYNTHETIC_EPOCH = np.datetime64('2015-01-05', 'D')
+
+# 分钟线：上午 09:31~11:30、下午 13:01~15:00 各 120 根（K线结束时间）
+MINUTE_OFFSETS = np.concatenate([
+    np.arange(9 * 60 + 31, 11 * 60 + 31),
+    np.arange(13 * 60 + 1, 15 * 60 + 1),
+]).astype('timedelta64[m]')
+
+# 日内成交量的 U 型分布（开盘、尾盘放量）
+_u = np.linspace(-1, 1, len(MINUTE_OFFSETS))
+MINUTE_VOLUME_PROFILE = (1 + 2 * _u ** 2) / (1 + 2 * _u ** 2).sum()
+
+# 筹码分布的计算窗口（交易日）与返回的历史长度（与 ak.stock_cyq_em 接近）
+CHIP_WINDOW = 60
+CHIP_HISTORY_DAYS = 90
+
+
+class SyntheticFetcher(BaseFetcher):
+    """
+    合成数据源
+
+    Args:
+        seed: 全局随机种子（同一种子下数据完全可复现）
+        latency: 每次"网络请求"的注入延迟（秒）
+        latency_jitter: 延迟的随机抖动比例（0.5 表示 ±50%）
+        failure_rate: 请求失败（网络错误 ConnectionError）的概率
+        rate_limit_rate: 请求被限流（RateLimitError）的概率
+        rate: 令牌桶速率（次/秒），0 表示不限流
+        name: 数据源名称（多个实例模拟多个数据源时区分健康度统计）
+        priority: 优先级
+        max_concurrency: 异步接口下的最大在途请求数
+    """
+
+    name = "SyntheticFetcher"
+    priority = 0
+    adjust = "synthetic"
+
+    def __init__(
+        self,
+        seed: int = 0,
+        latency: float = 0.0,
+        latency_jitter: float = 0.5,
+        failure_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        rate: float = 0.0,
+        name: Optional[str] = None,
+        priority: Optional[int] = None,
+        max_concurrency: int = 16
+    ):
+        self.seed = seed
+        self.latency = max(0.0, latency)
+        self.latency_jitter = max(0.0, latency_jitter)
+        self.failure_rate = failure_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.max_concurrency = max_concurrency
+        if name:
+            self.name = name
+        if priority is not None:
+            self.priority = priority
+
+        # 注入的延迟/失败使用独立的随机源，不影响行情数据的确定性
+        self._fault_rng = random.Random(seed)
+        self._fault_lock = threading.Lock()
+        self._limiter = TokenBucket(rate=rate) if rate > 0 else None
+
+        # 实时行情模拟全市场快照：每个 TTL 周期只有第一次调用付出延迟
+        self._spot_loaded_at: Optional[float] = None
+        self._spot_lock = threading.Lock()
+
+        self.calls = 0
+
+    def rate_limiter(self) -> Optional[TokenBucket]:
+        return self._limiter
+
+    @staticmethod
+    def is_etf(code: str) -> bool:
+        """与 AkshareFetcher 相同的 ETF 判断（ETF 无筹码数据）"""
+        return code.startswith(('51', '56', '58', '15', '16', '18'))
+
+    def _code_rng(self, stock_code: str, stream: int = 0) -> np.random.Generator:
+        """按 (种子, 代码, 数据流) 派生的独立随机数生成器"""
+        return np.random.default_rng([self.seed, zlib.crc32(stock_code.encode('utf-8')), stream])
+
+    def _simulate_request(self) -> None:
+        """注入延迟与失败（模拟一次网络请求）"""
+        if self._limiter is not None:
+            self._limiter.acquire()
+
+        with self._fault_lock:
+            self.calls += 1
+            jitter = self._fault_rng.uniform(-self.latency_jitter, self.latency_jitter)
+            roll = self._fault_rng.random()
+
+        if self.latency > 0:
+            time.sleep(self.latency * max(0.0, 1 + jitter))
+
+        if roll < self.rate_limit_rate:
+            raise RateLimitError(f"[{self.name}] 注入的限流错误")
+        if roll < self.rate_limit_rate + self.failure_rate:
+            raise ConnectionError(f"[{self.name}] 注入的请求失败")
+
+    def _series(self, stock_code: str, end: np.datetime64) -> Tuple[np.ndarray, dict]:
+        """
+        生成从 SYNTHETIC_EPOCH 到 end（含）的完整日线序列
+
+        始终从起点生成再截取，保证同一代码的K线与请求区间无关
+
+        Returns:
+            (日期数组 datetime64[D], 列名 -> 数组)
+        """
+        dates = np.arange(SYNTHETIC_EPOCH, end + 1, dtype='datetime64[D]')
+        dates = dates[np.is_busday(dates)]
+        n = len(dates)
+
+        params = self._code_rng(stock_code).uniform(size=3)
+        base_price = 5 + params[0] * 145
+        vol = 0.012 + params[1] * 0.018
+        base_volume = 2e4 + params[2] * 2e6
+
+        # 每列使用独立的随机流：第 i 个交易日的取值只取决于 i，与序列长度无关
+        def noise(stream: int, scale: float) -> np.ndarray:
+            return self._code_rng(stock_code, stream).normal(0, scale, n)
+
+        # 对数价格随机游走，经 tanh 限制在基准价的 e^±1 倍以内，避免长期漂移到极端价格
+        walk = np.cumsum(noise(1, vol))
+        close = np.round(np.maximum(base_price * np.exp(np.tanh(walk)), 0.5), 2)
+
+        prev_close = np.empty(n)
+        if n:
+            prev_close[0] = close[0]
+            prev_close[1:] = close[:-1]
+        open_ = np.round(prev_close * (1 + noise(2, vol / 3)), 2)
+        high = np.round(np.maximum(open_, close) * (1 + np.abs(noise(3, vol / 2))), 2)
+        low = np.round(np.minimum(open_, close) * (1 - np.abs(noise(4, vol / 2))), 2)
+        volume = np.round(base_volume * np.exp(noise(5, 0.4)))
+        amount = np.round(volume * (open_ + high + low + close) / 4 * 100, 2)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            pct_chg = np.round((close / prev_close - 1) * 100, 2)
+
+        return dates, {
+            'open': open_,
+            'high': high,
+            'low': low,
+            'close': close,
+            'volume': volume,
+            'amount': amount,
+            'pct_chg': pct_chg,
+        }
+
+    @staticmethod
+    def _clip_end(end_date: Optional[str]) -> np.datetime64:
+        """结束日期不超过今天（不生成未来的K线）"""
+        today = np.datetime64(date.today(), 'D')
+        if not end_date:
+            return today
+        return min(np.datetime64(end_date[:10], 'D'), today)
+
+    def _fetch_raw_data(self, stock_code: str, start_date: str, end_date: str) -> pd.DataFrame:
+        """生成 [start_date, end_date] 区间的K线（列名已是标准列名）"""
+        self._simulate_request()
+
+        dates, columns = self._series(stock_code, self._clip_end(end_date))
+        # 区间内无K线时返回空表，与真实数据源一致（由 _prepare_frame 决定是否视为错误）
+        mask = dates >= np.datetime64(start_date[:10], 'D')
+        frame = {'date': dates[mask].astype('datetime64[ns]')}
+        frame.update({col: values[mask] for col, values in columns.items()})
+        return pd.DataFrame(frame)
+
+    def _normalize_data(self, df: pd.DataFrame, stock_code: str) -> pd.DataFrame:
+        """合成数据已是标准列名，只需补充代码列"""
+        return self._standardize(df, stock_code)
+
+    def get_minute_data(
+        self,
+        stock_code: str,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None
+    ) -> pd.DataFrame:
+        """
+        由日线推算的1分钟K线（与当日开高低收、成交量一致）
+
+        每个交易日使用独立的随机流：从开盘价到收盘价的布朗桥，
+        缩放到当日最高/最低价之间；成交量按 U 型分布拆分
+        """
+        self._simulate_request()
+
+        dates, columns = self._series(stock_code, self._clip_end(end_date))
+        start = np.datetime64(start_date[:10], 'D') if start_date else dates[-1]
+        index = np.flatnonzero(dates >= start)
+        if len(index) == 0:
+            raise DataFetchError(f"[{self.name}] {stock_code} 在 {start_date} ~ {end_date} 无分钟线")
+
+        n = len(MINUTE_OFFSETS)
+        steps = np.linspace(0, 1, n)
+        frames = []
+        for i in index:
+            day = dates[i]
+            rng = self._code_rng(stock_code, 1_000_000 + int(day.astype(np.int64)))
+            o, h, l, c = (columns[col][i] for col in ('open', 'high', 'low', 'close'))
+
+            # 布朗桥：首尾固定为 0，再线性叠加开盘→收盘的趋势
+            walk = np.cumsum(rng.normal(0, 1, n))
+            bridge = walk - steps * walk[-1]
+            span = np.abs(bridge).max() or 1.0
+            path = o + (c - o) * steps + bridge / span * (h - l) / 2
+            path = np.clip(path, l, h)
+            path[-1] = c
+
+            prev = np.concatenate([[o], path[:-1]])
+            volume = np.round(columns['volume'][i] * MINUTE_VOLUME_PROFILE * rng.uniform(0.5, 1.5, n))
+            frames.append(pd.DataFrame({
+                'time': (day + MINUTE_OFFSETS).astype('datetime64[ns]'),
+                'open': np.round(prev, 2),
+                'high': np.round(np.maximum(prev, path), 2),
+                'low': np.round(np.minimum(prev, path), 2),
+                'close': np.round(path, 2),
+                'volume': volume,
+                'amount': np.round(volume * (prev + path) / 2 * 100, 2),
+            }))
+        return pd.concat(frames, ignore_index=True)
+
+    def get_realtime_quote(self, stock_code: str) -> Optional[RealtimeQuote]:
+        """
+        最新一根K线生成的实时行情
+
+        模拟 AkshareFetcher 的全市场快照缓存：
+        每个 realtime_cache_ttl 周期内只有第一次调用注入延迟/失败
+        """
+        try:
+            with self._spot_lock:
+                from config import get_config
+                now = time.monotonic()
+                if self._spot_loaded_at is None or now - self._spot_loaded_at > get_config().realtime_cache_ttl:
+                    self._simulate_request()
+                    self._spot_loaded_at = now
+        except Exception as e:
+            logger.error(f"[API错误] 获取 {stock_code} 实时行情失败: {e}")
+            return None
+
+        dates, columns = self._series(stock_code, self._clip_end(None))
+        close, volume = columns['close'], columns['volume']
+        if len(close) < 2:
+            return None
+
+        rng = self._code_rng(stock_code, stream=100)
+        shares = rng.uniform(1e8, 5e9)
+        float_ratio = rng.uniform(0.3, 1.0)
+        price = float(close[-1])
+        year = close[-250:]
+        base_60d = close[-61] if len(close) > 60 else close[0]
+
+        return RealtimeQuote(
+            code=stock_code,
+            name=f"合成{stock_code}",
+            price=price,
+            change_pct=float(columns['pct_chg'][-1]),
+            change_amount=round(price - float(close[-2]), 2),
+            volume_ratio=round(float(volume[-1] / volume[-6:-1].mean()), 2) if len(volume) > 5 else 1.0,
+            turnover_rate=round(float(volume[-1] * 100 / (shares * float_ratio) * 100), 2),
+            amplitude=round(float((columns['high'][-1] - columns['low'][-1]) / close[-2] * 100), 2),
+            pe_ratio=round(float(rng.uniform(5, 80)), 2),
+            pb_ratio=round(float(rng.uniform(0.5, 10)), 2),
+            total_mv=round(price * shares, 2),
+            circ_mv=round(price * shares * float_ratio, 2),
+            change_60d=round(float((price / base_60d - 1) * 100), 2),
+            high_52w=float(year.max()),
+            low_52w=float(year.min()),
+        )
+
+    def get_chip_history(self, stock_code: str) -> Optional[pd.DataFrame]:
+        """
+        由K线推算的筹码分布历史（最近 CHIP_HISTORY_DAYS 个交易日）
+
+        每日筹码按前 CHIP_WINDOW 日的成交均价、以成交量为权重近似：
+        - 获利比例：成本不高于当日收盘价的成交量占比
+        - 平均成本：成交量加权均价
+        - 90/70 成本区间：成交均价的分位数
+
+        Returns:
+            列为 date + CHIP_COLUMNS 字段的 DataFrame，ETF 或失败返回 None
+        """
+        if self.is_etf(stock_code):
+            return None
+
+        try:
+            self._simulate_request()
+        except Exception as e:
+            logger.error(f"[API错误] 获取 {stock_code} 筹码分布失败: {e}")
+            return None
+
+        dates, columns = self._series(stock_code, self._clip_end(None))
+        days = min(CHIP_HISTORY_DAYS, len(dates) - CHIP_WINDOW + 1)
+        if days <= 0:
+            return None
+
+        avg_price = (columns['high'] + columns['low'] + columns['close']) / 3
+        cost = np.lib.stride_tricks.sliding_window_view(avg_price, CHIP_WINDOW)[-days:]
+        weight = np.lib.stride_tricks.sliding_window_view(columns['volume'], CHIP_WINDOW)[-days:]
+        close = columns['close'][-days:]
+
+        total = weight.sum(axis=1)
+        profit_ratio = (weight * (cost <= close[:, None])).sum(axis=1) / total
+        avg_cost = (weight * cost).sum(axis=1) / total
+        p5, p15, p85, p95 = np.percentile(cost, [5, 15, 85, 95], axis=1)
+
+        return pd.DataFrame({
+            'date': dates[-days:].astype('datetime64[ns]'),
+            'profit_ratio': np.round(profit_ratio, 4),
+            'avg_cost': np.round(avg_cost, 2),
+            'cost_90_low': np.round(p5, 2),
+            'cost_90_high': np.round(p95, 2),
+            'concentration_90': np.round((p95 - p5) / (p95 + p5), 4),
+            'cost_70_low': np.round(p15, 2),
+            'cost_70_high': np.round(p85, 2),
+            'concentration_70': np.round((p85 - p15) / (p85 + p15), 4),
+        }, columns=list(CHIP_COLUMNS.values()))
+
+    def get_chip_distribution(self, stock_code: str) -> Optional[ChipDistribution]:
+        """最新一天的筹码分布"""
+        history = self.get_chip_history(stock_code)
+        if history is None or history.empty:
+            return None
+        latest = history.iloc[-1]
+        return ChipDistribution(
+            code=stock_code,
+            date=latest['date'].strftime('%Y-%m-%d'),
+            **{field: float(latest[field]) for field in CHIP_COLUMNS.values() if field != 'date'}
+        )
+
+
+if __name__ == "__main__":
+    # 测试代码
+    logging.basicConfig(level=logging.DEBUG)
+
+    fetcher = SyntheticFetcher(seed=42)
+    df = fetcher.get_daily_data('600519', days=30)
+    print(f"获取成功，共 {len(df)} 条数据")
+    print(df.tail())
+
+    # 同一代码不同区间的重叠部分完全一致
+    longer = fetcher.get_daily_data('600519', days=60)
+    assert np.allclose(longer['close'].to_numpy()[-len(df):], df['close'].to_numpy())
+
+    print(fetcher.get_realtime_quote('600519'))
+    print(fetcher.get_chip_distribution('600519'))
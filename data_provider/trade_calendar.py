@@ -0,0 +1,288 @@
+# -*- coding: utf-8 -*-
+"""
+===================================
+A股交易日历
+===================================
+
+问题：
+- 周末/节假日 has_today_data(date.today()) 永远为 False，定时任务会重新请求所有股票
+- 获取窗口按 days * 2 个自然日估算，长假前后不是偏多就是偏少
+
+方案：
+1. 从交易所日历（ak.tool_trade_date_hist_sina，含当年全部交易日）构建，
+   保存到本地文件，每年（或本地日历不覆盖今天时）重建一次
+2. 构建时为覆盖区间内的每个自然日预计算"截至当天的交易日序号"，
+   is_trading_day / last_trading_day / trading_days_between 均为 O(1) 查表
+3. 获取失败且没有本地文件时，退化为周一至周五的工作日日历
+4. last_completed_trading_day：交易日收盘且数据源发布日线（MARKET_DATA_READY_TIME，北京时间）之前，
+   当天尚无日线，断点续传以前一个交易日为准；
+   data_ready_at 给出某个交易日日线就绪的本机时间，早于该时间写入的K线是盘中的不完整数据
+"""
+
+import json
+import logging
+import threading
+from datetime import date, datetime, time, timedelta
+from pathlib import Path
+from typing import Iterable, List, Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+logger = logging.getLogger(__name__)
+
+# A 股交易所所在时区（收盘时间、数据发布时间均以此为准）
+MARKET_TIMEZONE = 'Asia/Shanghai'
+
+
+class TradeCalendar:
+    """
+    交易日历（只读）
+
+    Args:
+        trade_dates: 交易日列表（无需排序、可重复）
+        source: 日历来源说明（用于日志）
+    """
+
+    def __init__(self, trade_dates: Iterable[date], source: str = ""):
+        self.trade_dates: List[date] = sorted(set(trade_dates))
+        if not self.trade_dates:
+            raise ValueError("交易日列表为空")
+
+        self.source = source
+        self.first_date = self.trade_dates[0]
+        self.last_date = self.trade_dates[-1]
+
+        # _index[i]: 自然日 first_date + i 当天及之前的交易日个数 - 1
+        self._base = self.first_date.toordinal()
+        span = self.last_date.toordinal() - self._base + 1
+        self._index: List[int] = [0] * span
+        self._is_open: List[bool] = [False] * span
+        for d in self.trade_dates:
+            self._is_open[d.toordinal() - self._base] = True
+        count = -1
+        for i in range(span):
+            if self._is_open[i]:
+                count += 1
+            self._index[i] = count
+
+    def covers(self, d: date) -> bool:
+        """日期是否在日历覆盖范围内"""
+        return self.first_date <= d <= self.last_date
+
+    def is_trading_day(self, d: date) -> bool:
+        """是否为交易日（超出覆盖范围时按工作日判断）"""
+        if not self.covers(d):
+            return d.weekday() < 5
+        return self._is_open[d.toordinal() - self._base]
+
+    def _position(self, d: date) -> int:
+        """d 当天及之前最近一个交易日在 trade_dates 中的下标（早于覆盖范围时为 -1）"""
+        if d < self.first_date:
+            return -1
+        if d > self.last_date:
+            return len(self.trade_dates) - 1
+        return self._index[d.toordinal() - self._base]
+
+    def last_trading_day(self, d: Optional[date] = None) -> date:
+        """
+        d 当天及之前最近的一个交易日（默认今天）
+
+        超出覆盖范围时按工作日回退
+        """
+        d = d or date.today()
+        if not self.covers(d):
+            while d.weekday() >= 5:
+                d -= timedelta(days=1)
+            return d
+        return self.trade_dates[self._position(d)]
+
+    def previous_trading_day(self, d: Optional[date] = None) -> date:
+        """d 之前（不含 d）最近的一个交易日"""
+        d = d or date.today()
+        return self.last_trading_day(d - timedelta(days=1))
+
+    def last_completed_trading_day(
+        self,
+        now: Optional[datetime] = None,
+        ready_time: Optional[time] = None
+    ) -> date:
+        """
+        最近一个已收盘且日线已发布的交易日
+
+        now 为交易日且早于 ready_time（收盘 + 数据源发布延迟）时，当天尚未完成，
+        回退到前一个交易日；周末/节假日与 last_trading_day 相同
+
+        Args:
+            now: 当前时间（默认北京时间的现在）
+            ready_time: 日线就绪时间（默认取配置 MARKET_DATA_READY_TIME）
+        """
+        now = now or market_now()
+        ready_time = ready_time or get_data_ready_time()
+        d = self.last_trading_day(now.date())
+        if d == now.date() and now.time() < ready_time:
+            d = self.previous_trading_day(d)
+        return d
+
+    def trading_days_between(self, start: date, end: date) -> int:
+        """闭区间 [start, end] 内的交易日个数"""
+        if end < start:
+            return 0
+        if self.covers(start) and self.covers(end):
+            return self._position(end) - self._position(start - timedelta(days=1))
+        # 超出覆盖范围：按工作日计数
+        days = 0
+        d = start
+        while d <= end:
+            if self.is_trading_day(d):
+                days += 1
+            d += timedelta(days=1)
+        return days
+
+    def shift(self, d: date, n: int) -> date:
+        """
+        d 当天及之前最近交易日再往前数 n 个交易日（n=0 即 last_trading_day）
+
+        用于按交易日数计算获取窗口的起始日期
+        """
+        pos = self._position(d)
+        if self.covers(d) and pos - n >= 0:
+            return self.trade_dates[pos - n]
+        # 超出覆盖范围：按工作日回退
+        d = self.last_trading_day(d)
+        while n > 0:
+            d -= timedelta(days=1)
+            if d.weekday() < 5:
+                n -= 1
+        return d
+
+
+def market_now() -> datetime:
+    """当前的北京时间（不带时区信息；时区数据不可用时退化为本机时间）"""
+    try:
+        return datetime.now(ZoneInfo(MARKET_TIMEZONE)).replace(tzinfo=None)
+    except ZoneInfoNotFoundError:
+        return datetime.now()
+
+
+def get_data_ready_time() -> time:
+    """配置的日线就绪时间（MARKET_DATA_READY_TIME，格式 HH:MM）"""
+    from config import get_config
+    return datetime.strptime(get_config().market_data_ready_time, '%H:%M').time()
+
+
+def data_ready_at(d: date, ready_time: Optional[time] = None) -> datetime:
+    """
+    交易日 d 的日线就绪时间（本机时间，不带时区信息，可与 datetime.now() 记录的 updated_at 比较）
+
+    Args:
+        d: 交易日
+        ready_time: 日线就绪时间（默认取配置 MARKET_DATA_READY_TIME，北京时间）
+    """
+    ready = datetime.combine(d, ready_time or get_data_ready_time())
+    try:
+        return ready.replace(tzinfo=ZoneInfo(MARKET_TIMEZONE)).astimezone().replace(tzinfo=None)
+    except ZoneInfoNotFoundError:
+        return ready
+
+
+def _weekday_calendar(start: date, end: date) -> TradeCalendar:
+    """周一至周五的近似日历（无法获取交易所日历时使用）"""
+    days = []
+    d = start
+    while d <= end:
+        if d.weekday() < 5:
+            days.append(d)
+        d += timedelta(days=1)
+    return TradeCalendar(days, source="weekday")
+
+
+def _fetch_exchange_dates() -> List[date]:
+    """从新浪获取交易所交易日历（1990 年至今年年底）"""
+    import akshare as ak
+
+    df = ak.tool_trade_date_hist_sina()
+    return [
+        v if isinstance(v, date) else datetime.strptime(str(v)[:10], '%Y-%m-%d').date()
+        for v in df['trade_date']
+    ]
+
+
+def _load_cached(path: Path) -> Optional[dict]:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning(f"[交易日历] 读取本地文件失败，将重新构建: {e}")
+        return None
+
+
+def build_trade_calendar(cache_path: Path, today: Optional[date] = None) -> TradeCalendar:
+    """
+    加载或构建交易日历
+
+    1. 本地文件存在、构建年份为今年且覆盖今天：直接使用
+    2. 否则从交易所日历重建并写回本地文件
+    3. 重建失败：有旧文件用旧文件，没有则退化为工作日日历
+    """
+    today = today or date.today()
+    cached = _load_cached(cache_path)
+
+    if cached and cached.get('built_year') == today.year:
+        calendar = TradeCalendar(
+            (date.fromisoformat(d) for d in cached['dates']), source=str(cache_path)
+        )
+        if calendar.last_date >= today:
+            return calendar
+
+    try:
+        dates = _fetch_exchange_dates()
+        calendar = TradeCalendar(dates, source="exchange")
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(cache_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'built_year': today.year,
+                'built_at': datetime.now().isoformat(timespec='seconds'),
+                'dates': [d.isoformat() for d in calendar.trade_dates],
+            }, f)
+        logger.info(
+            f"[交易日历] 已构建: {calendar.first_date} ~ {calendar.last_date}，"
+            f"共 {len(calendar.trade_dates)} 个交易日"
+        )
+        return calendar
+    except Exception as e:
+        logger.warning(f"[交易日历] 获取交易所日历失败: {e}")
+
+    if cached and cached.get('dates'):
+        logger.warning("[交易日历] 使用过期的本地日历")
+        return TradeCalendar((date.fromisoformat(d) for d in cached['dates']), source=str(cache_path))
+
+    logger.warning("[交易日历] 退化为工作日日历（节假日将被视为交易日）")
+    return _weekday_calendar(date(today.year - 10, 1, 1), date(today.year, 12, 31))
+
+
+_calendar: Optional[TradeCalendar] = None
+_calendar_year: Optional[int] = None
+_calendar_lock = threading.Lock()
+
+
+def get_trade_calendar() -> TradeCalendar:
+    """获取全局交易日历（懒加载，跨年后自动重建）"""
+    global _calendar, _calendar_year
+    year = date.today().year
+    if _calendar is None or _calendar_year != year:
+        with _calendar_lock:
+            if _calendar is None or _calendar_year != year:
+                from config import get_config
+                cache_path = Path(get_config().database_path).parent / 'trade_calendar.json'
+                _calendar = build_trade_calendar(cache_path)
+                _calendar_year = year
+    return _calendar
+
+
+def set_trade_calendar(calendar: Optional[TradeCalendar]) -> None:
+    """替换全局交易日历（用于测试或离线运行）"""
+    global _calendar, _calendar_year
+    with _calendar_lock:
+        _calendar = calendar
+        _calendar_year = date.today().year if calendar is not None else None
@@ -8,16 +8,19 @@ TushareFetcher - 备用数据源 1 (Priority 2)
 特点：需要 Token、有请求配额限制
 优点：数据质量高、接口稳定
 
+批量模式：
+- daily(trade_date=...) 一次调用返回全市场当日日线
+- N 只股票 × M 天 从 N×? 次调用降为 M 次调用
+
 流控策略：
-1. 实现"每分钟调用计数器"
-2. 超过免费配额（80次/分）时，强制休眠到下一分钟
+1. 全局令牌桶：所有实例、所有线程共享每分钟配额
+2. 超过免费配额（80次/分）时，排队等待下一个可用令牌
 3. 使用 tenacity 实现指数退避重试
 """
 
 import logging
-import time
 from datetime import datetime
-from typing import Optional, Tuple
+from typing import Callable, Optional, Tuple, List, Dict
 
 import pandas as pd
 from tenacity import (
@@ -28,7 +31,8 @@ from tenacity import (
     before_sleep_log,
 )
 
-from .base import BaseFetcher, DataFetchError, RateLimitError, STANDARD_COLUMNS
+from .base import BaseFetcher, DataFetchError, DataSourceUnavailableError, RateLimitError, STANDARD_COLUMNS
+from .rate_limiter import TokenBucket, get_rate_limiter
 from config import get_config
 
 logger = logging.getLogger(__name__)
@@ -42,8 +46,8 @@ class TushareFetcher(BaseFetcher):
     数据来源：Tushare Pro API
     
     关键策略：
-    - 每分钟调用计数器，防止超出配额
-    - 超过 80 次/分钟时强制等待
+    - 全局令牌桶，防止超出配额
+    - 超过 80 次/分钟时排队等待
     - 失败后指数退避重试
     
     配额说明（Tushare 免费用户）：
@@ -53,6 +57,7 @@ class TushareFetcher(BaseFetcher):
     
     name = "TushareFetcher"
     priority = 2
+    adjust = "none"  # pro.daily 为不复权行情
     
     def __init__(self, rate_limit_per_minute: int = 80):
         """
@@ -62,8 +67,6 @@ class TushareFetcher(BaseFetcher):
             rate_limit_per_minute: 每分钟最大请求数（默认80，Tushare免费配额）
         """
         self.rate_limit_per_minute = rate_limit_per_minute
-        self._call_count = 0  # 当前分钟内的调用次数
-        self._minute_start: Optional[float] = None  # 当前计数周期开始时间
         self._api: Optional[object] = None  # Tushare API 实例
         
         # 尝试初始化 API
@@ -101,42 +104,27 @@ class TushareFetcher(BaseFetcher):
         检查并执行速率限制
         
         流控策略：
-        1. 检查是否进入新的一分钟
-        2. 如果是，重置计数器
-        3. 如果当前分钟调用次数超过限制，强制休眠
+        1. 所有 TushareFetcher 实例、所有线程共享同一个令牌桶
+        2. 突发容量 + 60 秒补充量不超过每分钟配额，任意 60 秒窗口内都不会超限
+        3. 配额用尽时按到达顺序等待，只等到下一个令牌可用为止
         """
-        current_time = time.time()
-        
-        # 检查是否需要重置计数器（新的一分钟）
-        if self._minute_start is None:
-            self._minute_start = current_time
-            self._call_count = 0
-        elif current_time - self._minute_start >= 60:
-            # 已经过了一分钟，重置计数器
-            self._minute_start = current_time
-            self._call_count = 0
-            logger.debug("速率限制计数器已重置")
-        
-        # 检查是否超过配额
-        if self._call_count >= self.rate_limit_per_minute:
-            # 计算需要等待的时间（到下一分钟）
-            elapsed = current_time - self._minute_start
-            sleep_time = max(0, 60 - elapsed) + 1  # +1 秒缓冲
-            
-            logger.warning(
-                f"Tushare 达到速率限制 ({self._call_count}/{self.rate_limit_per_minute} 次/分钟)，"
-                f"等待 {sleep_time:.1f} 秒..."
-            )
-            
-            time.sleep(sleep_time)
-            
-            # 重置计数器
-            self._minute_start = time.time()
-            self._call_count = 0
-        
-        # 增加调用计数
-        self._call_count += 1
-        logger.debug(f"Tushare 当前分钟调用次数: {self._call_count}/{self.rate_limit_per_minute}")
+        wait = self.rate_limiter().acquire()
+        if wait > 1:
+            logger.info(f"Tushare 达到速率限制（{self.rate_limit_per_minute} 次/分钟），已等待 {wait:.1f} 秒")
+    
+    def rate_limiter(self) -> TokenBucket:
+        """Tushare 全局令牌桶（突发容量为每分钟配额的 1/8）"""
+        burst = max(1, self.rate_limit_per_minute // 8)
+        return get_rate_limiter(
+            'tushare',
+            rate=max(1, self.rate_limit_per_minute - burst) / 60.0,
+            capacity=burst,
+        )
+    
+    @property
+    def is_available(self) -> bool:
+        """Tushare API 是否可用（Token 已配置且初始化成功）"""
+        return self._api is not None
     
     def _convert_stock_code(self, stock_code: str) -> str:
         """
@@ -189,7 +177,7 @@ class TushareFetcher(BaseFetcher):
         4. 调用 API 获取数据
         """
         if self._api is None:
-            raise DataFetchError("Tushare API 未初始化，请检查 Token 配置")
+            raise DataSourceUnavailableError("Tushare API 未初始化，请检查 Token 配置")
         
         # 速率限制检查
         self._check_rate_limit()
@@ -223,6 +211,134 @@ class TushareFetcher(BaseFetcher):
             
             raise DataFetchError(f"Tushare 获取数据失败: {e}") from e
     
+    def get_trade_dates(self, start_date: str, end_date: str) -> List[str]:
+        """
+        获取区间内的交易日列表
+        
+        使用 trade_cal 接口（is_open=1），接口不可用时退化为工作日
+        
+        Args:
+            start_date: 开始日期，格式 'YYYY-MM-DD'
+            end_date: 结束日期，格式 'YYYY-MM-DD'
+            
+        Returns:
+            交易日列表，格式 'YYYY-MM-DD'，升序
+        """
+        if self._api is None:
+            raise DataSourceUnavailableError("Tushare API 未初始化，请检查 Token 配置")
+        
+        try:
+            self._check_rate_limit()
+            df = self._api.trade_cal(
+                exchange='SSE',
+                start_date=start_date.replace('-', ''),
+                end_date=end_date.replace('-', ''),
+                is_open='1',
+            )
+            dates = pd.to_datetime(df['cal_date'], format='%Y%m%d')
+        except Exception as e:
+            logger.warning(f"Tushare trade_cal 获取失败，按工作日估算: {e}")
+            dates = pd.bdate_range(start=start_date, end=end_date)
+        
+        return sorted(d.strftime('%Y-%m-%d') for d in dates)
+    
+    def get_market_daily(self, trade_date: str) -> pd.DataFrame:
+        """
+        一次调用获取全市场指定交易日的日线数据
+        
+        Args:
+            trade_date: 交易日，格式 'YYYY-MM-DD'
+            
+        Returns:
+            标准化后的长表 DataFrame（含 code 列），非交易日为空
+        """
+        if self._api is None:
+            raise DataSourceUnavailableError("Tushare API 未初始化，请检查 Token 配置")
+        
+        self._check_rate_limit()
+        logger.info(f"[API调用] Tushare daily(trade_date={trade_date}) 获取全市场日线...")
+        
+        try:
+            df = self._api.daily(trade_date=trade_date.replace('-', ''))
+        except Exception as e:
+            error_msg = str(e).lower()
+            if any(keyword in error_msg for keyword in ['quota', '配额', 'limit', '权限']):
+                raise RateLimitError(f"Tushare 配额超限: {e}") from e
+            raise DataFetchError(f"Tushare 获取 {trade_date} 全市场日线失败: {e}") from e
+        
+        if df is None or df.empty:
+            logger.info(f"[API返回] {trade_date} 无数据（非交易日或数据未更新）")
+            return pd.DataFrame(columns=['code'] + STANDARD_COLUMNS)
+        
+        logger.info(f"[API返回] Tushare daily(trade_date={trade_date}) 成功: 返回 {len(df)} 行数据")
+        
+        # 600519.SH -> 600519
+        df['code'] = df['ts_code'].str.split('.').str[0]
+        return self._normalize_data(df, stock_code='')
+    
+    def get_daily_data_bulk(
+        self,
+        start_date: str,
+        end_date: str,
+        codes: Optional[List[str]] = None,
+        histories: Optional[Dict[str, pd.DataFrame]] = None,
+        history_loader: Optional[Callable[[List[str]], Dict[str, pd.DataFrame]]] = None
+    ) -> Dict[str, pd.DataFrame]:
+        """
+        批量获取日线数据（按交易日拉取全市场）
+        
+        流程：
+        1. 获取区间内的交易日
+        2. 每个交易日调用一次 daily(trade_date=...)
+        3. 按 codes 过滤（codes 为空时保留全市场）
+        4. 按股票拆分，计算技术指标（有 history 时增量计算）
+        
+        Args:
+            start_date: 开始日期，格式 'YYYY-MM-DD'
+            end_date: 结束日期，格式 'YYYY-MM-DD'
+            codes: 股票代码列表（可选，为空表示保留全部）
+            histories: 各股票已存储的历史K线（可选，增量模式）
+            history_loader: 按实际返回的代码加载历史K线（可选，补充 histories 中没有的代码；
+                全市场模式下事先不知道会返回哪些代码）
+            
+        Returns:
+            股票代码 -> 标准化 DataFrame（含技术指标）
+        """
+        trade_dates = self.get_trade_dates(start_date, end_date)
+        if not trade_dates:
+            return {}
+        
+        logger.info(f"[{self.name}] 批量获取 {len(trade_dates)} 个交易日的全市场日线: "
+                    f"{trade_dates[0]} ~ {trade_dates[-1]}")
+        
+        code_set = set(codes) if codes else None
+        frames = []
+        for trade_date in trade_dates:
+            df = self.get_market_daily(trade_date)
+            if code_set is not None:
+                df = df[df['code'].isin(code_set)]
+            if not df.empty:
+                frames.append(df)
+        
+        if not frames:
+            return {}
+        
+        all_df = pd.concat(frames, ignore_index=True)
+        histories = dict(histories or {})
+        if history_loader is not None:
+            missing = [code for code in all_df['code'].unique() if code not in histories]
+            if missing:
+                histories.update(history_loader(missing))
+        
+        result: Dict[str, pd.DataFrame] = {}
+        for code, group in all_df.groupby('code', sort=False):
+            df = self._apply_indicators(self._clean_data(group), histories.get(code))
+            if not df.empty:
+                result[code] = df
+        
+        logger.info(f"[{self.name}] 批量获取完成: {len(result)} 只股票，共 {len(all_df)} 条数据")
+        return result
+    
     def _normalize_data(self, df: pd.DataFrame, stock_code: str) -> pd.DataFrame:
         """
         标准化 Tushare 数据
@@ -233,36 +349,21 @@ class TushareFetcher(BaseFetcher):
         需要映射到标准列名：
         date, open, high, low, close, volume, amount, pct_chg
         """
-        df = df.copy()
-        
-        # 列名映射
-        column_mapping = {
-            'trade_date': 'date',
-            'vol': 'volume',
-            # open, high, low, close, amount, pct_chg 列名相同
-        }
-        
-        df = df.rename(columns=column_mapping)
-        
-        # 转换日期格式（YYYYMMDD -> YYYY-MM-DD）
-        if 'date' in df.columns:
-            df['date'] = pd.to_datetime(df['date'], format='%Y%m%d')
+        # 列名映射（open, high, low, close, amount, pct_chg 列名相同）
+        # 批量模式下 code 列已由 ts_code 转换得到，会被保留
+        df = self._standardize(
+            df, stock_code,
+            column_mapping={'trade_date': 'date', 'vol': 'volume'},
+            date_format='%Y%m%d',
+        )
         
         # 成交量单位转换（Tushare 的 vol 单位是手，需要转换为股）
         if 'volume' in df.columns:
-            df['volume'] = df['volume'] * 100
+            df['volume'] = df['volume'].to_numpy() * 100
         
         # 成交额单位转换（Tushare 的 amount 单位是千元，转换为元）
         if 'amount' in df.columns:
-            df['amount'] = df['amount'] * 1000
-        
-        # 添加股票代码列
-        df['code'] = stock_code
-        
-        # 只保留需要的列
-        keep_cols = ['code'] + STANDARD_COLUMNS
-        existing_cols = [col for col in keep_cols if col in df.columns]
-        df = df[existing_cols]
+            df['amount'] = df['amount'].to_numpy() * 1000
         
         return df
 
@@ -11,13 +11,15 @@ YfinanceFetcher - 兜底数据源 (Priority 4)
 关键策略：
 1. 自动将 A 股代码转换为 yfinance 格式（.SS / .SZ）
 2. 处理 Yahoo Finance 的数据格式差异
-3. 失败后指数退避重试
+3. 批量模式：多个代码一次 yf.download，按代码拆分结果
+4. 失败后指数退避重试
 """
 
 import logging
 from datetime import datetime
-from typing import Optional
+from typing import Optional, List, Dict, Tuple
 
+import numpy as np
 import pandas as pd
 from tenacity import (
     retry,
@@ -28,6 +30,7 @@ from tenacity import (
 )
 
 from .base import BaseFetcher, DataFetchError, STANDARD_COLUMNS
+from .cache import get_frame_cache
 
 logger = logging.getLogger(__name__)
 
@@ -52,6 +55,7 @@ class YfinanceFetcher(BaseFetcher):
     
     name = "YfinanceFetcher"
     priority = 4
+    adjust = "auto"  # auto_adjust=True
     
     def __init__(self):
         """初始化 YfinanceFetcher"""
@@ -123,9 +127,7 @@ class YfinanceFetcher(BaseFetcher):
                 auto_adjust=True,  # 自动调整价格（复权）
             )
             
-            if df.empty:
-                raise DataFetchError(f"Yahoo Finance 未查询到 {stock_code} 的数据")
-            
+            # 空结果由 _prepare_frame 处理（区间请求视为已是最新，否则抛出 DataFetchError）
             return df
             
         except Exception as e:
@@ -133,6 +135,125 @@ class YfinanceFetcher(BaseFetcher):
                 raise
             raise DataFetchError(f"Yahoo Finance 获取数据失败: {e}") from e
     
+    @retry(
+        stop=stop_after_attempt(3),
+        wait=wait_exponential(multiplier=1, min=2, max=30),
+        retry=retry_if_exception_type((ConnectionError, TimeoutError)),
+        before_sleep=before_sleep_log(logger, logging.WARNING),
+    )
+    def _download_many(self, tickers: List[str], start_date: str, end_date: str) -> pd.DataFrame:
+        """
+        多代码一次下载（yfinance 内部多线程并发）
+        
+        Returns:
+            列为 (ticker, 字段) 两级 MultiIndex 的 DataFrame
+        """
+        import yfinance as yf
+        
+        logger.debug(f"调用 yfinance.download({len(tickers)} 个代码, {start_date}, {end_date})")
+        
+        return yf.download(
+            tickers=tickers,
+            start=start_date,
+            end=end_date,
+            progress=False,
+            auto_adjust=True,
+            group_by='ticker',  # 第一级列为代码，便于按代码拆分
+            threads=True,
+        )
+    
+    def get_daily_data_many(
+        self,
+        stock_codes: List[str],
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        days: int = 30,
+        histories: Optional[Dict[str, pd.DataFrame]] = None
+    ) -> Tuple[Dict[str, pd.DataFrame], Dict[str, str]]:
+        """
+        批量获取多只股票的日线数据（一次 yf.download）
+        
+        流程：
+        1. 先查磁盘缓存，命中的代码不再下载
+        2. 其余代码转换为 Yahoo 格式后一次下载
+        3. 按第一级列（代码）切出各自的子表，不做整表复制
+        4. 各代码独立标准化、计算指标，失败单独记录
+        
+        Returns:
+            Tuple[成功结果 {代码: DataFrame}, 失败原因 {代码: 错误信息}]
+        """
+        is_range = start_date is not None
+        start_date, end_date = self._resolve_date_range(start_date, end_date, days)
+        allow_empty = is_range and self._range_has_no_sessions(start_date, end_date)
+        histories = histories or {}
+        
+        results: Dict[str, pd.DataFrame] = {}
+        errors: Dict[str, str] = {}
+        
+        cache = get_frame_cache()
+        missing = []
+        for code in stock_codes:
+            cached = cache.get(self.name, code, start_date, end_date, self.adjust)
+            if cached is None:
+                missing.append(code)
+                continue
+            results[code] = self._apply_indicators(cached, histories.get(code))
+        
+        if not missing:
+            return results, errors
+        if cache.replay:
+            errors.update({code: "回放模式下缓存未命中" for code in missing})
+            return results, errors
+        
+        tickers = {code: self._convert_stock_code(code) for code in missing}
+        unique_tickers = list(dict.fromkeys(tickers.values()))
+        
+        logger.info(f"[{self.name}] 批量获取 {len(unique_tickers)} 个代码: {start_date} ~ {end_date}")
+        
+        try:
+            raw = self._download_many(unique_tickers, start_date, end_date)
+        except Exception as e:
+            error = f"Yahoo Finance 批量获取失败: {e}"
+            logger.error(f"[{self.name}] {error}")
+            errors.update({code: error for code in missing})
+            return results, errors
+        
+        if raw is None or raw.empty:
+            error = "Yahoo Finance 未返回任何数据"
+            errors.update({code: error for code in missing})
+            return results, errors
+        
+        multi = isinstance(raw.columns, pd.MultiIndex)
+        available = set(raw.columns.get_level_values(0)) if multi else set()
+        
+        for code, ticker in tickers.items():
+            try:
+                if multi:
+                    if ticker not in available:
+                        raise DataFetchError(f"Yahoo Finance 未查询到 {code} 的数据")
+                    sub = raw[ticker]
+                else:
+                    # 旧版本 yfinance 单代码时返回单层列
+                    sub = raw
+                
+                # 该代码在区间内全部为空：只有区间内没有交易日时视为已是最新
+                if 'Close' not in sub.columns or not sub['Close'].notna().any():
+                    if not allow_empty:
+                        raise DataFetchError(f"Yahoo Finance 未查询到 {code} 的数据")
+                    sub = None
+                
+                frame = self._prepare_frame(sub, code, allow_empty=allow_empty)
+                if not frame.empty:
+                    cache.put(self.name, code, start_date, end_date, frame, self.adjust)
+                results[code] = self._apply_indicators(frame, histories.get(code))
+                
+            except Exception as e:
+                errors[code] = str(e)
+                logger.warning(f"[{self.name}] {code} 批量获取失败: {e}")
+        
+        logger.info(f"[{self.name}] 批量获取完成: 成功 {len(results)} 只，失败 {len(errors)} 只")
+        return results, errors
+    
     def _normalize_data(self, df: pd.DataFrame, stock_code: str) -> pd.DataFrame:
         """
         标准化 Yahoo Finance 数据
@@ -143,14 +264,8 @@ class YfinanceFetcher(BaseFetcher):
         需要映射到标准列名：
         date, open, high, low, close, volume, amount, pct_chg
         """
-        df = df.copy()
-        
-        # 重置索引，将日期从索引变为列
-        df = df.reset_index()
-        
-        # 列名映射（yfinance 使用首字母大写）
+        # 列名映射（yfinance 使用首字母大写），日期从索引取出
         column_mapping = {
-            'Date': 'date',
             'Open': 'open',
             'High': 'high',
             'Low': 'low',
@@ -158,27 +273,24 @@ class YfinanceFetcher(BaseFetcher):
             'Volume': 'volume',
         }
         
-        df = df.rename(columns=column_mapping)
+        df = self._standardize(df, stock_code, column_mapping, index_as='date')
         
-        # 计算涨跌幅（因为 yfinance 不直接提供）
-        if 'close' in df.columns:
-            df['pct_chg'] = df['close'].pct_change() * 100
-            df['pct_chg'] = df['pct_chg'].fillna(0).round(2)
+        close = df['close'].to_numpy(dtype=float) if 'close' in df.columns else None
         
         # 计算成交额（yfinance 不提供，使用估算值）
         # 成交额 ≈ 成交量 * 平均价格
-        if 'volume' in df.columns and 'close' in df.columns:
-            df['amount'] = df['volume'] * df['close']
+        if 'volume' in df.columns and close is not None:
+            df['amount'] = df['volume'].to_numpy() * close
         else:
-            df['amount'] = 0
+            df['amount'] = 0.0
         
-        # 添加股票代码列
-        df['code'] = stock_code
-        
-        # 只保留需要的列
-        keep_cols = ['code'] + STANDARD_COLUMNS
-        existing_cols = [col for col in keep_cols if col in df.columns]
-        df = df[existing_cols]
+        # 计算涨跌幅（因为 yfinance 不直接提供）
+        if close is not None:
+            pct_chg = np.zeros(len(close))
+            if len(close) > 1:
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    pct_chg[1:] = (close[1:] / close[:-1] - 1) * 100
+            df['pct_chg'] = np.round(np.nan_to_num(pct_chg, nan=0.0), 2)
         
         return df
 
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+===================================
+A股自选股智能分析系统 - 技术指标物化
+===================================
+
+问题：
+- 数据源只计算 MA5/10/20 与量比；MA60、EMA、MACD 每次分析都要对整段窗口重新滚动计算
+- MACD 依赖 EMA 的递推值，只看最近 N 根K线算不准，每次都要从头算
+
+方案：
+1. 每只股票保存一份运行状态（IndicatorState）：最近 60 根收盘价、其和，
+   以及 EMA12 / EMA26 / DEA 的递推值
+2. 追加新K线时按状态 O(1) 递推出该K线的 MA60、EMA、MACD，随日线一起写入数据库
+3. 历史K线被修订（或首次物化）时，从头逐根重放同一个递推，
+   保证全量重建与增量追加的结果逐位一致
+
+约定（与主流行情软件一致）：
+- EMA 以第一根K线的收盘价为初值：EMA_t = α·C_t + (1-α)·EMA_{t-1}，α = 2/(N+1)
+- DIF = EMA12 - EMA26，DEA = DIF 的 9 日 EMA，MACD 柱 = 2 × (DIF - DEA)
+- 不足 60 根K线时 MA60 为空
+"""
+
+import json
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Deque, Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+
+# 物化的指标列（与 StockDaily 的字段对应）
+INDICATOR_COLUMNS = ['ma60', 'ema12', 'ema26', 'macd_dif', 'macd_dea', 'macd_hist']
+
+MA_LONG_WINDOW = 60
+EMA_FAST_SPAN = 12
+EMA_SLOW_SPAN = 26
+DEA_SPAN = 9
+
+
+def _alpha(span: int) -> float:
+    return 2.0 / (span + 1)
+
+
+@dataclass
+class IndicatorState:
+    """单只股票的指标递推状态"""
+    last_date: Optional[date] = None
+    bars: int = 0
+    closes: Deque[float] = field(default_factory=lambda: deque(maxlen=MA_LONG_WINDOW))
+    sum_close: float = 0.0
+    ema_fast: Optional[float] = None
+    ema_slow: Optional[float] = None
+    dea: Optional[float] = None
+
+    def step(self, bar_date: date, close: Optional[float]) -> Dict[str, Optional[float]]:
+        """
+        追加一根K线，O(1) 更新状态
+
+        Returns:
+            该K线的指标值（INDICATOR_COLUMNS -> 值，收盘价缺失时全部为 None）
+        """
+        if close is None or np.isnan(close):
+            return dict.fromkeys(INDICATOR_COLUMNS)
+
+        if len(self.closes) == MA_LONG_WINDOW:
+            self.sum_close -= self.closes[0]
+        self.closes.append(close)
+        self.sum_close += close
+
+        if self.ema_fast is None:
+            self.ema_fast = self.ema_slow = close
+            self.dea = 0.0
+        else:
+            self.ema_fast += _alpha(EMA_FAST_SPAN) * (close - self.ema_fast)
+            self.ema_slow += _alpha(EMA_SLOW_SPAN) * (close - self.ema_slow)
+        dif = self.ema_fast - self.ema_slow
+        if self.bars:
+            self.dea += _alpha(DEA_SPAN) * (dif - self.dea)
+
+        self.bars += 1
+        self.last_date = bar_date
+
+        ma60 = None
+        if len(self.closes) == MA_LONG_WINDOW:
+            ma60 = round(self.sum_close / MA_LONG_WINDOW, 2)
+
+        return {
+            'ma60': ma60,
+            'ema12': self.ema_fast,
+            'ema26': self.ema_slow,
+            'macd_dif': dif,
+            'macd_dea': self.dea,
+            'macd_hist': 2 * (dif - self.dea),
+        }
+
+    @classmethod
+    def replay(
+        cls,
+        bars: Iterable[Tuple[date, Optional[float]]]
+    ) -> Tuple['IndicatorState', Dict[date, Dict[str, Optional[float]]]]:
+        """
+        从头重放全部K线（按日期升序），用于首次物化或历史修订后重建
+
+        Returns:
+            Tuple[最终状态, 日期 -> 指标值]
+        """
+        state = cls()
+        values = {bar_date: state.step(bar_date, close) for bar_date, close in bars}
+        return state, values
+
+    def dumps_closes(self) -> str:
+        """最近收盘价窗口序列化（JSON）"""
+        return json.dumps(list(self.closes))
+
+    @staticmethod
+    def loads_closes(text: Optional[str]) -> Deque[float]:
+        return deque(json.loads(text) if text else [], maxlen=MA_LONG_WINDOW)
+
+
+if __name__ == "__main__":
+    import pandas as pd
+
+    rng = np.random.default_rng(0)
+    closes = 10 + np.cumsum(rng.normal(0, 0.1, 250))
+    bars = list(zip(pd.bdate_range('2024-01-01', periods=len(closes)).date, closes))
+
+    # 前 200 根重放，后 50 根逐根追加，结果应与整体重放一致
+    state, _ = IndicatorState.replay(bars[:200])
+    incremental = [state.step(d, c) for d, c in bars[200:]]
+    _, full = IndicatorState.replay(bars)
+    assert incremental == [full[d] for d, _ in bars[200:]]
+
+    dif = pd.Series(closes).ewm(span=12, adjust=False).mean() - pd.Series(closes).ewm(span=26, adjust=False).mean()
+    print(f"DIF 与 pandas ewm 最大误差: {np.abs(dif.iloc[-1] - incremental[-1]['macd_dif']):.2e}")
+    print(incremental[-1])
@@ -31,19 +31,25 @@ if os.getenv("GITHUB_ACTIONS") != "true":
     pass
 
 import argparse
+import asyncio
 import logging
 import sys
 import time
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
 from logging.handlers import RotatingFileHandler
 from pathlib import Path
 from typing import List, Dict, Any, Optional, Tuple
 
 from config import get_config, Config
-from storage import get_db, DatabaseManager
-from data_provider import DataFetcherManager
+from storage import get_db, DatabaseManager, UpsertResult
+from data_provider import DataFetcherManager, SyntheticFetcher
+from data_provider.base import INDICATOR_WARMUP_BARS
+from indicators import MA_LONG_WINDOW
+from data_provider.trade_calendar import data_ready_at, get_data_ready_time, get_trade_calendar
 from data_provider.akshare_fetcher import AkshareFetcher, RealtimeQuote, ChipDistribution
+from minute_store import get_minute_store, summarize_intraday
+from archive import get_daily_archive
 from analyzer import GeminiAnalyzer, AnalysisResult, STOCK_NAME_MAP
 from notification import NotificationService, send_daily_report
 from search_service import SearchService, SearchResponse
@@ -130,6 +136,13 @@ class StockAnalysisPipeline:
     3. 实现并发控制和异常处理
     """
     
+    # 数据库无数据时的全量获取天数（交易日）：MA60 需要 60 根K线，
+    # EMA/MACD 的递推再留出同样长度收敛，首次获取后物化指标即可用
+    FULL_FETCH_DAYS = 2 * MA_LONG_WINDOW
+    
+    # 批量获取最多回溯的自然日数
+    BULK_MAX_LOOKBACK_DAYS = 60
+    
     def __init__(
         self,
         config: Optional[Config] = None,
@@ -147,8 +160,25 @@ class StockAnalysisPipeline:
         
         # 初始化各模块
         self.db = get_db()
-        self.fetcher_manager = DataFetcherManager()
-        self.akshare_fetcher = AkshareFetcher()  # 用于获取增强数据（量比、筹码等）
+        # 用于获取增强数据（量比、筹码等）
+        self.akshare_fetcher = AkshareFetcher()
+        fetchers = None
+        if self.config.data_synthetic:
+            # 合成数据源同时替换日线与实时行情/筹码路径，整个流水线不访问网络
+            self.akshare_fetcher = SyntheticFetcher(
+                seed=self.config.synthetic_seed,
+                latency=self.config.synthetic_latency,
+                failure_rate=self.config.synthetic_failure_rate,
+            )
+            fetchers = [self.akshare_fetcher]
+            logger.warning("已启用合成数据源（DATA_SYNTHETIC），行情数据为模拟数据")
+        self.fetcher_manager = DataFetcherManager(
+            fetchers=fetchers,
+            hedge_enabled=self.config.data_hedge_enabled,
+            hedge_percentile=self.config.data_hedge_percentile,
+            hedge_default_delay=self.config.data_hedge_default_delay,
+            hedge_workers=self.max_workers * 2,
+        )
         self.trend_analyzer = StockTrendAnalyzer()  # 趋势分析器
         self.analyzer = GeminiAnalyzer()
         self.notifier = NotificationService()
@@ -169,41 +199,50 @@ class StockAnalysisPipeline:
     def fetch_and_save_stock_data(
         self, 
         code: str,
-        force_refresh: bool = False
+        force_refresh: bool = False,
+        plans: Optional[Dict[str, Optional[Dict[str, Any]]]] = None
     ) -> Tuple[bool, Optional[str]]:
         """
         获取并保存单只股票数据
         
         断点续传逻辑：
-        1. 检查数据库是否已有今日数据
+        1. 检查数据库是否已有最近一个交易日的数据
         2. 如果有且不强制刷新，则跳过网络请求
-        3. 否则从数据源获取并保存
+        3. 否则只获取缺失的部分并保存（见 plan_fetch）
         
         Args:
             code: 股票代码
             force_refresh: 是否强制刷新（忽略本地缓存）
+            plans: 预先批量规划的获取范围（plan_fetch_many），包含该代码时不再查询数据库
             
         Returns:
             Tuple[是否成功, 错误信息]
         """
         try:
-            today = date.today()
+            if plans is not None and code in plans:
+                plan = plans[code]
+            else:
+                plan = self.plan_fetch(code, force_refresh=force_refresh)
             
             # 断点续传检查：如果今日数据已存在，跳过
-            if not force_refresh and self.db.has_today_data(code, today):
-                logger.info(f"[{code}] 今日数据已存在，跳过获取（断点续传）")
+            if plan is None:
+                logger.info(f"[{code}] 最近交易日数据已存在，跳过获取（断点续传）")
                 return True, None
             
             # 从数据源获取数据
             logger.info(f"[{code}] 开始从数据源获取数据...")
-            df, source_name = self.fetcher_manager.get_daily_data(code, days=30)
+            df, source_name = self.fetcher_manager.get_daily_data(code, **plan)
             
-            if df is None or df.empty:
+            if df is None:
                 return False, "获取数据为空"
+            if df.empty:
+                # 增量区间内没有新K线（收盘前/数据源尚未发布、停牌），已是最新
+                logger.info(f"[{code}] 数据源暂无新K线，视为已是最新（来源: {source_name}）")
+                return True, None
             
             # 保存到数据库
-            saved_count = self.db.save_daily_data(df, code, source_name)
-            logger.info(f"[{code}] 数据保存成功（来源: {source_name}，新增 {saved_count} 条）")
+            saved = self.db.save_daily_data(df, code, source_name)
+            logger.info(f"[{code}] 数据保存成功（来源: {source_name}，{saved}）")
             
             return True, None
             
@@ -212,6 +251,273 @@ class StockAnalysisPipeline:
             logger.error(f"[{code}] {error_msg}")
             return False, error_msg
     
+    def plan_fetch(
+        self, 
+        code: str,
+        force_refresh: bool = False
+    ) -> Optional[Dict[str, Any]]:
+        """
+        规划本次需要获取的数据范围
+        
+        增量策略：
+        1. 数据库无数据或强制刷新：全量获取最近 FULL_FETCH_DAYS 天
+        2. 已有最近一个已收盘交易日的完整数据：返回 None，跳过网络请求
+           （交易日 MARKET_DATA_READY_TIME 之前运行时以前一个交易日为准）
+        3. 其他情况：只获取最新存储日期之后缺失的部分，
+           并附带已存储的尾部K线用于连续计算技术指标；
+           最新K线是盘中写入的（updated_at 早于该日日线就绪时间）时，从该日起重新获取
+        
+        请求区间均截止到最近一个已收盘交易日，不写入当天盘中的不完整K线
+        
+        Args:
+            code: 股票代码
+            force_refresh: 是否强制刷新
+            
+        Returns:
+            DataFetcherManager.get_daily_data 的参数字典，无需获取时返回 None
+        """
+        return self.plan_fetch_many([code], force_refresh=force_refresh)[code]
+    
+    def plan_fetch_many(
+        self,
+        stock_codes: List[str],
+        force_refresh: bool = False
+    ) -> Dict[str, Optional[Dict[str, Any]]]:
+        """
+        批量规划多只股票的获取范围（策略同 plan_fetch）
+        
+        最新日期与增量所需的尾部K线各用一组批量查询取得，
+        不随股票数量逐只查询数据库
+        
+        Returns:
+            股票代码 -> get_daily_data 的参数字典（无需获取时为 None）
+        """
+        if force_refresh:
+            latest_bars = {code: None for code in stock_codes}
+        else:
+            latest_bars = self.db.get_latest_bars(stock_codes)
+        
+        # 以最近一个已收盘、日线已发布的交易日为准（周末/节假日、交易日收盘前均不请求当天），
+        # 请求区间也只到该日为止，不写入盘中的不完整K线
+        last_trade_date = get_trade_calendar().last_completed_trading_day()
+        end_date = last_trade_date.strftime('%Y-%m-%d')
+        ready_time = get_data_ready_time()
+        
+        # 每只股票从哪天开始续传：最新K线在其日线就绪前写入（盘中数据）时从该日重新获取，
+        # 否则从次日开始；当天尚未收盘的盘中K线等收盘后再修正
+        starts = {}
+        for code, latest in latest_bars.items():
+            if latest is None:
+                continue
+            latest_date, updated_at = latest
+            complete = updated_at is not None and updated_at >= data_ready_at(latest_date, ready_time)
+            if latest_date > last_trade_date or (complete and latest_date == last_trade_date):
+                starts[code] = None
+            else:
+                starts[code] = latest_date if not complete else latest_date + timedelta(days=1)
+        
+        stale = [code for code, start in starts.items() if start is not None]
+        histories = self.db.get_recent_frames(stale, INDICATOR_WARMUP_BARS) if stale else {}
+        
+        plans = {}
+        for code in latest_bars:
+            if code not in starts:
+                plans[code] = {'days': self.FULL_FETCH_DAYS, 'end_date': end_date}
+            elif starts[code] is None:
+                plans[code] = None
+            else:
+                start_date = starts[code]
+                logger.info(f"[{code}] 已有数据至 {latest_bars[code][0]}，增量获取 {start_date} ~ {last_trade_date}")
+                history = histories.get(code)
+                if history is not None and start_date <= latest_bars[code][0]:
+                    # 重新获取的K线不作为预热数据，由本次返回的数据覆盖
+                    history = history[history['date'] < start_date].reset_index(drop=True)
+                    history = history if not history.empty else None
+                plans[code] = {
+                    'start_date': start_date.strftime('%Y-%m-%d'),
+                    'end_date': end_date,
+                    'history': history,
+                }
+        return plans
+    
+    def bulk_fetch_and_save(
+        self,
+        stock_codes: List[str],
+        keep_all: bool = False
+    ) -> int:
+        """
+        批量获取并保存日线数据（Tushare 按交易日拉取全市场）
+        
+        每个缺失的交易日只调用一次 API，与自选股数量无关。
+        批量写入后，逐只处理时 plan_fetch 会发现数据已是最新而跳过网络请求。
+        
+        Args:
+            stock_codes: 自选股列表
+            keep_all: 是否保留全市场数据（否则只保存自选股）
+            
+        Returns:
+            新增的记录数
+        """
+        from data_provider.tushare_fetcher import TushareFetcher
+        
+        tushare = self.fetcher_manager.get_fetcher(TushareFetcher.name)
+        if tushare is None or not tushare.is_available:
+            logger.info("Tushare 不可用，跳过批量获取")
+            return 0
+        
+        try:
+            today = date.today()
+            latest_dates = self.db.get_latest_dates(stock_codes)
+            
+            # 从自选股中最早缺失的日期开始拉取，但最多回溯 BULK_MAX_LOOKBACK_DAYS 天：
+            # 长期停牌/未更新的股票不参与计算（否则全市场要逐日回溯到很久以前），
+            # 尚无数据的股票需要 FULL_FETCH_DAYS 根K线预热指标，同样留给逐只获取补齐
+            floor = today - timedelta(days=self.BULK_MAX_LOOKBACK_DAYS)
+            starts = [
+                latest + timedelta(days=1)
+                for latest in latest_dates.values()
+                if latest is not None and latest >= floor
+            ]
+            if not starts:
+                logger.info("自选股均无可续传的近期数据，跳过批量获取，由逐只获取补齐")
+                return 0
+            start_date = min(starts)
+            
+            # 只拉取到最近一个已收盘交易日（盘中的不完整K线不写入）
+            end_date = get_trade_calendar().last_completed_trading_day()
+            if start_date > end_date:
+                logger.info("自选股数据均已是最新，跳过批量获取")
+                return 0
+            
+            # 按实际返回的代码（全市场模式下不止自选股）加载预热K线，指标连续计算，
+            # 且只返回各股票已存储日期之后的K线
+            histories = {}
+            
+            def load_histories(codes: List[str]) -> Dict[str, Any]:
+                histories.update(self.db.get_recent_frames(codes, INDICATOR_WARMUP_BARS))
+                return histories
+            
+            frames = tushare.get_daily_data_bulk(
+                start_date=start_date.strftime('%Y-%m-%d'),
+                end_date=end_date.strftime('%Y-%m-%d'),
+                codes=None if keep_all else stock_codes,
+                history_loader=load_histories,
+            )
+            
+            # 已存储数据与本次起始日之间有缺口的股票不在此保存（否则缺口之后的数据
+            # 会让 plan_fetch 误判为已是最新），由逐只获取从其最新日期续传
+            gap_before = get_trade_calendar().previous_trading_day(start_date)
+            for code, history in histories.items():
+                if code in frames and history['date'].iloc[-1] < gap_before:
+                    del frames[code]
+            for code, latest in latest_dates.items():
+                if latest is None:
+                    frames.pop(code, None)
+            
+            saved = self.db.save_daily_data_many(frames, tushare.name)
+            logger.info(f"批量获取完成: {len(frames)} 只股票，{saved}")
+            return saved.inserted
+            
+        except Exception as e:
+            logger.error(f"批量获取失败，将逐只获取: {e}")
+            return 0
+    
+    def fetch_all_async(self, stock_codes: List[str]) -> Tuple[int, Dict[str, str]]:
+        """
+        异步并发获取所有股票的日线数据并保存
+        
+        各数据源按自身的并发上限和流控并行工作，不同股票可同时在不同数据源上在途；
+        之后逐只处理时 plan_fetch 会发现数据已是最新而跳过网络请求
+        
+        Args:
+            stock_codes: 股票代码列表
+            
+        Returns:
+            Tuple[新增的记录数, 所有数据源均失败的股票 {代码: 错误信息}]
+        """
+        plans = {
+            code: plan for code, plan in self.plan_fetch_many(stock_codes).items()
+            if plan is not None
+        }
+        
+        if not plans:
+            logger.info("自选股数据均已是最新，跳过异步获取")
+            return 0, {}
+        
+        logger.info(f"异步获取 {len(plans)} 只股票的日线数据...")
+        with self.fetcher_manager.batch_session():
+            results, errors = asyncio.run(self.fetcher_manager.aget_many(list(plans), plans=plans))
+        
+        saved = UpsertResult()
+        for code, (df, source_name) in results.items():
+            if df.empty:
+                continue
+            try:
+                saved += self.db.save_daily_data(df, code, source_name)
+            except Exception as e:
+                logger.error(f"[{code}] 保存数据失败: {e}")
+        
+        logger.info(f"异步获取完成: 成功 {len(results)} 只，失败 {len(errors)} 只，{saved}")
+        return saved.inserted, errors
+    
+    def get_chip_distribution(self, code: str) -> Optional[ChipDistribution]:
+        """
+        获取最新筹码分布（数据库优先，每个交易日最多请求一次）
+        
+        刷新条件（任一满足即请求 ak.stock_cyq_em 并保存完整历史）：
+        1. 数据库中没有该股票的筹码数据
+        2. 最新筹码日期早于最新日线日期，且今天尚未刷新过
+        
+        Args:
+            code: 股票代码
+            
+        Returns:
+            ChipDistribution 或 None（ETF 或获取失败）
+        """
+        if self.akshare_fetcher.is_etf(code):
+            return None
+        
+        chip_date, refreshed_at = self.db.get_chip_state(code)
+        latest_trade_date = self.db.get_latest_date(code)
+        
+        stale = chip_date is None or (
+            latest_trade_date is not None
+            and chip_date < latest_trade_date
+            and (refreshed_at is None or refreshed_at.date() < date.today())
+        )
+        if stale:
+            history = self.akshare_fetcher.get_chip_history(code)
+            if history is not None and not history.empty:
+                self.db.save_chip_history(code, history, data_source=self.akshare_fetcher.name)
+        else:
+            logger.debug(f"[{code}] 筹码分布已是最新 ({chip_date})，使用数据库缓存")
+        
+        record = self.db.get_latest_chip(code)
+        if record is None:
+            return None
+        return ChipDistribution(**{k: (0.0 if v is None else v) for k, v in record.items()})
+    
+    def get_intraday_summary(self, code: str) -> Optional[Dict[str, Any]]:
+        """
+        最近一个已收盘交易日的日内结构摘要（开盘区间、VWAP、早盘/尾盘成交量占比）
+        
+        分钟线按交易日存储在 MinuteBarStore 中：
+        该交易日没有完整数据（收盘前获取过或从未获取）时才请求数据源，
+        对比用的历史交易日直接从本地读取
+        """
+        store = get_minute_store()
+        calendar = get_trade_calendar()
+        trade_day = calendar.last_completed_trading_day()
+        
+        if not store.is_complete(code, trade_day):
+            day_str = trade_day.strftime('%Y-%m-%d')
+            df, source_name = self.fetcher_manager.get_minute_data(code, day_str, day_str)
+            store.save(code, df)
+            logger.info(f"[{code}] 分钟线已保存（来源: {source_name}，{len(df)} 根）")
+        
+        start = calendar.shift(trade_day, self.config.minute_history_days)
+        return summarize_intraday(store.read(code, start, trade_day))
+    
     def analyze_stock(self, code: str) -> Optional[AnalysisResult]:
         """
         分析单只股票（增强版：含量比、换手率、筹码分析、多维度情报）
@@ -219,10 +525,11 @@ class StockAnalysisPipeline:
         流程：
         1. 获取实时行情（量比、换手率）
         2. 获取筹码分布
-        3. 进行趋势分析（基于交易理念）
-        4. 多维度情报搜索（最新消息+风险排查+业绩预期）
-        5. 从数据库获取分析上下文
-        6. 调用 AI 进行综合分析
+        3. 加载分析窗口（一次查询）并进行趋势分析（基于交易理念）
+        4. 由分析窗口组装分析上下文
+        5. 开启复用时，输入指纹（不含实时行情的上下文 + 模型 + 提示词版本）与当天已保存结果一致时直接复用
+        6. 否则进行多维度情报搜索（最新消息+风险排查+业绩预期）
+        7. 调用 AI 进行综合分析并保存结果
         
         Args:
             code: 股票代码
@@ -254,30 +561,61 @@ class StockAnalysisPipeline:
             # Step 2: 获取筹码分布
             chip_data: Optional[ChipDistribution] = None
             try:
-                chip_data = self.akshare_fetcher.get_chip_distribution(code)
+                chip_data = self.get_chip_distribution(code)
                 if chip_data:
                     logger.info(f"[{code}] 筹码分布: 获利比例={chip_data.profit_ratio:.1%}, "
                               f"90%集中度={chip_data.concentration_90:.2%}")
             except Exception as e:
                 logger.warning(f"[{code}] 获取筹码分布失败: {e}")
             
+            # Step 2.5: 日内结构（分钟线，可选）
+            intraday: Optional[Dict[str, Any]] = None
+            if self.config.minute_bars_enabled:
+                try:
+                    intraday = self.get_intraday_summary(code)
+                except Exception as e:
+                    logger.warning(f"[{code}] 获取分钟线失败: {e}")
+            
             # Step 3: 趋势分析（基于交易理念）
+            # 一次查询加载分析窗口，趋势分析与 Step 4 的上下文共用
+            window = self.db.get_analysis_window(code)
             trend_result: Optional[TrendAnalysisResult] = None
             try:
-                # 获取历史数据进行趋势分析
-                context = self.db.get_analysis_context(code)
-                if context and 'raw_data' in context:
-                    import pandas as pd
-                    raw_data = context['raw_data']
-                    if isinstance(raw_data, list) and len(raw_data) > 0:
-                        df = pd.DataFrame(raw_data)
-                        trend_result = self.trend_analyzer.analyze(df, code)
-                        logger.info(f"[{code}] 趋势分析: {trend_result.trend_status.value}, "
-                                  f"买入信号={trend_result.buy_signal.value}, 评分={trend_result.signal_score}")
+                if not window.empty:
+                    trend_result = self.trend_analyzer.analyze(window, code)
+                    logger.info(f"[{code}] 趋势分析: {trend_result.trend_status.value}, "
+                              f"买入信号={trend_result.buy_signal.value}, 评分={trend_result.signal_score}")
             except Exception as e:
                 logger.warning(f"[{code}] 趋势分析失败: {e}")
             
-            # Step 4: 多维度情报搜索（最新消息+风险排查+业绩预期）
+            # Step 4: 获取分析上下文（技术面数据，复用 Step 3 的分析窗口）
+            context = self.db.get_analysis_context(code, window=window)
+            
+            if context is None:
+                logger.warning(f"[{code}] 无法获取分析上下文，跳过分析")
+                return None
+            
+            # Step 5: 增强上下文数据（添加实时行情、筹码、趋势分析结果、股票名称）
+            enhanced_context = self._enhance_context(
+                context, 
+                realtime_quote, 
+                chip_data, 
+                trend_result,
+                stock_name,  # 传入股票名称
+                intraday
+            )
+            
+            # Step 6: 输入未变化时复用当天已保存的分析结果（在情报搜索之前判断，命中时不调用搜索 API；
+            # 指纹不含新闻与实时行情，见 GeminiAnalyzer.fingerprint）
+            fingerprint = self.analyzer.fingerprint(enhanced_context)
+            if self.config.analysis_reuse_enabled:
+                today_start = datetime.combine(date.today(), datetime.min.time())
+                stored = self.db.get_analysis_result(code, fingerprint, since=today_start)
+                if stored:
+                    logger.info(f"[{code}] 分析输入未变化，复用已保存的分析结果")
+                    return AnalysisResult.from_dict(stored)
+            
+            # Step 7: 多维度情报搜索（最新消息+风险排查+业绩预期）
             news_context = None
             if self.search_service.is_available:
                 logger.info(f"[{code}] 开始多维度情报搜索...")
@@ -300,25 +638,23 @@ class StockAnalysisPipeline:
             else:
                 logger.info(f"[{code}] 搜索服务不可用，跳过情报搜索")
             
-            # Step 5: 获取分析上下文（技术面数据）
-            context = self.db.get_analysis_context(code)
-            
-            if context is None:
-                logger.warning(f"[{code}] 无法获取分析上下文，跳过分析")
-                return None
-            
-            # Step 6: 增强上下文数据（添加实时行情、筹码、趋势分析结果、股票名称）
-            enhanced_context = self._enhance_context(
-                context, 
-                realtime_quote, 
-                chip_data, 
-                trend_result,
-                stock_name  # 传入股票名称
-            )
-            
-            # Step 7: 调用 AI 分析（传入增强的上下文和新闻）
+            # Step 8: 调用 AI 分析（传入增强的上下文和新闻）
             result = self.analyzer.analyze(enhanced_context, news_context=news_context)
             
+            # 只保存成功的结果，失败的分析下次重跑时重新请求
+            if result.success:
+                try:
+                    self.db.save_analysis_result(
+                        code,
+                        date.fromisoformat(context['date']),
+                        fingerprint,
+                        result.to_dict(),
+                        model_name=self.analyzer.model_name,
+                        prompt_version=self.analyzer.PROMPT_VERSION,
+                    )
+                except Exception as e:
+                    logger.warning(f"[{code}] 保存分析结果失败: {e}")
+            
             return result
             
         except Exception as e:
@@ -332,7 +668,8 @@ class StockAnalysisPipeline:
         realtime_quote: Optional[RealtimeQuote],
         chip_data: Optional[ChipDistribution],
         trend_result: Optional[TrendAnalysisResult],
-        stock_name: str = ""
+        stock_name: str = "",
+        intraday: Optional[Dict[str, Any]] = None
     ) -> Dict[str, Any]:
         """
         增强分析上下文
@@ -345,6 +682,7 @@ class StockAnalysisPipeline:
             chip_data: 筹码分布数据
             trend_result: 趋势分析结果
             stock_name: 股票名称
+            intraday: 日内结构摘要（见 summarize_intraday）
             
         Returns:
             增强后的上下文
@@ -383,6 +721,10 @@ class StockAnalysisPipeline:
                 'chip_status': chip_data.get_chip_status(current_price),
             }
         
+        # 添加日内结构
+        if intraday:
+            enhanced['intraday'] = intraday
+        
         # 添加趋势分析结果
         if trend_result:
             enhanced['trend_analysis'] = {
@@ -423,7 +765,9 @@ class StockAnalysisPipeline:
     def process_single_stock(
         self, 
         code: str,
-        skip_analysis: bool = False
+        skip_analysis: bool = False,
+        plans: Optional[Dict[str, Optional[Dict[str, Any]]]] = None,
+        fetch_errors: Optional[Dict[str, str]] = None
     ) -> Optional[AnalysisResult]:
         """
         处理单只股票的完整流程
@@ -438,6 +782,8 @@ class StockAnalysisPipeline:
         Args:
             code: 股票代码
             skip_analysis: 是否跳过 AI 分析
+            plans: 预先批量规划的获取范围（见 fetch_and_save_stock_data）
+            fetch_errors: 本轮已在所有数据源获取失败的股票（异步模式），不再重复请求
             
         Returns:
             AnalysisResult 或 None
@@ -445,8 +791,11 @@ class StockAnalysisPipeline:
         logger.info(f"========== 开始处理 {code} ==========")
         
         try:
-            # Step 1: 获取并保存数据
-            success, error = self.fetch_and_save_stock_data(code)
+            # Step 1: 获取并保存数据（异步获取已在所有数据源失败的不再逐只重试）
+            if fetch_errors and code in fetch_errors:
+                success, error = False, fetch_errors[code]
+            else:
+                success, error = self.fetch_and_save_stock_data(code, plans=plans)
             
             if not success:
                 logger.warning(f"[{code}] 数据获取失败: {error}")
@@ -511,15 +860,31 @@ class StockAnalysisPipeline:
         
         results: List[AnalysisResult] = []
         
+        # Tushare 批量模式：先按交易日一次性拉取全市场，逐只处理时即可跳过网络请求
+        if self.config.tushare_bulk_eod:
+            self.bulk_fetch_and_save(stock_codes, keep_all=self.config.tushare_bulk_keep_all)
+        
+        # 异步模式：先并发获取所有缺失数据，线程池只负责分析
+        fetch_errors: Dict[str, str] = {}
+        if self.config.data_async_fetch:
+            _, fetch_errors = self.fetch_all_async(stock_codes)
+        
+        # 一组批量查询规划全部股票的获取范围，线程池内不再逐只查询最新日期
+        plans = self.plan_fetch_many(stock_codes)
+        
         # 使用线程池并发处理
         # 注意：max_workers 设置较低（默认3）以避免触发反爬
-        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+        # batch_session：整个批次共享数据源会话（如 Baostock 只登录一次）
+        with self.fetcher_manager.batch_session(), \
+                ThreadPoolExecutor(max_workers=self.max_workers) as executor:
             # 提交任务
             future_to_code = {
                 executor.submit(
                     self.process_single_stock, 
                     code, 
-                    skip_analysis=dry_run
+                    skip_analysis=dry_run,
+                    plans=plans,
+                    fetch_errors=fetch_errors
                 ): code
                 for code in stock_codes
             }
@@ -539,8 +904,9 @@ class StockAnalysisPipeline:
         
         # dry-run 模式下，数据获取成功即视为成功
         if dry_run:
-            # 检查哪些股票的数据今天已存在
-            success_count = sum(1 for code in stock_codes if self.db.has_today_data(code))
+            # 检查哪些股票已有最近一个已完成交易日的数据
+            last_trade_date = get_trade_calendar().last_completed_trading_day()
+            success_count = sum(self.db.has_data_for_date_many(stock_codes, last_trade_date).values())
             fail_count = len(stock_codes) - success_count
         else:
             success_count = len(results)
@@ -548,6 +914,11 @@ class StockAnalysisPipeline:
         
         logger.info(f"===== 分析完成 =====")
         logger.info(f"成功: {success_count}, 失败: {fail_count}, 耗时: {elapsed_time:.2f} 秒")
+        self.fetcher_manager.log_health()
+        
+        # 日线归档：增量同步本次新增/更新的数据
+        if self.config.archive_enabled:
+            self.sync_archive()
         
         # 发送通知
         if results and send_notification and not dry_run:
@@ -555,6 +926,19 @@ class StockAnalysisPipeline:
         
         return results
     
+    def sync_archive(self) -> int:
+        """
+        将数据库中新增/更新的日线增量同步到归档（失败不影响主流程）
+        
+        Returns:
+            导出的行数
+        """
+        try:
+            return get_daily_archive().sync(self.db)
+        except Exception as e:
+            logger.error(f"日线归档同步失败: {e}")
+            return 0
+    
     def _send_notifications(self, results: List[AnalysisResult]) -> None:
         """
         发送分析结果通知
@@ -814,7 +1198,8 @@ def main() -> int:
             run_with_schedule(
                 task=scheduled_task,
                 schedule_time=config.schedule_time,
-                run_immediately=True  # 启动时先执行一次
+                run_immediately=True,  # 启动时先执行一次
+                trading_days_only=config.schedule_trading_days_only
             )
             return 0
         
@@ -16,9 +16,11 @@ from datetime import datetime
 from typing import Optional, Dict, Any, List
 
 import akshare as ak
+import numpy as np
 import pandas as pd
 
 from config import get_config
+from data_provider.akshare_fetcher import get_spot_snapshot
 from search_service import SearchService
 
 logger = logging.getLogger(__name__)
@@ -182,27 +184,22 @@ class MarketAnalyzer:
         try:
             logger.info("[大盘] 获取市场涨跌统计...")
             
-            # 获取全部A股实时行情
-            df = ak.stock_zh_a_spot_em()
+            # 获取全部A股实时行情（与个股分析共享进程级快照缓存）
+            snapshot = get_spot_snapshot('stock')
             
-            if df is not None and not df.empty:
-                # 涨跌统计
-                change_col = '涨跌幅'
-                if change_col in df.columns:
-                    df[change_col] = pd.to_numeric(df[change_col], errors='coerce')
-                    overview.up_count = len(df[df[change_col] > 0])
-                    overview.down_count = len(df[df[change_col] < 0])
-                    overview.flat_count = len(df[df[change_col] == 0])
-                    
-                    # 涨停跌停统计（涨跌幅 >= 9.9% 或 <= -9.9%）
-                    overview.limit_up_count = len(df[df[change_col] >= 9.9])
-                    overview.limit_down_count = len(df[df[change_col] <= -9.9])
+            if len(snapshot) > 0:
+                # 涨跌统计（NaN 参与比较时为 False，不计入任何一类）
+                change = snapshot.column('change_pct')
+                overview.up_count = int(np.count_nonzero(change > 0))
+                overview.down_count = int(np.count_nonzero(change < 0))
+                overview.flat_count = int(np.count_nonzero(change == 0))
+                
+                # 涨停跌停统计（涨跌幅 >= 9.9% 或 <= -9.9%）
+                overview.limit_up_count = int(np.count_nonzero(change >= 9.9))
+                overview.limit_down_count = int(np.count_nonzero(change <= -9.9))
                 
                 # 两市成交额
-                amount_col = '成交额'
-                if amount_col in df.columns:
-                    df[amount_col] = pd.to_numeric(df[amount_col], errors='coerce')
-                    overview.total_amount = df[amount_col].sum() / 1e8  # 转为亿元
+                overview.total_amount = float(np.nansum(snapshot.column('amount'))) / 1e8  # 转为亿元
                 
                 logger.info(f"[大盘] 涨:{overview.up_count} 跌:{overview.down_count} 平:{overview.flat_count} "
                           f"涨停:{overview.limit_up_count} 跌停:{overview.limit_down_count} "
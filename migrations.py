@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+"""
+===================================
+A股自选股智能分析系统 - 数据库结构迁移
+===================================
+
+问题：
+- create_all 只创建不存在的表，模型新增的列、索引以及表结构的调整不会作用到已有数据库
+- stock_daily v1 使用自增 id 主键 + (code, date) 唯一约束 + ix_code_date + code、date 单列索引：
+  每次写入要维护 5 棵 B 树（rowid 表本身 + 4 个索引），
+  按代码读取区间时先查索引、再按 rowid 回表
+
+方案：
+1. 用 SQLite 的 PRAGMA user_version 记录结构版本，启动时按版本号依次执行未完成的迁移，
+   每个迁移与版本号更新在同一个事务内提交（SQLite 的 DDL 支持事务，失败整体回滚）
+2. 每次启动先补齐模型中新增的可空列与索引（与版本无关的增量变更）
+3. v2：stock_daily 重建为 WITHOUT ROWID 表，以 (code, date) 为聚簇主键：
+   行按代码、日期顺序存放在主键 B 树中，区间读取顺序扫描即可；
+   删除冗余的唯一约束与索引，只保留 updated_at 索引（归档增量导出走该索引，不按代码、日期读取）；
+   benchmark.py schema（300 只 × 770 根，4 次运行）：回填约快一倍，120 根窗口读取与库内一年区间扫描更快；
+   取回整行的一年区间读取以构造 Python 元组为主，v1 1020~1059 次/s、v2 977~1294 次/s，
+   两种结构之间没有稳定的差别
+4. 新建的数据库由 create_all 直接按最新结构创建，迁移检测到结构已是最新时只更新版本号
+
+用法：
+    python migrations.py                    # 查看并执行待迁移（默认 DATABASE_PATH）
+    python migrations.py --db ./data/x.db   # 指定数据库文件
+    python migrations.py --status           # 只查看版本，不执行
+"""
+
+import logging
+import time
+from typing import Callable, List, Tuple
+
+from sqlalchemy import MetaData, inspect, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.schema import CreateTable
+
+logger = logging.getLogger(__name__)
+
+
+# 当前结构版本（新增迁移时递增，并在 MIGRATIONS 末尾登记）
+SCHEMA_VERSION = 2
+
+
+def get_schema_version(conn: Connection) -> int:
+    """数据库记录的结构版本（未记录过的旧数据库为 0）"""
+    return conn.execute(text('PRAGMA user_version')).scalar() or 0
+
+
+def _set_schema_version(conn: Connection, version: int) -> None:
+    # PRAGMA 不支持绑定参数，version 为整数常量
+    conn.execute(text(f'PRAGMA user_version = {int(version)}'))
+
+
+def is_without_rowid(conn: Connection, table_name: str) -> bool:
+    """表是否为 WITHOUT ROWID 表"""
+    sql = conn.execute(
+        text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"),
+        {'name': table_name},
+    ).scalar()
+    return bool(sql) and 'WITHOUT ROWID' in sql.upper()
+
+
+def add_missing_columns(engine: Engine, metadata: MetaData) -> List[str]:
+    """
+    为已存在的表补齐模型中新增的列（ALTER TABLE ADD COLUMN，旧数据取 NULL）
+
+    Returns:
+        新增的列（table.column）
+    """
+    inspector = inspect(engine)
+    added = []
+    with engine.begin() as conn:
+        for table in metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+                added.append(f"{table.name}.{column.name}")
+                logger.info(f"数据库迁移: {table.name} 新增列 {column.name}")
+    return added
+
+
+def create_missing_indexes(engine: Engine, metadata: MetaData) -> None:
+    """补建模型中声明、数据库中还不存在的索引"""
+    for table in metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
+
+
+# === 版本迁移 ===
+
+def _v1_baseline(conn: Connection, metadata: MetaData) -> None:
+    """v1：初始结构（create_all 创建），无需操作"""
+
+
+def _v2_cluster_stock_daily(conn: Connection, metadata: MetaData) -> None:
+    """
+    v2：stock_daily 重建为 WITHOUT ROWID、(code, date) 聚簇主键
+
+    新表按模型定义创建，按主键顺序复制两表共有的列后替换旧表
+    （旧表的 id 列与 uix_code_date、ix_code_date、code/date 单列索引随旧表删除）
+    """
+    table = metadata.tables['stock_daily']
+    if is_without_rowid(conn, table.name):
+        return
+
+    existing = {row[1] for row in conn.execute(text(f'PRAGMA table_info({table.name})'))}
+    columns = ', '.join(column.name for column in table.columns if column.name in existing)
+    temp = table.to_metadata(MetaData(), name=f'{table.name}__v2')
+
+    start = time.perf_counter()
+    conn.execute(CreateTable(temp))
+    rows = conn.execute(text(
+        f'INSERT INTO {temp.name} ({columns}) '
+        f'SELECT {columns} FROM {table.name} ORDER BY code, date'
+    )).rowcount
+    conn.execute(text(f'DROP TABLE {table.name}'))
+    conn.execute(text(f'ALTER TABLE {temp.name} RENAME TO {table.name}'))
+    for index in table.indexes:
+        index.create(conn)
+    logger.info(f"数据库迁移: {table.name} 重建为聚簇主键表，{rows} 行，耗时 {time.perf_counter() - start:.2f}s")
+
+
+# 版本号 -> (说明, 迁移函数)，按版本号升序执行
+MIGRATIONS: List[Tuple[int, str, Callable[[Connection, MetaData], None]]] = [
+    (1, '初始结构', _v1_baseline),
+    (2, 'stock_daily 改为 WITHOUT ROWID、(code, date) 聚簇主键', _v2_cluster_stock_daily),
+]
+
+
+def pending_migrations(engine: Engine) -> List[Tuple[int, str]]:
+    """尚未执行的迁移（版本号, 说明）"""
+    with engine.connect() as conn:
+        current = get_schema_version(conn)
+    return [(version, desc) for version, desc, _ in MIGRATIONS if version > current]
+
+
+def migrate(engine: Engine, metadata: MetaData) -> int:
+    """
+    将数据库迁移到最新结构（仅 SQLite；其他数据库只补齐列与索引）
+
+    Args:
+        engine: 数据库引擎（表已由 create_all 创建）
+        metadata: 模型元数据
+
+    Returns:
+        迁移后的结构版本
+    """
+    add_missing_columns(engine, metadata)
+
+    current = SCHEMA_VERSION
+    if engine.dialect.name == 'sqlite':
+        with engine.connect() as conn:
+            current = get_schema_version(conn)
+        for version, desc, upgrade in MIGRATIONS:
+            if version <= current:
+                continue
+            with engine.begin() as conn:
+                # pysqlite 只在 DML 前隐式开启事务，显式 BEGIN 让 DDL 与版本号也在同一事务内
+                conn.exec_driver_sql('BEGIN IMMEDIATE')
+                upgrade(conn, metadata)
+                _set_schema_version(conn, version)
+            logger.info(f"数据库结构升级到 v{version}: {desc}")
+            current = version
+
+    create_missing_indexes(engine, metadata)
+    return current
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from sqlalchemy import create_engine
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+
+    parser = argparse.ArgumentParser(description='数据库结构迁移')
+    parser.add_argument('--db', help='SQLite 数据库文件（默认使用配置中的 DATABASE_PATH）')
+    parser.add_argument('--status', action='store_true', help='只查看版本，不执行迁移')
+    args = parser.parse_args()
+
+    if args.db:
+        db_engine = create_engine(f"sqlite:///{args.db}")
+    else:
+        from config import get_config
+        db_engine = create_engine(get_config().get_db_url())
+
+    with db_engine.connect() as connection:
+        print(f"当前结构版本: v{get_schema_version(connection)}（最新 v{SCHEMA_VERSION}）")
+    for number, description in pending_migrations(db_engine):
+        print(f"  待执行 v{number}: {description}")
+
+    if not args.status:
+        from storage import Base
+        Base.metadata.create_all(db_engine)
+        print(f"迁移完成: v{migrate(db_engine, Base.metadata)}")
@@ -0,0 +1,325 @@
+# -*- coding: utf-8 -*-
+"""
+===================================
+A股自选股智能分析系统 - 分钟线存储
+===================================
+
+问题：
+- 只有日线（StockDaily），无法分析开盘区间、日内成交量分布
+- 分钟线每只股票每天 240 根，按 ORM 一行一根存储，几个月后读写都极慢
+
+方案：
+1. 按 代码/年份/日期 分区，每个交易日一个 .npy 文件（定长记录数组）：
+   data/minute/600519/2024/20240102.npy
+2. 价格存 float32、成交量 int64、时间 datetime64[m]，每根 40 字节，
+   一只股票一天约 10KB
+3. 标准 .npy 格式，可直接 np.load(mmap_mode='r') 映射单日文件（open_day）；
+   区间读取只打开区间内的日文件，跳过头部解析后一次读入、零拷贝解释为记录数组
+4. 写入先写临时文件再原子替换；同一天重复写入（盘中多次获取）按时间合并去重
+"""
+
+import logging
+import os
+import threading
+from datetime import date, datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+# 分钟线记录格式（字段名与 DataFrame 列名一致）
+MINUTE_DTYPE = np.dtype([
+    ('time', 'datetime64[m]'),
+    ('open', np.float32),
+    ('high', np.float32),
+    ('low', np.float32),
+    ('close', np.float32),
+    ('volume', np.int64),
+    ('amount', np.float64),
+])
+
+MINUTE_COLUMNS = list(MINUTE_DTYPE.names)
+
+# 收盘时间（最后一根K线的结束时间，距当日 0 点的分钟数）
+MARKET_CLOSE_MINUTE = 15 * 60
+
+# 开盘区间 / 尾盘的分钟数
+OPENING_RANGE_MINUTES = 30
+CLOSING_MINUTES = 30
+
+
+def frame_to_records(df: pd.DataFrame) -> np.ndarray:
+    """标准化的分钟线 DataFrame（MINUTE_COLUMNS）转为按时间排序、去重的记录数组"""
+    records = np.empty(len(df), dtype=MINUTE_DTYPE)
+    records['time'] = pd.to_datetime(df['time']).to_numpy().astype('datetime64[m]')
+    for col in MINUTE_COLUMNS[1:]:
+        values = pd.to_numeric(df[col], errors='coerce').to_numpy(dtype=np.float64)
+        records[col] = np.nan_to_num(values, nan=0.0)
+    return _dedupe(records)
+
+
+def _dedupe(records: np.ndarray) -> np.ndarray:
+    """按时间排序，同一分钟保留最后一条"""
+    if len(records) == 0:
+        return records
+    order = np.argsort(records['time'], kind='stable')
+    records = records[order]
+    keep = np.ones(len(records), dtype=bool)
+    keep[:-1] = records['time'][1:] != records['time'][:-1]
+    return records[keep]
+
+
+def _load_records(path: Path) -> np.ndarray:
+    """
+    读取本模块写入的 .npy 日文件
+
+    文件的 dtype 固定为 MINUTE_DTYPE，跳过 np.load 对头部字典的解析
+    （结构化 dtype 的头部解析比读取 240 根数据本身还慢），直接按偏移解释数据区
+    """
+    with open(path, 'rb') as f:
+        raw = f.read()
+    # .npy 格式：6 字节魔数 + 2 字节版本 + 头部长度（v1: uint16，v2/v3: uint32）+ 头部
+    if raw[6] == 1:
+        offset = 10 + int.from_bytes(raw[8:10], 'little')
+    else:
+        offset = 12 + int.from_bytes(raw[8:12], 'little')
+    return np.frombuffer(raw, dtype=MINUTE_DTYPE, offset=offset)
+
+
+def records_to_frame(records: np.ndarray) -> pd.DataFrame:
+    """记录数组转为 DataFrame（time 列为 datetime64[ns]）"""
+    columns = {col: records[col] for col in MINUTE_COLUMNS}
+    columns['time'] = records['time'].astype('datetime64[ns]')
+    return pd.DataFrame(columns)
+
+
+class MinuteBarStore:
+    """
+    分钟线列式存储（线程安全）
+
+    Args:
+        root: 存储根目录
+    """
+
+    def __init__(self, root: str = './data/minute'):
+        self.root = Path(root)
+        self._lock = threading.Lock()
+
+    def _path(self, code: str, day: date) -> Path:
+        return self.root / code / f"{day.year:04d}" / f"{day:%Y%m%d}.npy"
+
+    def has_day(self, code: str, day: date) -> bool:
+        """是否已存储该交易日的分钟线"""
+        return self._path(code, day).exists()
+
+    def is_complete(self, code: str, day: date) -> bool:
+        """该交易日的分钟线是否已完整（最后一根K线到达收盘时间，盘中获取的不算）"""
+        records = self.open_day(code, day)
+        if records is None or len(records) == 0:
+            return False
+        closed = np.datetime64(day, 'D') + np.timedelta64(MARKET_CLOSE_MINUTE, 'm')
+        return records['time'][-1] >= closed
+
+    def days(self, code: str, start: Optional[date] = None, end: Optional[date] = None) -> List[date]:
+        """
+        已存储的交易日（升序）
+
+        只扫描区间覆盖的年份目录，不逐日探测文件
+        """
+        base = self.root / code
+        if not base.is_dir():
+            return []
+
+        result = []
+        for year_dir in os.scandir(base):
+            if not year_dir.is_dir() or not year_dir.name.isdigit():
+                continue
+            year = int(year_dir.name)
+            if (start and year < start.year) or (end and year > end.year):
+                continue
+            for entry in os.scandir(year_dir.path):
+                name = entry.name
+                if not name.endswith('.npy') or len(name) != 12:
+                    continue
+                day = date(int(name[:4]), int(name[4:6]), int(name[6:8]))
+                if (start and day < start) or (end and day > end):
+                    continue
+                result.append(day)
+        result.sort()
+        return result
+
+    def write_day(self, code: str, day: date, records: np.ndarray) -> int:
+        """
+        写入单个交易日的分钟线（与已存储的同日数据按时间合并）
+
+        Returns:
+            写入后该日的K线根数
+        """
+        path = self._path(code, day)
+        with self._lock:
+            if path.exists():
+                existing = _load_records(path)
+                records = _dedupe(np.concatenate([existing, records]))
+
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(f"{path.stem}.{threading.get_ident()}.tmp")
+            with open(tmp, 'wb') as f:
+                np.save(f, records, allow_pickle=False)
+            os.replace(tmp, path)
+        return len(records)
+
+    def save(self, code: str, df: pd.DataFrame) -> int:
+        """
+        保存分钟线 DataFrame（可跨多个交易日），按交易日拆分写入
+
+        Returns:
+            写入的交易日数
+        """
+        if df is None or df.empty:
+            return 0
+
+        records = frame_to_records(df)
+        days = records['time'].astype('datetime64[D]')
+        # 记录已按时间排序，相同日期连续排列
+        boundaries = np.flatnonzero(days[1:] != days[:-1]) + 1
+        written = 0
+        for chunk in np.split(records, boundaries):
+            day = chunk['time'][0].astype('datetime64[D]').item()
+            self.write_day(code, day, chunk)
+            written += 1
+
+        logger.debug(f"[分钟线] {code} 保存 {written} 个交易日，共 {len(records)} 根")
+        return written
+
+    def open_day(self, code: str, day: date) -> Optional[np.ndarray]:
+        """内存映射单个交易日的分钟线（只读，不存在时返回 None）"""
+        path = self._path(code, day)
+        if not path.exists():
+            return None
+        return np.load(path, mmap_mode='r')
+
+    def read(self, code: str, start: Optional[date] = None, end: Optional[date] = None) -> np.ndarray:
+        """读取区间内的分钟线记录数组（按时间升序，只读）"""
+        parts = [_load_records(self._path(code, day)) for day in self.days(code, start, end)]
+        if not parts:
+            return np.empty(0, dtype=MINUTE_DTYPE)
+        if len(parts) == 1:
+            return parts[0]
+        return np.concatenate(parts)
+
+    def read_frame(self, code: str, start: Optional[date] = None, end: Optional[date] = None) -> pd.DataFrame:
+        """读取区间内的分钟线（DataFrame）"""
+        return records_to_frame(self.read(code, start, end))
+
+    def read_many(
+        self,
+        codes: Iterable[str],
+        start: Optional[date] = None,
+        end: Optional[date] = None
+    ) -> Dict[str, np.ndarray]:
+        """批量读取多只股票的分钟线记录数组（无数据的代码不出现在结果中）"""
+        result = {}
+        for code in codes:
+            records = self.read(code, start, end)
+            if len(records):
+                result[code] = records
+        return result
+
+
+def summarize_intraday(records: np.ndarray) -> Optional[Dict[str, float]]:
+    """
+    日内结构摘要（最后一个交易日）
+
+    Args:
+        records: 分钟线记录（按时间升序，可含多个交易日；更早的交易日用于对比）
+
+    Returns:
+        开盘区间、VWAP、早盘/尾盘成交量占比、近期早盘成交量占比均值；无数据时返回 None
+    """
+    if records is None or len(records) == 0:
+        return None
+
+    days = records['time'].astype('datetime64[D]')
+    boundaries = np.flatnonzero(days[1:] != days[:-1]) + 1
+    sessions = np.split(records, boundaries)
+    bars = sessions[-1]
+
+    def opening_share(session: np.ndarray) -> float:
+        volume = session['volume'].astype(np.float64)
+        total = volume.sum()
+        return float(volume[:OPENING_RANGE_MINUTES].sum() / total) if total > 0 else 0.0
+
+    volume = bars['volume'].astype(np.float64)
+    total_volume = volume.sum()
+    opening = bars[:OPENING_RANGE_MINUTES]
+
+    summary = {
+        'date': str(days[-1]),
+        'bars': int(len(bars)),
+        'opening_range_high': round(float(opening['high'].max()), 2),
+        'opening_range_low': round(float(opening['low'].min()), 2),
+        # 成交量单位为手，成交额单位为元
+        'vwap': round(float(bars['amount'].sum() / total_volume / 100), 2) if total_volume > 0 else 0.0,
+        'opening_volume_share': round(opening_share(bars), 4),
+        'closing_volume_share': round(float(volume[-CLOSING_MINUTES:].sum() / total_volume), 4) if total_volume > 0 else 0.0,
+    }
+
+    # 与更早交易日的早盘成交量占比均值对比（放量/缩量开盘）
+    if len(sessions) > 1:
+        summary['avg_opening_volume_share'] = round(float(np.mean([opening_share(s) for s in sessions[:-1]])), 4)
+
+    return summary
+
+
+_minute_store: Optional[MinuteBarStore] = None
+_minute_store_lock = threading.Lock()
+
+
+def get_minute_store() -> MinuteBarStore:
+    """获取全局分钟线存储（按配置懒加载）"""
+    global _minute_store
+    if _minute_store is None:
+        with _minute_store_lock:
+            if _minute_store is None:
+                from config import get_config
+                _minute_store = MinuteBarStore(get_config().minute_data_dir)
+    return _minute_store
+
+
+def set_minute_store(store: Optional[MinuteBarStore]) -> None:
+    """替换全局分钟线存储（用于测试或基准测试时指定目录）"""
+    global _minute_store
+    with _minute_store_lock:
+        _minute_store = store
+
+
+if __name__ == "__main__":
+    import tempfile
+    import time
+
+    logging.basicConfig(level=logging.DEBUG)
+
+    store = MinuteBarStore(tempfile.mkdtemp(prefix='minute_'))
+    rng = np.random.default_rng(0)
+
+    # 60 个交易日 × 240 根
+    frames = []
+    for day in pd.bdate_range(end=datetime.now().date(), periods=60):
+        morning = pd.date_range(day + pd.Timedelta('09:31:00'), periods=120, freq='min')
+        afternoon = pd.date_range(day + pd.Timedelta('13:01:00'), periods=120, freq='min')
+        close = 10 + np.cumsum(rng.normal(0, 0.01, 240))
+        volume = rng.integers(100, 10000, 240)
+        frames.append(pd.DataFrame({
+            'time': morning.append(afternoon), 'open': close, 'high': close + 0.01,
+            'low': close - 0.01, 'close': close, 'volume': volume, 'amount': volume * close * 100,
+        }))
+    print(f"写入 {store.save('600519', pd.concat(frames))} 个交易日")
+
+    start = time.perf_counter()
+    records = store.read('600519')
+    print(f"读取 {len(records)} 根，耗时 {(time.perf_counter() - start) * 1000:.2f} ms")
+    print(summarize_intraday(records))
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+"""
+===================================
+A股自选股智能分析系统 - 日线序列（读取路径）
+===================================
+
+问题：
+- 读取日线时逐行构造 StockDaily ORM 对象（身份映射、属性插桩、to_dict 转换），
+  只为了拿到几个浮点数；构造 DataFrame 同样要为每列建立索引与块管理器
+- 趋势分析、上下文组装只需要按列访问最近几十根K线
+
+方案：
+1. PriceSeries：单只股票按日期升序的只读序列，__slots__ + 每列一个 numpy 数组
+   （date 为 datetime64[D]，数值列为 float64，缺失值为 NaN）
+2. 存储层用 DBAPI 游标直接执行编译好的 Core 查询，游标逐行流入定长记录数组
+   （np.fromiter + ROW_DTYPE），各列为记录数组字段的视图，不经过 ORM 与 Row 对象，
+   也不先 fetchall 出整批 Python 元组
+3. 需要 pandas 的调用方用 to_frame() 转换；已有的 DataFrame 用 from_frame() 包装
+"""
+
+from datetime import date
+from typing import Any, Dict, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+from indicators import INDICATOR_COLUMNS
+
+
+# 行情数值列（与 StockDaily 的字段对应）
+PRICE_COLUMNS = [
+    'open', 'high', 'low', 'close', 'volume', 'amount',
+    'pct_chg', 'ma5', 'ma10', 'ma20', 'volume_ratio',
+]
+
+SERIES_COLUMNS = PRICE_COLUMNS + INDICATOR_COLUMNS
+
+# 查询结果的行格式：date（SQLite 中为 ISO 字符串）+ 数值列（NULL 转为 NaN）+ data_source
+ROW_DTYPE = np.dtype(
+    [('date', 'U10')]
+    + [(col, np.float64) for col in SERIES_COLUMNS]
+    + [('data_source', object)]
+)
+
+
+class PriceSeries:
+    """
+    单只股票的日线序列（只读，按日期升序）
+
+    每列一个 numpy 数组，可按属性（series.close）或下标（series['close']）访问
+
+    Args:
+        code: 股票代码
+        dates: 交易日（datetime64[D]）
+        columns: 列名 -> 数组，缺失的列补为 NaN
+        data_source: 每根K线的数据来源（可选）
+    """
+
+    __slots__ = ('code', 'date', 'data_source') + tuple(SERIES_COLUMNS)
+
+    def __init__(
+        self,
+        code: str,
+        dates: np.ndarray,
+        columns: Optional[Dict[str, np.ndarray]] = None,
+        data_source: Optional[np.ndarray] = None
+    ):
+        self.code = code
+        self.date = np.asarray(dates, dtype='datetime64[D]')
+        columns = columns or {}
+        for col in SERIES_COLUMNS:
+            values = columns.get(col)
+            if values is None:
+                values = np.full(len(self.date), np.nan)
+            object.__setattr__(self, col, np.asarray(values, dtype=np.float64))
+        if data_source is None:
+            data_source = np.full(len(self.date), None, dtype=object)
+        self.data_source = data_source
+
+    # === 构造 ===
+
+    @classmethod
+    def from_rows(cls, code: str, rows: Iterable[tuple]) -> 'PriceSeries':
+        """
+        由查询结果构造（行须按日期升序，列顺序与 ROW_DTYPE 一致）
+
+        Args:
+            rows: 游标或元组序列，逐行转入记录数组
+        """
+        return cls.from_records(code, np.fromiter(rows, dtype=ROW_DTYPE))
+
+    @classmethod
+    def from_records(cls, code: str, records: np.ndarray) -> 'PriceSeries':
+        """由 ROW_DTYPE 记录数组构造（数值列为字段视图，不复制）"""
+        columns = {col: records[col] for col in SERIES_COLUMNS}
+        return cls(code, records['date'].astype('datetime64[D]'), columns, records['data_source'])
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, code: str = '') -> 'PriceSeries':
+        """由 DataFrame 构造（按 date 排序，缺失的列补为 NaN）"""
+        if df is None or df.empty:
+            return cls(code, np.empty(0, dtype='datetime64[D]'))
+        df = df.sort_values('date', kind='stable')
+        columns = {
+            col: pd.to_numeric(df[col], errors='coerce').to_numpy(dtype=np.float64)
+            for col in SERIES_COLUMNS if col in df.columns
+        }
+        data_source = df['data_source'].to_numpy(dtype=object) if 'data_source' in df.columns else None
+        dates = pd.to_datetime(df['date']).to_numpy().astype('datetime64[D]')
+        return cls(code, dates, columns, data_source)
+
+    # === 访问 ===
+
+    def __len__(self) -> int:
+        return len(self.date)
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        if name not in self.__slots__:
+            raise KeyError(name)
+        return getattr(self, name)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        if name in SERIES_COLUMNS:
+            raise AttributeError(f"PriceSeries 为只读序列，不能修改列 {name}")
+        object.__setattr__(self, name, value)
+
+    def __repr__(self) -> str:
+        if not len(self):
+            return f"PriceSeries({self.code!r}, 0 根)"
+        return f"PriceSeries({self.code!r}, {len(self)} 根, {self.date[0]} ~ {self.date[-1]})"
+
+    @property
+    def empty(self) -> bool:
+        return len(self.date) == 0
+
+    @property
+    def last_date(self) -> Optional[date]:
+        return self.date[-1].item() if len(self.date) else None
+
+    def tail(self, n: int) -> 'PriceSeries':
+        """最近 n 根（共享底层数组，不复制）"""
+        n = max(n, 0)
+        start = max(len(self) - n, 0)
+        return PriceSeries(
+            self.code,
+            self.date[start:],
+            {col: getattr(self, col)[start:] for col in SERIES_COLUMNS},
+            self.data_source[start:],
+        )
+
+    def row(self, index: int) -> Dict[str, Any]:
+        """
+        单根K线的字典（字段与 StockDaily.to_dict() 相同，缺失值为 None）
+        """
+        data = {'code': self.code, 'date': self.date[index].item()}
+        for col in SERIES_COLUMNS:
+            value = getattr(self, col)[index]
+            data[col] = None if np.isnan(value) else float(value)
+        data['data_source'] = self.data_source[index]
+        return data
+
+    def rows(self) -> Iterable[Dict[str, Any]]:
+        for i in range(len(self)):
+            yield self.row(i)
+
+    def to_frame(self) -> pd.DataFrame:
+        """转为 DataFrame（date 列为 datetime64）"""
+        data = {'code': np.full(len(self), self.code, dtype=object), 'date': self.date.astype('datetime64[ns]')}
+        data.update({col: getattr(self, col) for col in SERIES_COLUMNS})
+        data['data_source'] = self.data_source
+        return pd.DataFrame(data)
+
+
+def rolling_mean(values: np.ndarray, window: int) -> np.ndarray:
+    """
+    滚动均值（与 pandas rolling(window).mean() 一致：前 window-1 个及窗口含 NaN 时为 NaN）
+    """
+    result = np.full(len(values), np.nan)
+    if len(values) >= window:
+        result[window - 1:] = np.lib.stride_tricks.sliding_window_view(values, window).mean(axis=1)
+    return result
+
+
+if __name__ == "__main__":
+    import time
+
+    rng = np.random.default_rng(0)
+    n = 120
+    close = 10 + np.cumsum(rng.normal(0, 0.1, n))
+    empty = (None,) * (len(SERIES_COLUMNS) - 5)
+    rows = [
+        (d.isoformat(), c, c + 0.1, c - 0.1, c, 1e6) + empty + ('SyntheticFetcher',)
+        for d, c in zip(pd.bdate_range('2024-01-01', periods=n).date, close)
+    ]
+
+    start = time.perf_counter()
+    for _ in range(1000):
+        series = PriceSeries.from_rows('600519', rows)
+    print(f"from_rows: {(time.perf_counter() - start):.3f} ms/次")
+    print(series, series.row(-1))
+    assert np.allclose(rolling_mean(series.close, 5)[4:], pd.Series(close).rolling(5).mean()[4:])
@@ -18,7 +18,7 @@ import signal
 import sys
 import time
 import threading
-from datetime import datetime
+from datetime import date, datetime
 from typing import Callable, Optional
 
 logger = logging.getLogger(__name__)
@@ -60,15 +60,17 @@ class Scheduler:
     基于 schedule 库实现，支持：
     - 每日定时执行
     - 启动时立即执行
+    - 非交易日跳过定时执行（可选）
     - 优雅退出
     """
     
-    def __init__(self, schedule_time: str = "18:00"):
+    def __init__(self, schedule_time: str = "18:00", trading_days_only: bool = False):
         """
         初始化调度器
         
         Args:
             schedule_time: 每日执行时间，格式 "HH:MM"
+            trading_days_only: 是否只在 A 股交易日执行定时任务
         """
         try:
             import schedule
@@ -78,6 +80,7 @@ class Scheduler:
             raise ImportError("请安装 schedule 库: pip install schedule")
         
         self.schedule_time = schedule_time
+        self.trading_days_only = trading_days_only
         self.shutdown_handler = GracefulShutdown()
         self._task_callback: Optional[Callable] = None
         self._running = False
@@ -93,13 +96,27 @@ class Scheduler:
         self._task_callback = task
         
         # 设置每日定时任务
-        self.schedule.every().day.at(self.schedule_time).do(self._safe_run_task)
-        logger.info(f"已设置每日定时任务，执行时间: {self.schedule_time}")
+        self.schedule.every().day.at(self.schedule_time).do(self._scheduled_run)
+        logger.info(f"已设置每日定时任务，执行时间: {self.schedule_time}"
+                    + ("（仅交易日）" if self.trading_days_only else ""))
         
         if run_immediately:
             logger.info("立即执行一次任务...")
             self._safe_run_task()
     
+    def _scheduled_run(self):
+        """定时触发入口：非交易日跳过"""
+        if self.trading_days_only:
+            try:
+                from data_provider.trade_calendar import get_trade_calendar
+                if not get_trade_calendar().is_trading_day(date.today()):
+                    logger.info(f"今天 ({date.today()}) 不是交易日，跳过定时任务")
+                    return
+            except Exception as e:
+                logger.warning(f"交易日判断失败，照常执行: {e}")
+        
+        self._safe_run_task()
+    
     def _safe_run_task(self):
         """安全执行任务（带异常捕获）"""
         if self._task_callback is None:
@@ -153,7 +170,8 @@ class Scheduler:
 def run_with_schedule(
     task: Callable,
     schedule_time: str = "18:00",
-    run_immediately: bool = True
+    run_immediately: bool = True,
+    trading_days_only: bool = False
 ):
     """
     便捷函数：使用定时调度运行任务
@@ -162,8 +180,9 @@ def run_with_schedule(
         task: 要执行的任务函数
         schedule_time: 每日执行时间
         run_immediately: 是否立即执行一次
+        trading_days_only: 是否只在交易日执行定时任务
     """
-    scheduler = Scheduler(schedule_time=schedule_time)
+    scheduler = Scheduler(schedule_time=schedule_time, trading_days_only=trading_days_only)
     scheduler.set_daily_task(task, run_immediately=run_immediately)
     scheduler.run()
 
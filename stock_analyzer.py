@@ -18,12 +18,14 @@
 
 import logging
 from dataclasses import dataclass, field
-from typing import Optional, Dict, Any, List, Tuple
+from typing import Optional, Dict, Any, List, Tuple, Union
 from enum import Enum
 
 import pandas as pd
 import numpy as np
 
+from price_series import PriceSeries, rolling_mean
+
 logger = logging.getLogger(__name__)
 
 
@@ -143,12 +145,12 @@ class StockTrendAnalyzer:
         """初始化分析器"""
         pass
     
-    def analyze(self, df: pd.DataFrame, code: str) -> TrendAnalysisResult:
+    def analyze(self, series: Union[PriceSeries, pd.DataFrame], code: str) -> TrendAnalysisResult:
         """
         分析股票趋势
         
         Args:
-            df: 包含 OHLCV 数据的 DataFrame
+            series: 日线序列（PriceSeries，或包含 OHLCV 数据的 DataFrame）
             code: 股票代码
             
         Returns:
@@ -156,55 +158,66 @@ class StockTrendAnalyzer:
         """
         result = TrendAnalysisResult(code=code)
         
-        if df is None or df.empty or len(df) < 20:
+        # DataFrame 转为按日期排序的序列
+        if isinstance(series, pd.DataFrame):
+            series = PriceSeries.from_frame(series, code)
+        
+        if series is None or len(series) < 20:
             logger.warning(f"{code} 数据不足，无法进行趋势分析")
             result.risk_factors.append("数据不足，无法完成分析")
             return result
         
-        # 确保数据按日期排序
-        df = df.sort_values('date').reset_index(drop=True)
-        
         # 计算均线
-        df = self._calculate_mas(df)
+        mas = self._calculate_mas(series)
         
         # 获取最新数据
-        latest = df.iloc[-1]
-        result.current_price = float(latest['close'])
-        result.ma5 = float(latest['MA5'])
-        result.ma10 = float(latest['MA10'])
-        result.ma20 = float(latest['MA20'])
-        result.ma60 = float(latest.get('MA60', 0))
+        result.current_price = float(series.close[-1])
+        result.ma5 = float(mas['MA5'][-1])
+        result.ma10 = float(mas['MA10'][-1])
+        result.ma20 = float(mas['MA20'][-1])
+        result.ma60 = float(mas['MA60'][-1])
         
         # 1. 趋势判断
-        self._analyze_trend(df, result)
+        self._analyze_trend(mas, result)
         
         # 2. 乖离率计算
         self._calculate_bias(result)
         
         # 3. 量能分析
-        self._analyze_volume(df, result)
+        self._analyze_volume(series, result)
         
         # 4. 支撑压力分析
-        self._analyze_support_resistance(df, result)
+        self._analyze_support_resistance(series, result)
         
         # 5. 生成买入信号
         self._generate_signal(result)
         
         return result
     
-    def _calculate_mas(self, df: pd.DataFrame) -> pd.DataFrame:
-        """计算均线"""
-        df = df.copy()
-        df['MA5'] = df['close'].rolling(window=5).mean()
-        df['MA10'] = df['close'].rolling(window=10).mean()
-        df['MA20'] = df['close'].rolling(window=20).mean()
-        if len(df) >= 60:
-            df['MA60'] = df['close'].rolling(window=60).mean()
+    def _calculate_mas(self, series: PriceSeries) -> Dict[str, np.ndarray]:
+        """
+        计算均线
+        
+        MA60 优先使用存储层物化的 ma60 列（由完整历史递推，不受窗口长度限制）
+        
+        Returns:
+            MA5/MA10/MA20/MA60 -> 与序列等长的数组
+        """
+        close = series.close
+        mas = {
+            'MA5': rolling_mean(close, 5),
+            'MA10': rolling_mean(close, 10),
+            'MA20': rolling_mean(close, 20),
+        }
+        if not np.isnan(series.ma60[-1]):
+            mas['MA60'] = series.ma60
+        elif len(close) >= 60:
+            mas['MA60'] = rolling_mean(close, 60)
         else:
-            df['MA60'] = df['MA20']  # 数据不足时使用 MA20 替代
-        return df
+            mas['MA60'] = mas['MA20']  # 数据不足时使用 MA20 替代
+        return mas
     
-    def _analyze_trend(self, df: pd.DataFrame, result: TrendAnalysisResult) -> None:
+    def _analyze_trend(self, mas: Dict[str, np.ndarray], result: TrendAnalysisResult) -> None:
         """
         分析趋势状态
         
@@ -215,8 +228,9 @@ class StockTrendAnalyzer:
         # 判断均线排列
         if ma5 > ma10 > ma20:
             # 检查间距是否在扩大（强势）
-            prev = df.iloc[-5] if len(df) >= 5 else df.iloc[-1]
-            prev_spread = (prev['MA5'] - prev['MA20']) / prev['MA20'] * 100 if prev['MA20'] > 0 else 0
+            prev = -5 if len(mas['MA5']) >= 5 else -1
+            prev_ma5, prev_ma20 = mas['MA5'][prev], mas['MA20'][prev]
+            prev_spread = (prev_ma5 - prev_ma20) / prev_ma20 * 100 if prev_ma20 > 0 else 0
             curr_spread = (ma5 - ma20) / ma20 * 100 if ma20 > 0 else 0
             
             if curr_spread > prev_spread and curr_spread > 5:
@@ -234,8 +248,9 @@ class StockTrendAnalyzer:
             result.trend_strength = 55
             
         elif ma5 < ma10 < ma20:
-            prev = df.iloc[-5] if len(df) >= 5 else df.iloc[-1]
-            prev_spread = (prev['MA20'] - prev['MA5']) / prev['MA5'] * 100 if prev['MA5'] > 0 else 0
+            prev = -5 if len(mas['MA5']) >= 5 else -1
+            prev_ma5, prev_ma20 = mas['MA5'][prev], mas['MA20'][prev]
+            prev_spread = (prev_ma20 - prev_ma5) / prev_ma5 * 100 if prev_ma5 > 0 else 0
             curr_spread = (ma20 - ma5) / ma5 * 100 if ma5 > 0 else 0
             
             if curr_spread > prev_spread and curr_spread > 5:
@@ -274,24 +289,26 @@ class StockTrendAnalyzer:
         if result.ma20 > 0:
             result.bias_ma20 = (price - result.ma20) / result.ma20 * 100
     
-    def _analyze_volume(self, df: pd.DataFrame, result: TrendAnalysisResult) -> None:
+    def _analyze_volume(self, series: PriceSeries, result: TrendAnalysisResult) -> None:
         """
         分析量能
         
         偏好：缩量回调 > 放量上涨 > 缩量上涨 > 放量下跌
         """
-        if len(df) < 5:
+        if len(series) < 5:
             return
         
-        latest = df.iloc[-1]
-        vol_5d_avg = df['volume'].iloc[-6:-1].mean()
+        volume = series.volume
+        recent = volume[-6:-1]
+        recent = recent[~np.isnan(recent)]
+        vol_5d_avg = recent.mean() if len(recent) else np.nan
         
         if vol_5d_avg > 0:
-            result.volume_ratio_5d = float(latest['volume']) / vol_5d_avg
+            result.volume_ratio_5d = float(volume[-1]) / vol_5d_avg
         
         # 判断价格变化
-        prev_close = df.iloc[-2]['close']
-        price_change = (latest['close'] - prev_close) / prev_close * 100
+        prev_close = series.close[-2]
+        price_change = (series.close[-1] - prev_close) / prev_close * 100
         
         # 量能状态判断
         if result.volume_ratio_5d >= self.VOLUME_HEAVY_RATIO:
@@ -312,7 +329,7 @@ class StockTrendAnalyzer:
             result.volume_status = VolumeStatus.NORMAL
             result.volume_trend = "量能正常"
     
-    def _analyze_support_resistance(self, df: pd.DataFrame, result: TrendAnalysisResult) -> None:
+    def _analyze_support_resistance(self, series: PriceSeries, result: TrendAnalysisResult) -> None:
         """
         分析支撑压力位
         
@@ -340,8 +357,8 @@ class StockTrendAnalyzer:
             result.support_levels.append(result.ma20)
         
         # 近期高点作为压力
-        if len(df) >= 20:
-            recent_high = df['high'].iloc[-20:].max()
+        if len(series) >= 20:
+            recent_high = float(np.nanmax(series.high[-20:]))
             if recent_high > price:
                 result.resistance_levels.append(recent_high)
     
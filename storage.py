@@ -11,11 +11,16 @@ A股自选股智能分析系统 - 存储层
 4. 实现智能更新逻辑（断点续传）
 """
 
+import json
 import logging
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
 from datetime import datetime, date, timedelta
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Iterator, Tuple, Callable
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
 from sqlalchemy import (
     create_engine,
@@ -25,20 +30,33 @@ from sqlalchemy import (
     Date,
     DateTime,
     Integer,
+    Text,
     Index,
     UniqueConstraint,
     select,
     and_,
     desc,
+    func,
+    event,
+    update,
+    bindparam,
 )
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import (
     declarative_base,
+    scoped_session,
     sessionmaker,
     Session,
 )
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.exc import IntegrityError
 
 from config import get_config
+from data_provider.trade_calendar import data_ready_at, get_data_ready_time, get_trade_calendar
+from indicators import INDICATOR_COLUMNS, IndicatorState
+from migrations import migrate
+from price_series import ROW_DTYPE, SERIES_COLUMNS, PriceSeries
 
 logger = logging.getLogger(__name__)
 
@@ -53,18 +71,16 @@ class StockDaily(Base):
     股票日线数据模型
     
     存储每日行情数据和计算的技术指标
-    支持多股票、多日期的唯一约束
+    同一股票同一日期只有一条数据（主键 code + date）
     """
     __tablename__ = 'stock_daily'
     
-    # 主键
-    id = Column(Integer, primary_key=True, autoincrement=True)
-    
+    # 主键：(code, date) 聚簇（WITHOUT ROWID，行按代码、日期顺序存放，见 migrations.py）
     # 股票代码（如 600519, 000001）
-    code = Column(String(10), nullable=False, index=True)
+    code = Column(String(10), primary_key=True)
     
     # 交易日期
-    date = Column(Date, nullable=False, index=True)
+    date = Column(Date, primary_key=True)
     
     # OHLC 数据
     open = Column(Float)
@@ -83,6 +99,14 @@ class StockDaily(Base):
     ma20 = Column(Float)
     volume_ratio = Column(Float)  # 量比
     
+    # 物化指标（写入时按 indicator_state 递推，见 indicators.py）
+    ma60 = Column(Float)
+    ema12 = Column(Float)
+    ema26 = Column(Float)
+    macd_dif = Column(Float)
+    macd_dea = Column(Float)
+    macd_hist = Column(Float)
+    
     # 数据来源
     data_source = Column(String(50))  # 记录数据来源（如 AkshareFetcher）
     
@@ -90,10 +114,9 @@ class StockDaily(Base):
     created_at = Column(DateTime, default=datetime.now)
     updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
     
-    # 唯一约束：同一股票同一日期只能有一条数据
     __table_args__ = (
-        UniqueConstraint('code', 'date', name='uix_code_date'),
-        Index('ix_code_date', 'code', 'date'),
+        Index('ix_stock_daily_updated_at', 'updated_at'),  # 归档按更新时间增量导出
+        {'sqlite_with_rowid': False},
     )
     
     def __repr__(self):
@@ -115,10 +138,216 @@ class StockDaily(Base):
             'ma10': self.ma10,
             'ma20': self.ma20,
             'volume_ratio': self.volume_ratio,
+            'ma60': self.ma60,
+            'ema12': self.ema12,
+            'ema26': self.ema26,
+            'macd_dif': self.macd_dif,
+            'macd_dea': self.macd_dea,
+            'macd_hist': self.macd_hist,
             'data_source': self.data_source,
         }
 
 
+class ChipDistributionRecord(Base):
+    """
+    筹码分布历史数据模型
+    
+    保存 ak.stock_cyq_em 返回的完整历史（约 90 个交易日），
+    每个交易日只需请求一次，分析时直接从数据库读取
+    """
+    __tablename__ = 'chip_distribution'
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    code = Column(String(10), nullable=False)
+    date = Column(Date, nullable=False)
+    
+    # 获利情况
+    profit_ratio = Column(Float)  # 获利比例(0-1)
+    avg_cost = Column(Float)  # 平均成本
+    
+    # 筹码集中度
+    cost_90_low = Column(Float)
+    cost_90_high = Column(Float)
+    concentration_90 = Column(Float)
+    cost_70_low = Column(Float)
+    cost_70_high = Column(Float)
+    concentration_70 = Column(Float)
+    
+    data_source = Column(String(50))
+    
+    created_at = Column(DateTime, default=datetime.now)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)  # 最近一次刷新时间
+    
+    __table_args__ = (
+        UniqueConstraint('code', 'date', name='uix_chip_code_date'),
+    )
+    
+    def __repr__(self):
+        return f"<ChipDistributionRecord(code={self.code}, date={self.date}, profit_ratio={self.profit_ratio})>"
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为字典（字段与 ChipDistribution 一致）"""
+        return {
+            'code': self.code,
+            'date': self.date.isoformat() if self.date else '',
+            'profit_ratio': self.profit_ratio,
+            'avg_cost': self.avg_cost,
+            'cost_90_low': self.cost_90_low,
+            'cost_90_high': self.cost_90_high,
+            'concentration_90': self.concentration_90,
+            'cost_70_low': self.cost_70_low,
+            'cost_70_high': self.cost_70_high,
+            'concentration_70': self.concentration_70,
+        }
+
+
+class IndicatorStateRecord(Base):
+    """
+    技术指标递推状态（每只股票一行）
+    
+    保存物化到 stock_daily 的指标截至 last_date 的运行状态，
+    追加新K线时直接递推，不再读取历史窗口
+    """
+    __tablename__ = 'indicator_state'
+    
+    code = Column(String(10), primary_key=True)
+    last_date = Column(Date)
+    bars = Column(Integer, default=0)
+    closes = Column(Text)  # 最近 60 根收盘价（JSON）
+    sum_close = Column(Float, default=0.0)
+    ema12 = Column(Float)
+    ema26 = Column(Float)
+    dea = Column(Float)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+    
+    def to_state(self) -> IndicatorState:
+        return IndicatorState(
+            last_date=self.last_date,
+            bars=self.bars or 0,
+            closes=IndicatorState.loads_closes(self.closes),
+            sum_close=self.sum_close or 0.0,
+            ema_fast=self.ema12,
+            ema_slow=self.ema26,
+            dea=self.dea,
+        )
+    
+    def load(self, state: IndicatorState) -> None:
+        self.last_date = state.last_date
+        self.bars = state.bars
+        self.closes = state.dumps_closes()
+        self.sum_close = state.sum_close
+        self.ema12 = state.ema_fast
+        self.ema26 = state.ema_slow
+        self.dea = state.dea
+
+
+class AnalysisRecord(Base):
+    """
+    AI 分析结果模型
+    
+    每条结果附带输入指纹（不含实时行情的上下文 + 模型 + 提示词版本的哈希，不含新闻），
+    开启复用时当天重跑指纹相同即直接复用，不再调用 LLM
+    """
+    __tablename__ = 'analysis_results'
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    code = Column(String(10), nullable=False)
+    date = Column(Date, nullable=False)  # 分析所依据的最新交易日
+    fingerprint = Column(String(64), nullable=False, index=True)
+    
+    name = Column(String(50))
+    model_name = Column(String(100))
+    prompt_version = Column(String(20))
+    
+    # 常用字段单独成列，便于历史查询
+    sentiment_score = Column(Integer)
+    operation_advice = Column(String(20))
+    trend_prediction = Column(String(20))
+    
+    result_json = Column(Text, nullable=False)  # AnalysisResult.to_dict() 的 JSON
+    
+    created_at = Column(DateTime, default=datetime.now)
+    
+    __table_args__ = (
+        UniqueConstraint('code', 'date', 'fingerprint', name='uix_analysis_code_date_fp'),
+        Index('ix_analysis_code_date', 'code', 'date'),
+    )
+    
+    def __repr__(self):
+        return f"<AnalysisRecord(code={self.code}, date={self.date}, score={self.sentiment_score})>"
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为字典（result 为 AnalysisResult.to_dict() 的内容）"""
+        return {
+            'code': self.code,
+            'date': self.date.isoformat() if self.date else '',
+            'name': self.name,
+            'model_name': self.model_name,
+            'prompt_version': self.prompt_version,
+            'sentiment_score': self.sentiment_score,
+            'operation_advice': self.operation_advice,
+            'trend_prediction': self.trend_prediction,
+            'created_at': self.created_at.isoformat() if self.created_at else '',
+            'result': json.loads(self.result_json),
+        }
+
+
+# 日线的行情与指标列（写入时逐列比较，值未变化的行跳过）
+DAILY_VALUE_COLUMNS = [
+    'open', 'high', 'low', 'close', 'volume', 'amount', 'pct_chg',
+    'ma5', 'ma10', 'ma20', 'volume_ratio',
+]
+
+
+@dataclass
+class UpsertResult:
+    """日线写入结果"""
+    inserted: int = 0    # 新增
+    updated: int = 0     # 值有变化而更新
+    unchanged: int = 0   # 与已存储的值相同而跳过
+    
+    @property
+    def written(self) -> int:
+        """实际写入（新增 + 更新）的记录数"""
+        return self.inserted + self.updated
+    
+    def __add__(self, other: 'UpsertResult') -> 'UpsertResult':
+        return UpsertResult(
+            self.inserted + other.inserted,
+            self.updated + other.updated,
+            self.unchanged + other.unchanged,
+        )
+    
+    def __str__(self) -> str:
+        return f"新增 {self.inserted} 条，更新 {self.updated} 条，未变化 {self.unchanged} 条"
+
+
+# 日线的全部数值列（读取时转为 float64）
+NUMERIC_COLUMNS = set(DAILY_VALUE_COLUMNS + INDICATOR_COLUMNS)
+
+
+# 增量计算技术指标所需的行情列（get_recent_frame）
+RECENT_FRAME_COLUMNS = [
+    'code', 'date', 'open', 'high', 'low', 'close', 'volume', 'amount', 'pct_chg',
+]
+
+
+# 批量查询时 IN 列表的分块大小（低于旧版 SQLite 999 个绑定参数的上限）
+IN_CLAUSE_CHUNK = 500
+
+
+# 分析窗口的K线条数（覆盖 MA60 所需的 60 条，并留出趋势/支撑压力判断的余量）
+ANALYSIS_WINDOW_BARS = 120
+
+
+# 筹码分布数值列（与 ChipDistributionRecord 字段对应）
+CHIP_VALUE_COLUMNS = [
+    'profit_ratio', 'avg_cost',
+    'cost_90_low', 'cost_90_high', 'concentration_90',
+    'cost_70_low', 'cost_70_high', 'concentration_70',
+]
+
+
 class DatabaseManager:
     """
     数据库管理器 - 单例模式
@@ -138,26 +367,24 @@ class DatabaseManager:
             cls._instance._initialized = False
         return cls._instance
     
-    def __init__(self, db_url: Optional[str] = None):
+    def __init__(self, db_url: Optional[str] = None, perf_mode: Optional[bool] = None):
         """
         初始化数据库管理器
         
         Args:
             db_url: 数据库连接 URL（可选，默认从配置读取）
+            perf_mode: 是否启用 SQLite 性能模式（可选，默认从配置读取，见 _create_engine）
         """
         if self._initialized:
             return
         
+        config = get_config()
         if db_url is None:
-            config = get_config()
             db_url = config.get_db_url()
+        self.perf_mode = config.db_perf_mode if perf_mode is None else perf_mode
         
         # 创建数据库引擎
-        self._engine = create_engine(
-            db_url,
-            echo=False,  # 设为 True 可查看 SQL 语句
-            pool_pre_ping=True,  # 连接健康检查
-        )
+        self._engine = self._create_engine(db_url, config)
         
         # 创建 Session 工厂
         self._SessionLocal = sessionmaker(
@@ -165,12 +392,71 @@ class DatabaseManager:
             autocommit=False,
             autoflush=False,
         )
+        # 性能模式：每个线程复用自己的 Session（用完归还连接）
+        self._scoped_session = scoped_session(self._SessionLocal) if self.perf_mode else None
+        
+        # 写操作串行化：SQLite 同一时刻只允许一个写事务，
+        # 进程内先排队，避免多个线程同时抢写锁后在 busy_timeout 内反复重试
+        self._write_lock = threading.RLock()
+        
+        # 读取路径的已编译查询（_read_series）：名称 -> (SQL 文本, 位置参数名, 参数默认值)
+        self._compiled_reads: Dict[str, Tuple[str, Tuple[str, ...], Dict[str, Any]]] = {}
         
-        # 创建所有表
+        # 创建所有表，并将已有数据库迁移到最新结构
         Base.metadata.create_all(self._engine)
+        migrate(self._engine, Base.metadata)
         
         self._initialized = True
-        logger.info(f"数据库初始化完成: {db_url}")
+        logger.info(f"数据库初始化完成: {db_url}{'（性能模式）' if self.perf_mode else ''}")
+    
+    def _create_engine(self, db_url: str, config) -> Engine:
+        """
+        创建数据库引擎
+        
+        性能模式（SQLite）：
+        - 每个新连接执行 WAL、synchronous=NORMAL、mmap_size、cache_size、busy_timeout 等 PRAGMA
+          （WAL 下读不阻塞写、写不阻塞读）
+        - 连接池大小按工作线程数设置，线程间不共享连接
+        """
+        if not self.perf_mode or not db_url.startswith('sqlite'):
+            return create_engine(
+                db_url,
+                echo=False,  # 设为 True 可查看 SQL 语句
+                pool_pre_ping=True,  # 连接健康检查
+            )
+        
+        engine = create_engine(
+            db_url,
+            echo=False,
+            pool_pre_ping=True,
+            poolclass=QueuePool,
+            pool_size=max(5, config.max_workers * 2),
+            max_overflow=10,
+            connect_args={
+                'check_same_thread': False,
+                'timeout': config.db_busy_timeout,
+            },
+        )
+        
+        pragmas = [
+            "PRAGMA journal_mode=WAL",
+            "PRAGMA synchronous=NORMAL",
+            "PRAGMA temp_store=MEMORY",
+            f"PRAGMA mmap_size={int(config.db_mmap_mb * 1024 * 1024)}",
+            f"PRAGMA cache_size=-{int(config.db_cache_mb * 1024)}",  # 负数单位为 KB
+            f"PRAGMA busy_timeout={int(config.db_busy_timeout * 1000)}",
+        ]
+        
+        @event.listens_for(engine, "connect")
+        def _apply_pragmas(dbapi_connection, _record):
+            cursor = dbapi_connection.cursor()
+            try:
+                for pragma in pragmas:
+                    cursor.execute(pragma)
+            finally:
+                cursor.close()
+        
+        return engine
     
     @classmethod
     def get_instance(cls) -> 'DatabaseManager':
@@ -183,6 +469,8 @@ class DatabaseManager:
     def reset_instance(cls) -> None:
         """重置单例（用于测试）"""
         if cls._instance is not None:
+            if cls._instance._scoped_session is not None:
+                cls._instance._scoped_session.remove()
             cls._instance._engine.dispose()
             cls._instance = None
     
@@ -190,17 +478,35 @@ class DatabaseManager:
         """
         获取数据库 Session
         
+        性能模式下返回当前线程的 Session（with 结束时关闭并归还连接，下次调用重新取用），
+        同一线程内不要嵌套使用
+        
         使用示例:
             with db.get_session() as session:
                 # 执行查询
                 session.commit()  # 如果需要
         """
-        session = self._SessionLocal()
-        try:
-            return session
-        except Exception:
-            session.close()
-            raise
+        if self._scoped_session is not None:
+            return self._scoped_session()
+        return self._SessionLocal()
+    
+    @contextmanager
+    def write_session(self) -> Iterator[Session]:
+        """
+        写事务（进程内串行执行）：正常结束时提交，异常时回滚
+        
+        使用示例:
+            with db.write_session() as session:
+                session.add(record)
+        """
+        with self._write_lock:
+            with self.get_session() as session:
+                try:
+                    yield session
+                    session.commit()
+                except Exception:
+                    session.rollback()
+                    raise
     
     def has_today_data(self, code: str, target_date: Optional[date] = None) -> bool:
         """
@@ -210,13 +516,13 @@ class DatabaseManager:
         
         Args:
             code: 股票代码
-            target_date: 目标日期（默认今天）
+            target_date: 目标日期（默认最近一个已收盘的交易日，周末/节假日、收盘前不会误判为缺失）
             
         Returns:
             是否存在数据
         """
         if target_date is None:
-            target_date = date.today()
+            target_date = get_trade_calendar().last_completed_trading_day()
         
         with self.get_session() as session:
             result = session.execute(
@@ -230,11 +536,218 @@ class DatabaseManager:
             
             return result is not None
     
+    def get_latest_date(self, code: str) -> Optional[date]:
+        """
+        获取指定股票已存储的最新交易日期
+        
+        用于增量获取：只请求该日期之后缺失的数据
+        
+        Args:
+            code: 股票代码
+            
+        Returns:
+            最新日期，无数据时返回 None
+        """
+        with self.get_session() as session:
+            return session.execute(
+                select(func.max(StockDaily.date)).where(StockDaily.code == code)
+            ).scalar()
+    
+    def has_data_for_date_many(
+        self,
+        codes: List[str],
+        target_date: Optional[date] = None
+    ) -> Dict[str, bool]:
+        """
+        批量检查多只股票是否已有指定日期的数据（has_today_data 的批量版本）
+        
+        Args:
+            codes: 股票代码列表
+            target_date: 目标日期（默认最近一个已收盘的交易日）
+            
+        Returns:
+            股票代码 -> 是否存在数据
+        """
+        if target_date is None:
+            target_date = get_trade_calendar().last_completed_trading_day()
+        
+        found = set()
+        with self.get_session() as session:
+            for chunk in _chunked(codes, IN_CLAUSE_CHUNK):
+                found.update(session.execute(
+                    select(StockDaily.code).where(
+                        and_(
+                            StockDaily.code.in_(chunk),
+                            StockDaily.date == target_date
+                        )
+                    )
+                ).scalars())
+        
+        return {code: code in found for code in codes}
+    
+    def get_latest_dates(self, codes: List[str]) -> Dict[str, Optional[date]]:
+        """
+        批量获取多只股票已存储的最新交易日期（get_latest_date 的批量版本）
+        
+        Returns:
+            股票代码 -> 最新日期（无数据时为 None）
+        """
+        latest = {code: None for code in codes}
+        with self.get_session() as session:
+            for chunk in _chunked(codes, IN_CLAUSE_CHUNK):
+                latest.update(session.execute(
+                    select(StockDaily.code, func.max(StockDaily.date))
+                    .where(StockDaily.code.in_(chunk))
+                    .group_by(StockDaily.code)
+                ).all())
+        return latest
+    
+    def get_latest_bars(self, codes: List[str]) -> Dict[str, Optional[Tuple[date, datetime]]]:
+        """
+        批量获取多只股票已存储的最新K线日期及其写入时间
+        
+        写入时间早于该交易日日线就绪时间（data_ready_at）的K线是盘中写入的不完整数据，
+        增量获取时需要重新请求
+        
+        Returns:
+            股票代码 -> (最新日期, updated_at)（无数据时为 None）
+        """
+        latest = {code: None for code in codes}
+        with self.get_session() as session:
+            for chunk in _chunked(codes, IN_CLAUSE_CHUNK):
+                newest = (
+                    select(StockDaily.code, func.max(StockDaily.date).label('date'))
+                    .where(StockDaily.code.in_(chunk))
+                    .group_by(StockDaily.code)
+                    .subquery()
+                )
+                rows = session.execute(
+                    select(StockDaily.code, StockDaily.date, StockDaily.updated_at)
+                    .join(newest, and_(StockDaily.code == newest.c.code, StockDaily.date == newest.c.date))
+                )
+                latest.update({code: (row_date, updated_at) for code, row_date, updated_at in rows})
+        return latest
+    
+    def get_latest_data_many(
+        self,
+        codes: List[str],
+        days: int,
+        columns: Optional[List[str]] = None
+    ) -> pd.DataFrame:
+        """
+        批量获取多只股票最近 N 条K线（长表）
+        
+        每个分块一条 ROW_NUMBER() OVER (PARTITION BY code ORDER BY date DESC) 查询，
+        取代逐只股票的 ORDER BY/LIMIT 查询
+        
+        Args:
+            codes: 股票代码列表
+            days: 每只股票的K线条数
+            columns: 返回的列（默认与 get_analysis_window 相同）
+            
+        Returns:
+            按 code、date 升序排列的长表，数值列为 float64；无数据时为空
+        """
+        if columns is None:
+            columns = ['code', 'date'] + DAILY_VALUE_COLUMNS + INDICATOR_COLUMNS + ['data_source']
+        
+        rows = []
+        with self.get_session() as session:
+            for chunk in _chunked(codes, IN_CLAUSE_CHUNK):
+                ranked = (
+                    select(
+                        *[getattr(StockDaily, col) for col in columns],
+                        func.row_number().over(
+                            partition_by=StockDaily.code,
+                            order_by=desc(StockDaily.date)
+                        ).label('rn')
+                    )
+                    .where(StockDaily.code.in_(chunk))
+                    .subquery()
+                )
+                rows.extend(session.execute(
+                    select(*[ranked.c[col] for col in columns])
+                    .where(ranked.c.rn <= days)
+                ).all())
+        
+        df = _rows_to_frame(rows, columns)
+        return df.sort_values(['code', 'date'], kind='stable').reset_index(drop=True)
+    
+    def get_recent_frames(self, codes: List[str], days: int) -> Dict[str, pd.DataFrame]:
+        """
+        批量获取多只股票最近 N 条K线（get_recent_frame 的批量版本）
+        
+        Returns:
+            股票代码 -> DataFrame（列与 get_recent_frame 相同；无数据的代码不出现在结果中）
+        """
+        df = self.get_latest_data_many(codes, days, columns=RECENT_FRAME_COLUMNS)
+        return {
+            code: frame.reset_index(drop=True)
+            for code, frame in df.groupby('code', sort=False)
+        }
+    
+    def iter_daily_changes(
+        self,
+        since: Optional[datetime] = None,
+        batch_size: int = 200_000
+    ) -> Iterator[pd.DataFrame]:
+        """
+        分批导出 updated_at 晚于 since 的日线（用于增量同步归档）
+        
+        只查询列值、按列构造 DataFrame，不创建 ORM 对象
+        
+        Args:
+            since: 起始更新时间（None 表示全部）
+            batch_size: 每批行数
+            
+        Yields:
+            包含 code/date/DAILY_VALUE_COLUMNS/INDICATOR_COLUMNS/updated_at 列的 DataFrame
+        """
+        columns = ['code', 'date'] + DAILY_VALUE_COLUMNS + INDICATOR_COLUMNS + ['updated_at']
+        query = select(*[getattr(StockDaily, col) for col in columns])
+        if since is None:
+            # 全量导出按日期分批，每批只涉及少数年份分区
+            # （日期没有单独的索引，SQLite 需整表排序一次，只在首次同步或重建时发生）
+            query = query.order_by(StockDaily.date)
+        else:
+            # 增量导出走 updated_at 索引（按日期排序会让 SQLite 改为全表扫描日期索引）
+            query = query.where(StockDaily.updated_at > since).order_by(StockDaily.updated_at)
+        
+        with self.get_session() as session:
+            result = session.execute(query.execution_options(yield_per=batch_size))
+            for rows in result.partitions():
+                yield _rows_to_frame(rows, columns)
+    
+    def get_recent_frame(self, code: str, days: int) -> pd.DataFrame:
+        """
+        获取最近 N 条K线（DataFrame 形式，按日期升序）
+        
+        只查询行情列，不创建 ORM 对象，用于增量计算技术指标
+        
+        Args:
+            code: 股票代码
+            days: K线条数
+            
+        Returns:
+            包含 code/date/OHLCV/amount/pct_chg 列的 DataFrame（无数据时为空）
+        """
+        columns = [getattr(StockDaily, col) for col in RECENT_FRAME_COLUMNS]
+        
+        with self.get_session() as session:
+            rows = session.execute(
+                select(*columns)
+                .where(StockDaily.code == code)
+                .order_by(desc(StockDaily.date))
+                .limit(days)
+            ).all()
+        
+        return pd.DataFrame(list(reversed(rows)), columns=[c.key for c in columns])
+    
     def get_latest_data(
         self, 
         code: str, 
         days: int = 2
-    ) -> List[StockDaily]:
+    ) -> PriceSeries:
         """
         获取最近 N 天的数据
         
@@ -245,24 +758,16 @@ class DatabaseManager:
             days: 获取天数
             
         Returns:
-            StockDaily 对象列表（按日期降序）
+            PriceSeries（按日期升序，最近一天为 series.row(-1)）
         """
-        with self.get_session() as session:
-            results = session.execute(
-                select(StockDaily)
-                .where(StockDaily.code == code)
-                .order_by(desc(StockDaily.date))
-                .limit(days)
-            ).scalars().all()
-            
-            return list(results)
+        return self.get_analysis_window(code, days)
     
     def get_data_range(
         self, 
         code: str, 
         start_date: date, 
         end_date: date
-    ) -> List[StockDaily]:
+    ) -> PriceSeries:
         """
         获取指定日期范围的数据
         
@@ -272,35 +777,86 @@ class DatabaseManager:
             end_date: 结束日期
             
         Returns:
-            StockDaily 对象列表
+            PriceSeries（按日期升序）
         """
-        with self.get_session() as session:
-            results = session.execute(
-                select(StockDaily)
-                .where(
-                    and_(
-                        StockDaily.code == code,
-                        StockDaily.date >= start_date,
-                        StockDaily.date <= end_date
-                    )
+        return self._read_series(
+            code,
+            'range',
+            lambda: select(*_series_columns())
+            .where(
+                and_(
+                    StockDaily.code == _code_param(),
+                    StockDaily.date >= bindparam('start_date'),
+                    StockDaily.date <= bindparam('end_date')
                 )
-                .order_by(StockDaily.date)
-            ).scalars().all()
-            
-            return list(results)
+            )
+            .order_by(StockDaily.date),
+            start_date=start_date,
+            end_date=end_date,
+        )
+    
+    def _read_series(
+        self,
+        code: str,
+        query_name: str,
+        build: Callable[[], Any],
+        descending: bool = False,
+        **params: Any
+    ) -> PriceSeries:
+        """
+        读取单只股票的 PriceSeries（DBAPI 游标直接流入记录数组）
+        
+        查询按名称只编译一次，之后直接用缓存的 SQL 文本执行，
+        不经过 SQLAlchemy 的编译、结果集与 Row 对象
+        （依赖 SQLite 的位置参数与 ISO 字符串日期；存储层的写入同样只支持 SQLite）
+        
+        Args:
+            query_name: 查询名称（编译缓存的键）
+            build: 构造 Core 查询的函数（参数用 bindparam 命名，列与 ROW_DTYPE 一致）
+            descending: 查询结果是否按日期降序（返回前翻转为升序）
+            **params: 绑定参数（日期为 date 对象）
+        """
+        compiled = self._compiled_reads.get(query_name)
+        if compiled is None:
+            statement = build().compile(dialect=self._engine.dialect)
+            compiled = (str(statement), tuple(statement.positiontup), statement.params)
+            self._compiled_reads[query_name] = compiled
+        sql, names, defaults = compiled
+        # 未命名的参数（如 SQLite 方言补上的 OFFSET 0）取编译时的值；
+        # 绕过了类型处理，日期按 SQLite 的存储格式（ISO 字符串）传入
+        params = {
+            **defaults,
+            **{name: value.isoformat() if isinstance(value, date) else value for name, value in params.items()},
+            'code': code,
+        }
+        
+        connection = self._engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            try:
+                cursor.execute(sql, [params[name] for name in names])
+                records = np.fromiter(cursor, dtype=ROW_DTYPE)
+            finally:
+                cursor.close()
+        finally:
+            connection.close()
+        
+        if descending:
+            records = records[::-1]
+        return PriceSeries.from_records(code, records)
     
     def save_daily_data(
         self, 
         df: pd.DataFrame, 
         code: str,
         data_source: str = "Unknown"
-    ) -> int:
+    ) -> UpsertResult:
         """
         保存日线数据到数据库
         
         策略：
-        - 使用 UPSERT 逻辑（存在则更新，不存在则插入）
-        - 跳过已存在的数据，避免重复
+        - 批量 UPSERT（存在则更新，不存在则插入），见 _upsert_daily_rows
+        - 值未变化的行跳过，不刷新 updated_at
         
         Args:
             df: 包含日线数据的 DataFrame
@@ -308,86 +864,400 @@ class DatabaseManager:
             data_source: 数据来源名称
             
         Returns:
-            新增/更新的记录数
+            UpsertResult（新增/更新/未变化的记录数）
         """
         if df is None or df.empty:
             logger.warning(f"保存数据为空，跳过 {code}")
-            return 0
+            return UpsertResult()
+        
+        with self._write_lock, self.get_session() as session:
+            try:
+                result = self._upsert_daily_rows(session, df, code, data_source)
+                session.commit()
+                logger.info(f"保存 {code} 数据成功，{result}")
+                
+            except Exception as e:
+                session.rollback()
+                logger.error(f"保存 {code} 数据失败: {e}")
+                raise
         
-        saved_count = 0
+        return result
+    
+    def save_daily_data_many(
+        self,
+        frames: Dict[str, pd.DataFrame],
+        data_source: str = "Unknown"
+    ) -> UpsertResult:
+        """
+        批量保存多只股票的日线数据（单个事务）
         
+        用于按交易日批量拉取全市场数据后一次性写入
+        
+        Args:
+            frames: 股票代码 -> 日线 DataFrame
+            data_source: 数据来源名称
+            
+        Returns:
+            UpsertResult（所有股票合计）
+        """
+        frames = {code: df for code, df in frames.items() if df is not None and not df.empty}
+        if not frames:
+            return UpsertResult()
+        
+        result = UpsertResult()
+        
+        with self._write_lock, self.get_session() as session:
+            try:
+                for code, df in frames.items():
+                    result += self._upsert_daily_rows(session, df, code, data_source)
+                session.commit()
+                logger.info(f"批量保存 {len(frames)} 只股票数据成功，{result}")
+                
+            except Exception as e:
+                session.rollback()
+                logger.error(f"批量保存数据失败: {e}")
+                raise
+        
+        return result
+    
+    def _upsert_daily_rows(
+        self,
+        session: Session,
+        df: pd.DataFrame,
+        code: str,
+        data_source: str
+    ) -> 'UpsertResult':
+        """
+        在给定 Session 中写入单只股票的日线数据（不提交）
+        
+        1. 从 DataFrame 的列数组一次性转为 Python 值（不逐行 iterrows）
+        2. 一次查询取出区间内已存储的行，值完全相同的行直接跳过（不刷新 updated_at；
+           盘中写入、日线就绪后确认未变化的行只刷新 updated_at，见 get_latest_bars）
+        3. 其余行用一条 INSERT ... ON CONFLICT(code, date) DO UPDATE 批量执行
+        
+        Returns:
+            新增/更新/未变化的记录数
+        """
+        if df is None or df.empty:
+            return UpsertResult()
+        
+        dates = pd.to_datetime(df['date']).to_numpy().astype('datetime64[D]')
+        columns = {}
+        for col in DAILY_VALUE_COLUMNS:
+            if col in df.columns:
+                values = pd.to_numeric(df[col], errors='coerce').to_numpy(dtype=np.float64)
+                converted = values.astype(object)
+                converted[np.isnan(values)] = None
+                columns[col] = converted.tolist()
+            else:
+                columns[col] = [None] * len(df)
+        
+        # 同一日期出现多次时以最后一行为准
+        rows: Dict[date, Tuple] = {}
+        for i, row_date in enumerate(dates.tolist()):
+            rows[row_date] = tuple(columns[col][i] for col in DAILY_VALUE_COLUMNS)
+        
+        existing = {
+            r[0]: (tuple(r[2:]), r[1])
+            for r in session.execute(
+                select(
+                    StockDaily.date, StockDaily.updated_at,
+                    *[getattr(StockDaily, col) for col in DAILY_VALUE_COLUMNS]
+                )
+                .where(
+                    and_(
+                        StockDaily.code == code,
+                        StockDaily.date >= min(rows),
+                        StockDaily.date <= max(rows)
+                    )
+                )
+            )
+        }
+        
+        now = datetime.now()
+        ready_time = get_data_ready_time()
+        params = []
+        confirmed = []
+        inserted = updated = 0
+        for row_date, values in rows.items():
+            old, updated_at = existing.get(row_date, (None, None))
+            if old is None:
+                inserted += 1
+            elif old == values:
+                # 盘中写入的K线在日线就绪后确认未变化：只刷新 updated_at，标记为完整数据
+                ready = data_ready_at(row_date, ready_time)
+                if (updated_at is None or updated_at < ready) and ready <= now:
+                    confirmed.append(row_date)
+                continue
+            else:
+                updated += 1
+            params.append({
+                'code': code, 'date': row_date, 'data_source': data_source,
+                'created_at': now, 'updated_at': now,
+                **dict(zip(DAILY_VALUE_COLUMNS, values)),
+            })
+        
+        if params:
+            self._materialize_indicators(session, code, params, now)
+            stmt = sqlite_insert(StockDaily)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['code', 'date'],
+                set_={
+                    col: stmt.excluded[col]
+                    for col in DAILY_VALUE_COLUMNS + INDICATOR_COLUMNS + ['data_source', 'updated_at']
+                },
+            )
+            session.execute(stmt, params)
+        
+        if confirmed:
+            session.execute(
+                update(StockDaily)
+                .where(and_(StockDaily.code == code, StockDaily.date.in_(confirmed)))
+                .values(updated_at=now)
+            )
+        
+        return UpsertResult(inserted, updated, len(rows) - inserted - updated)
+    
+    def _materialize_indicators(
+        self,
+        session: Session,
+        code: str,
+        params: List[Dict[str, Any]],
+        now: datetime
+    ) -> None:
+        """
+        为即将写入的行计算物化指标（直接填入 params，随 upsert 一起写入）
+        
+        - 全部晚于已物化的最新日期（日常追加）：从 indicator_state 逐根 O(1) 递推
+        - 否则（首次物化、修订历史K线）：重放该股票的全部收盘价，
+          并更新本次未写入的已有行
+        """
+        record = session.get(IndicatorStateRecord, code)
+        written = {p['date']: p for p in sorted(params, key=lambda p: p['date'])}
+        
+        if record is not None and record.last_date is not None and min(written) > record.last_date:
+            state = record.to_state()
+            for row_date, p in written.items():
+                p.update(state.step(row_date, p['close']))
+        else:
+            state = self._replay_indicators(session, code, written, now)
+        
+        if record is None:
+            record = IndicatorStateRecord(code=code)
+            session.add(record)
+        record.load(state)
+    
+    def _replay_indicators(
+        self,
+        session: Session,
+        code: str,
+        written: Dict[date, Dict[str, Any]],
+        now: datetime
+    ) -> IndicatorState:
+        """
+        从头重放一只股票的指标（本次未写入的已有行只在指标值变化时更新）
+        
+        Args:
+            written: 本次将要写入的行（日期 -> 参数字典），收盘价以其为准，指标值直接填入
+            
+        Returns:
+            重放后的状态
+        """
+        stored = {
+            r[0]: (r[1], tuple(r[2:]))
+            for r in session.execute(
+                select(
+                    StockDaily.date, StockDaily.close,
+                    *[getattr(StockDaily, col) for col in INDICATOR_COLUMNS]
+                ).where(StockDaily.code == code)
+            )
+        }
+        closes = {row_date: close for row_date, (close, _) in stored.items()}
+        closes.update({row_date: p['close'] for row_date, p in written.items()})
+        
+        state, values = IndicatorState.replay(sorted(closes.items()))
+        for row_date, p in written.items():
+            p.update(values[row_date])
+        
+        # 只更新指标值实际变化的已有行（未变化的行不刷新 updated_at，不会被归档重新导出）
+        others = [
+            {'b_date': row_date, **{f'b_{col}': values[row_date][col] for col in INDICATOR_COLUMNS}}
+            for row_date, (_, old) in stored.items()
+            if row_date not in written
+            and old != tuple(values[row_date][col] for col in INDICATOR_COLUMNS)
+        ]
+        if others:
+            stmt = (
+                update(StockDaily)
+                .where(and_(StockDaily.code == code, StockDaily.date == bindparam('b_date')))
+                .values(updated_at=now, **{col: bindparam(f'b_{col}') for col in INDICATOR_COLUMNS})
+            )
+            session.connection().execute(stmt, others)
+        return state
+    
+    def rebuild_indicators(self, codes: Optional[List[str]] = None) -> int:
+        """
+        全量重建物化指标（升级后回填历史数据，或指标算法变更后使用）
+        
+        日常写入会自动维护指标，无需调用
+        
+        Args:
+            codes: 股票代码列表（默认全部）
+            
+        Returns:
+            重建的股票数
+        """
+        if codes is None:
+            with self.get_session() as session:
+                codes = list(session.execute(select(StockDaily.code).distinct()).scalars())
+        
+        now = datetime.now()
+        for code in codes:
+            with self.write_session() as session:
+                state = self._replay_indicators(session, code, {}, now)
+                record = session.get(IndicatorStateRecord, code)
+                if record is None:
+                    record = IndicatorStateRecord(code=code)
+                    session.add(record)
+                record.load(state)
+        
+        logger.info(f"物化指标重建完成: {len(codes)} 只股票")
+        return len(codes)
+    
+    def get_chip_state(self, code: str) -> Tuple[Optional[date], Optional[datetime]]:
+        """
+        获取筹码分布的存储状态
+        
+        Returns:
+            Tuple[最新筹码日期, 最近一次刷新时间]，无数据时均为 None
+        """
+        with self.get_session() as session:
+            row = session.execute(
+                select(
+                    func.max(ChipDistributionRecord.date),
+                    func.max(ChipDistributionRecord.updated_at),
+                ).where(ChipDistributionRecord.code == code)
+            ).one()
+        return row[0], row[1]
+    
+    def get_latest_chip(self, code: str) -> Optional[Dict[str, Any]]:
+        """获取最新一天的筹码分布（字典形式，无数据时返回 None）"""
         with self.get_session() as session:
+            record = session.execute(
+                select(ChipDistributionRecord)
+                .where(ChipDistributionRecord.code == code)
+                .order_by(desc(ChipDistributionRecord.date))
+                .limit(1)
+            ).scalar_one_or_none()
+            return record.to_dict() if record else None
+    
+    def get_chip_history(self, code: str, days: int = 90) -> pd.DataFrame:
+        """获取最近 N 天的筹码分布历史（按日期升序）"""
+        columns = [ChipDistributionRecord.date] + [
+            getattr(ChipDistributionRecord, col) for col in CHIP_VALUE_COLUMNS
+        ]
+        with self.get_session() as session:
+            rows = session.execute(
+                select(*columns)
+                .where(ChipDistributionRecord.code == code)
+                .order_by(desc(ChipDistributionRecord.date))
+                .limit(days)
+            ).all()
+        return pd.DataFrame(list(reversed(rows)), columns=['date'] + CHIP_VALUE_COLUMNS)
+    
+    def save_chip_history(
+        self,
+        code: str,
+        df: pd.DataFrame,
+        data_source: str = "Unknown"
+    ) -> int:
+        """
+        保存筹码分布历史（增量）
+        
+        只插入晚于已存储最新日期的行；即使没有新数据，也会刷新最新一行的
+        updated_at，用于判断当天是否已经请求过（数据源尚未更新时避免重复请求）
+        
+        Args:
+            code: 股票代码
+            df: 包含 date 与 CHIP_VALUE_COLUMNS 列的 DataFrame
+            data_source: 数据来源名称
+            
+        Returns:
+            新增的记录数
+        """
+        latest_date, _ = self.get_chip_state(code)
+        
+        if df is not None and not df.empty:
+            dates = pd.to_datetime(df['date']).dt.date
+            new_rows = df[dates > latest_date] if latest_date else df
+            new_dates = dates[new_rows.index]
+        else:
+            new_rows, new_dates = pd.DataFrame(), []
+        
+        now = datetime.now()
+        with self._write_lock, self.get_session() as session:
             try:
-                for _, row in df.iterrows():
-                    # 解析日期
-                    row_date = row.get('date')
-                    if isinstance(row_date, str):
-                        row_date = datetime.strptime(row_date, '%Y-%m-%d').date()
-                    elif isinstance(row_date, datetime):
-                        row_date = row_date.date()
-                    elif isinstance(row_date, pd.Timestamp):
-                        row_date = row_date.date()
-                    
-                    # 检查是否已存在
-                    existing = session.execute(
-                        select(StockDaily).where(
+                for row_date, row in zip(new_dates, new_rows.itertuples(index=False)):
+                    values = {
+                        col: (None if pd.isna(getattr(row, col, None)) else float(getattr(row, col)))
+                        for col in CHIP_VALUE_COLUMNS
+                    }
+                    session.add(ChipDistributionRecord(
+                        code=code, date=row_date, data_source=data_source,
+                        created_at=now, updated_at=now, **values
+                    ))
+                
+                if not len(new_rows) and latest_date is not None:
+                    record = session.execute(
+                        select(ChipDistributionRecord).where(
                             and_(
-                                StockDaily.code == code,
-                                StockDaily.date == row_date
+                                ChipDistributionRecord.code == code,
+                                ChipDistributionRecord.date == latest_date
                             )
                         )
-                    ).scalar_one_or_none()
-                    
-                    if existing:
-                        # 更新现有记录
-                        existing.open = row.get('open')
-                        existing.high = row.get('high')
-                        existing.low = row.get('low')
-                        existing.close = row.get('close')
-                        existing.volume = row.get('volume')
-                        existing.amount = row.get('amount')
-                        existing.pct_chg = row.get('pct_chg')
-                        existing.ma5 = row.get('ma5')
-                        existing.ma10 = row.get('ma10')
-                        existing.ma20 = row.get('ma20')
-                        existing.volume_ratio = row.get('volume_ratio')
-                        existing.data_source = data_source
-                        existing.updated_at = datetime.now()
-                    else:
-                        # 创建新记录
-                        record = StockDaily(
-                            code=code,
-                            date=row_date,
-                            open=row.get('open'),
-                            high=row.get('high'),
-                            low=row.get('low'),
-                            close=row.get('close'),
-                            volume=row.get('volume'),
-                            amount=row.get('amount'),
-                            pct_chg=row.get('pct_chg'),
-                            ma5=row.get('ma5'),
-                            ma10=row.get('ma10'),
-                            ma20=row.get('ma20'),
-                            volume_ratio=row.get('volume_ratio'),
-                            data_source=data_source,
-                        )
-                        session.add(record)
-                        saved_count += 1
+                    ).scalar_one()
+                    record.updated_at = now
                 
                 session.commit()
-                logger.info(f"保存 {code} 数据成功，新增 {saved_count} 条")
-                
             except Exception as e:
                 session.rollback()
-                logger.error(f"保存 {code} 数据失败: {e}")
+                logger.error(f"保存 {code} 筹码分布失败: {e}")
                 raise
         
-        return saved_count
+        if len(new_rows):
+            logger.info(f"保存 {code} 筹码分布 {len(new_rows)} 条")
+        return len(new_rows)
+    
+    def get_analysis_window(self, code: str, days: int = ANALYSIS_WINDOW_BARS) -> PriceSeries:
+        """
+        获取分析窗口：最近 N 条K线（一次查询，按日期升序）
+        
+        同一个窗口既交给趋势分析器（MA60、量能、支撑压力），
+        又用于组装 LLM 上下文（get_analysis_context），每只股票只读一次数据库
+        
+        Args:
+            code: 股票代码
+            days: K线条数（默认 ANALYSIS_WINDOW_BARS）
+            
+        Returns:
+            PriceSeries（数值列为 float64，缺失值为 NaN）；无数据时为空序列
+        """
+        return self._read_series(
+            code,
+            'window',
+            lambda: select(*_series_columns())
+            .where(StockDaily.code == _code_param())
+            .order_by(desc(StockDaily.date))
+            .limit(bindparam('days', type_=Integer)),
+            descending=True,
+            days=days,
+        )
     
     def get_analysis_context(
         self, 
         code: str,
-        target_date: Optional[date] = None
+        target_date: Optional[date] = None,
+        window: Optional[PriceSeries] = None
     ) -> Optional[Dict[str, Any]]:
         """
         获取分析所需的上下文数据
@@ -397,6 +1267,7 @@ class DatabaseManager:
         Args:
             code: 股票代码
             target_date: 目标日期（默认今天）
+            window: 已加载的分析窗口（get_analysis_window），传入时不再查询数据库
             
         Returns:
             包含今日数据、昨日对比等信息的字典
@@ -404,34 +1275,34 @@ class DatabaseManager:
         if target_date is None:
             target_date = date.today()
         
-        # 获取最近2天数据
-        recent_data = self.get_latest_data(code, days=2)
+        if window is None:
+            window = self.get_analysis_window(code, days=2)
         
-        if not recent_data:
+        if window.empty:
             logger.warning(f"未找到 {code} 的数据")
             return None
         
-        today_data = recent_data[0]
-        yesterday_data = recent_data[1] if len(recent_data) > 1 else None
+        today_data = window.row(-1)
+        yesterday_data = window.row(-2) if len(window) > 1 else None
         
         context = {
             'code': code,
-            'date': today_data.date.isoformat(),
-            'today': today_data.to_dict(),
+            'date': today_data['date'].isoformat(),
+            'today': today_data,
         }
         
         if yesterday_data:
-            context['yesterday'] = yesterday_data.to_dict()
+            context['yesterday'] = yesterday_data
             
             # 计算相比昨日的变化
-            if yesterday_data.volume and yesterday_data.volume > 0:
+            if yesterday_data['volume'] and yesterday_data['volume'] > 0:
                 context['volume_change_ratio'] = round(
-                    today_data.volume / yesterday_data.volume, 2
+                    today_data['volume'] / yesterday_data['volume'], 2
                 )
             
-            if yesterday_data.close and yesterday_data.close > 0:
+            if yesterday_data['close'] and yesterday_data['close'] > 0:
                 context['price_change_ratio'] = round(
-                    (today_data.close - yesterday_data.close) / yesterday_data.close * 100, 2
+                    (today_data['close'] - yesterday_data['close']) / yesterday_data['close'] * 100, 2
                 )
             
             # 均线形态判断
@@ -439,7 +1310,109 @@ class DatabaseManager:
         
         return context
     
-    def _analyze_ma_status(self, data: StockDaily) -> str:
+    def get_analysis_result(
+        self,
+        code: str,
+        fingerprint: str,
+        since: Optional[datetime] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        按输入指纹查找已保存的分析结果
+        
+        Args:
+            since: 只查找该时间之后生成的结果（可选）
+        
+        Returns:
+            AnalysisResult.to_dict() 的内容，未找到时返回 None
+        """
+        conditions = [AnalysisRecord.code == code, AnalysisRecord.fingerprint == fingerprint]
+        if since is not None:
+            conditions.append(AnalysisRecord.created_at >= since)
+        with self.get_session() as session:
+            result_json = session.execute(
+                select(AnalysisRecord.result_json)
+                .where(and_(*conditions))
+                .order_by(desc(AnalysisRecord.created_at))
+                .limit(1)
+            ).scalar()
+        return json.loads(result_json) if result_json else None
+    
+    def save_analysis_result(
+        self,
+        code: str,
+        trade_date: date,
+        fingerprint: str,
+        result: Dict[str, Any],
+        model_name: Optional[str] = None,
+        prompt_version: Optional[str] = None
+    ) -> None:
+        """
+        保存分析结果（同一股票、交易日、指纹只保留最新一条）
+        
+        Args:
+            code: 股票代码
+            trade_date: 分析所依据的最新交易日
+            fingerprint: 输入指纹
+            result: AnalysisResult.to_dict()
+            model_name: 模型名称
+            prompt_version: 提示词版本
+        """
+        values = {
+            'code': code,
+            'date': trade_date,
+            'fingerprint': fingerprint,
+            'name': result.get('name'),
+            'model_name': model_name,
+            'prompt_version': prompt_version,
+            'sentiment_score': result.get('sentiment_score'),
+            'operation_advice': result.get('operation_advice'),
+            'trend_prediction': result.get('trend_prediction'),
+            'result_json': json.dumps(result, ensure_ascii=False, default=str),
+            'created_at': datetime.now(),
+        }
+        stmt = sqlite_insert(AnalysisRecord).values(**values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['code', 'date', 'fingerprint'],
+            set_={col: stmt.excluded[col] for col in values if col not in ('code', 'date', 'fingerprint')},
+        )
+        with self.write_session() as session:
+            session.execute(stmt)
+    
+    def get_analysis_history(
+        self,
+        code: str,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+        limit: int = 100
+    ) -> List[Dict[str, Any]]:
+        """
+        获取股票的历史分析结果（按交易日、保存时间降序）
+        
+        Args:
+            code: 股票代码
+            start_date: 开始日期（含，可选）
+            end_date: 结束日期（含，可选）
+            limit: 最多返回条数
+            
+        Returns:
+            AnalysisRecord.to_dict() 列表
+        """
+        conditions = [AnalysisRecord.code == code]
+        if start_date is not None:
+            conditions.append(AnalysisRecord.date >= start_date)
+        if end_date is not None:
+            conditions.append(AnalysisRecord.date <= end_date)
+        
+        with self.get_session() as session:
+            records = session.execute(
+                select(AnalysisRecord)
+                .where(and_(*conditions))
+                .order_by(desc(AnalysisRecord.date), desc(AnalysisRecord.created_at))
+                .limit(limit)
+            ).scalars().all()
+            return [record.to_dict() for record in records]
+    
+    def _analyze_ma_status(self, data: Dict[str, Any]) -> str:
         """
         分析均线形态
         
@@ -448,10 +1421,10 @@ class DatabaseManager:
         - 空头排列：close < ma5 < ma10 < ma20
         - 震荡整理：其他情况
         """
-        close = data.close or 0
-        ma5 = data.ma5 or 0
-        ma10 = data.ma10 or 0
-        ma20 = data.ma20 or 0
+        close = data.get('close') or 0
+        ma5 = data.get('ma5') or 0
+        ma10 = data.get('ma10') or 0
+        ma20 = data.get('ma20') or 0
         
         if close > ma5 > ma10 > ma20 > 0:
             return "多头排列 📈"
@@ -465,6 +1438,31 @@ class DatabaseManager:
             return "震荡整理 ↔️"
 
 
+def _series_columns() -> List[Column]:
+    """PriceSeries 对应的查询列（顺序与 ROW_DTYPE 一致）"""
+    return [StockDaily.date] + [getattr(StockDaily, col) for col in SERIES_COLUMNS] + [StockDaily.data_source]
+
+
+def _code_param():
+    """按股票代码查询的绑定参数（_read_series 自动填入）"""
+    return bindparam('code', type_=String)
+
+
+def _rows_to_frame(rows: List[Tuple], columns: List[str]) -> pd.DataFrame:
+    """查询结果按列构造 DataFrame（比逐行解析 Row 对象快得多），数值列为 float64"""
+    values = list(zip(*rows)) if rows else [()] * len(columns)
+    return pd.DataFrame({
+        col: np.array(data, dtype=np.float64) if col in NUMERIC_COLUMNS else list(data)
+        for col, data in zip(columns, values)
+    })
+
+
+def _chunked(items: List[str], size: int) -> Iterator[List[str]]:
+    """按 size 切分列表"""
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
 # 便捷函数
 def get_db() -> DatabaseManager:
     """获取数据库管理器实例的快捷方式"""
@@ -501,7 +1499,7 @@ if __name__ == "__main__":
     })
     
     saved = db.save_daily_data(test_df, '600519', 'TestSource')
-    print(f"保存测试数据: {saved} 条")
+    print(f"保存测试数据: {saved}")
     
     # 测试获取上下文
     context = db.get_analysis_context('600519')